@@ -0,0 +1,153 @@
+# benchmarks/fleet.py
+import os
+import shutil
+import logging
+import tempfile
+import yaml
+
+from simulators.faults import Faults, StandInThread
+from simulators.sonoff_diy import SonoffDiyStandIn
+from simulators.coolkit import CoolkitStandIn
+from simulators.sensibo import SensiboStandIn
+from simulators.tuya_lan import TuyaLanStandIn
+from simulators.broadlink import BroadlinkStandIn
+from cloud.sonoff_client import SonoffCloudClient
+from cloud.sensibo_client import SensiboCloudClient
+
+logger = logging.getLogger("SimFleet")
+
+TUYA_KEY = '0123456789abcdef'
+BLASTER_MAC = 'aabbccddee01'
+# Share of the fleet per kind (the rest is Sensibo)
+MIX = {'sonoff': 0.4, 'sonoff_relay': 0.2, 'tuya': 0.3}
+RELAY_OUTLETS = 4
+
+
+class SimulatedFleet:
+    """
+    A fleet of `size` switchable devices served by local stand-ins, plus one
+    Broadlink blaster and one IR TV. Writes a switches.yaml / commands.yaml
+    pointing at the stand-ins (127.0.0.1 + 'port') into a temp folder:
+
+        with SimulatedFleet(100, Faults(latency=0.01)) as fleet:
+            devices = load_devices(config_dir=fleet.config_dir, **fleet.clouds)
+
+    Mix: 40% single Sonoff relays, 20% outlets of 4-channel Sonoff relays
+    (LAN AES on), 30% Tuya 3.3 plugs, 10% Sensibo pods; half are lights.
+    """
+    def __init__(self, size, faults=None):
+        self.size = size
+        self.faults = faults or Faults()
+        self.sims = None
+        self.config_dir = None
+        self.clouds = {}
+        self.diy = self.coolkit = self.sensibo = self.tuya = self.blaster = None
+
+    # --- LIFECYCLE ---
+
+    def start(self):
+        self.sims = StandInThread()
+        self.diy = SonoffDiyStandIn(faults=self.faults)
+        self.coolkit = CoolkitStandIn(devices=self.diy.devices, faults=self.faults)
+        self.sensibo = SensiboStandIn(faults=self.faults)
+        self.tuya = TuyaLanStandIn(faults=self.faults)
+        self.blaster = BroadlinkStandIn(BLASTER_MAC, faults=self.faults)
+
+        entries = self._populate()
+        ports = {
+            'sonoff': self.sims.run(self.diy.start()),
+            'tuya': self.sims.run(self.tuya.start()),
+            'broadlink': self.sims.run(self.blaster.start())
+        }
+        sonoff_cloud = SonoffCloudClient(app_id='sim', app_secret='sim', access_token='sim')
+        sonoff_cloud.api_url = self.sims.run(self.coolkit.start())
+        sensibo_cloud = SensiboCloudClient()
+        sensibo_cloud.base_url = self.sims.run(self.sensibo.start())
+        sensibo_cloud.api_key = self.sensibo.api_key
+        self.clouds = {'sonoff_cloud': sonoff_cloud, 'sensibo_cloud': sensibo_cloud}
+
+        for entry in entries:
+            if entry['type'] in ports:
+                entry['port'] = ports[entry['type']]
+        self.config_dir = tempfile.mkdtemp(prefix=f"fleet{self.size}_")
+        self._write_config(entries)
+        logger.info(f"Fleet of {self.size} devices up ({self.config_dir}).")
+        return self
+
+    def stop(self):
+        if self.sims is not None:
+            for sim in (self.diy, self.coolkit, self.sensibo, self.tuya, self.blaster):
+                self.sims.run(sim.stop(), timeout=10)
+            self.sims.close()
+            self.sims = None
+        if self.config_dir:
+            shutil.rmtree(self.config_dir, ignore_errors=True)
+            self.config_dir = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def requests(self):
+        """ Requests received by all stand-ins so far. """
+        sims = (self.diy, self.coolkit, self.sensibo, self.tuya, self.blaster)
+        return sum(sim.requests for sim in sims if sim is not None)
+
+    # --- CONFIG ---
+
+    def _populate(self):
+        """ Registers the devices on the stand-ins, returns the switches.yaml entries. """
+        counts = {kind: int(self.size * share) for kind, share in MIX.items()}
+        counts['sensibo'] = self.size - sum(counts.values())
+        entries = []
+
+        def entry(kind, **item):
+            index = len(entries)
+            item.update(name=f"{kind}_{self.size}_{index}", ip='127.0.0.1')
+            if index % 2:
+                item['category'] = 'light'
+            entries.append(item)
+
+        for i in range(counts['sonoff']):
+            device_id = f"10{self.size:04d}s{i:04d}"
+            self.diy.add_device(device_id)
+            entry('sonoff', type='sonoff', device_id=device_id)
+
+        for i in range(counts['sonoff_relay']):
+            device_id = f"10{self.size:04d}r{i // RELAY_OUTLETS:04d}"
+            if device_id not in self.diy.devices:
+                self.diy.add_device(device_id, device_key=f"key{device_id}", outlets=RELAY_OUTLETS)
+            entry('relay', type='sonoff', device_id=device_id, device_key=f"key{device_id}",
+                  channel=i % RELAY_OUTLETS)
+
+        for i in range(counts['tuya']):
+            device_id = f"bf{self.size:04d}{i:010d}"
+            self.tuya.add_device(device_id, TUYA_KEY)
+            entry('tuya', type='tuya', device_id=device_id, device_key=TUYA_KEY, channel=1)
+
+        for i in range(counts['sensibo']):
+            pod_id = f"P{self.size:04d}{i:04d}"
+            self.sensibo.add_pod(pod_id)
+            entry('ac', type='sensibo', device_id=pod_id)
+
+        entries.append({'name': f"blaster_{self.size}", 'type': 'broadlink', 'ip': '127.0.0.1', 'mac': BLASTER_MAC})
+        entries.append({'name': f"tv_{self.size}", 'type': 'television'})
+        return entries
+
+    def _write_config(self, entries):
+        commands = {
+            f"tv_{self.size}": {
+                'IR_device': f"blaster_{self.size}",
+                'power': '26001a00' + '1d1d' * 12 + '000d05',
+                # set_state('on' / 'off') sends the command of that name
+                'on': '26001a00' + '1d1d' * 12 + '000d05',
+                'off': '26001a00' + '1d3a' * 12 + '000d05'
+            }
+        }
+        with open(os.path.join(self.config_dir, 'switches.yaml'), 'w') as f:
+            yaml.safe_dump({'devices': entries}, f, sort_keys=False)
+        with open(os.path.join(self.config_dir, 'commands.yaml'), 'w') as f:
+            yaml.safe_dump(commands, f, sort_keys=False)
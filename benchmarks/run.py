@@ -0,0 +1,260 @@
+# benchmarks/run.py
+"""
+Load benchmarks against a simulated fleet (see benchmarks/fleet.py).
+
+    python -m benchmarks.run --sizes 10 100 1000
+    python -m benchmarks.run --latency 0.02 --loss 0.01 --offline 0.05
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json --tolerance 0.2
+
+Scenarios per fleet size: load_devices, refresh_all (refresh_states),
+DeviceGroup.set_state (thread pool) and Room fan-out (async). Reports
+throughput (devices/s), p50/p99 per-device latency and memory.
+With --compare, exits 1 if a result regressed beyond the tolerance.
+"""
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tracemalloc
+
+from simulators.faults import Faults
+from benchmarks.fleet import SimulatedFleet
+from utils.loader import load_devices
+from utils.state_refresh import refresh_states
+from utils.startup_profile import startup
+from devices.device_group import DeviceGroup
+from devices.room import Room
+from devices.brands.tuya_pool import get_default_pool
+from devices.brands.sonoff_lan import get_default_transport
+
+logger = logging.getLogger("Benchmark")
+
+SIZES = [10, 100, 1000]
+# Unanswered requests are held longer than any client timeout (max 5s)
+HANG = 6.0
+
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _result(count, wall, samples, ok=None):
+    return {
+        'count': count,
+        'wall': round(wall, 4),
+        'throughput': round(count / wall, 1) if wall else None,
+        'p50_ms': round(percentile(samples, 0.50) * 1000, 2) if samples else None,
+        'p99_ms': round(percentile(samples, 0.99) * 1000, 2) if samples else None,
+        'ok': ok
+    }
+
+
+class _Timed:
+    """ Times every call of `attr` on each device (instance-level shim, removed on exit). """
+    def __init__(self, devices, attr):
+        self.devices = list(devices)
+        self.attr = attr
+        self.samples = []
+
+    def _wrap(self, call):
+        if asyncio.iscoroutinefunction(call):
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    self.samples.append(time.perf_counter() - start)
+        else:
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    self.samples.append(time.perf_counter() - start)
+        return timed
+
+    def __enter__(self):
+        for device in self.devices:
+            setattr(device, self.attr, self._wrap(getattr(device, self.attr)))
+        return self
+
+    def __exit__(self, *exc):
+        for device in self.devices:
+            delattr(device, self.attr)
+
+
+# --- SCENARIOS ---
+
+def bench_load(fleet):
+    start = time.perf_counter()
+    devices = load_devices(config_dir=fleet.config_dir, fetch_state=False, **fleet.clouds)
+    wall = time.perf_counter() - start
+    builds = [startup.devices[name]['build'] for name in devices['all'] if 'build' in startup.devices.get(name, {})]
+    return devices, _result(len(devices['all']), wall, builds)
+
+
+def bench_refresh(devices):
+    samples = []
+    start = time.perf_counter()
+    on_ready = lambda device: samples.append(time.perf_counter() - start)
+    results = refresh_states(devices['all'].values(), on_ready=on_ready)
+    wall = time.perf_counter() - start
+    ok = sum(1 for state in results.values() if state is not None)
+    return _result(len(results), wall, samples, ok)
+
+
+def bench_group(devices, state):
+    group = DeviceGroup('bench', devices['all'].values())
+    with _Timed(group.devices.values(), 'set_state') as timed:
+        start = time.perf_counter()
+        results = group.set_state(state)
+        wall = time.perf_counter() - start
+    return _result(len(results), wall, timed.samples, sum(1 for ok in results.values() if ok))
+
+
+def bench_room(fleet, devices, state):
+    room = Room('bench', devices['all'].values())
+
+    async def fan_out():
+        start = time.perf_counter()
+        try:
+            results = await room.all.async_set_state(state)
+            return results, time.perf_counter() - start
+        finally:
+            # aiohttp sessions are per loop: close them before asyncio.run() ends it
+            for client in fleet.clouds.values():
+                await client.async_close()
+            await get_default_transport().async_close()
+
+    with _Timed(room.all.devices.values(), 'async_set_state') as timed:
+        results, wall = asyncio.run(fan_out())
+    return _result(len(results), wall, timed.samples, sum(1 for ok in results.values() if ok))
+
+
+def bench_memory(fleet):
+    """ Python heap (tracemalloc) of loading + refreshing the fleet, in a separate pass. """
+    get_default_pool().close_all()
+    tracemalloc.start()
+    devices = load_devices(config_dir=fleet.config_dir, fetch_state=False, **fleet.clouds)
+    refresh_states(devices['all'].values())
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    get_default_pool().close_all()
+    return {
+        'current_kb': round(current / 1024, 1),
+        'peak_kb': round(peak / 1024, 1),
+        'per_device_kb': round(current / 1024 / max(1, len(devices['all'])), 2),
+        'maxrss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+def run_size(size, faults):
+    with SimulatedFleet(size, faults) as fleet:
+        devices, load = bench_load(fleet)
+        results = {
+            'load_devices': load,
+            'refresh_all': bench_refresh(devices),
+            'group_set_state': bench_group(devices, 'on'),
+            'room_fan_out': bench_room(fleet, devices, 'off')
+        }
+        get_default_pool().close_all()
+        results['memory'] = bench_memory(fleet)
+        results['requests'] = fleet.requests
+    return results
+
+
+# --- REPORT ---
+
+def print_report(report):
+    print(f"\nFaults: {report['faults']}")
+    print(f"{'size':>6} {'scenario':<16} {'count':>6} {'ok':>6} {'wall s':>8} {'dev/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for size, results in report['sizes'].items():
+        for scenario, r in results.items():
+            if scenario in ('memory', 'requests'):
+                continue
+            ok = '-' if r['ok'] is None else r['ok']
+            print(f"{size:>6} {scenario:<16} {r['count']:>6} {ok:>6} {r['wall']:>8.3f} "
+                  f"{r['throughput'] or 0:>9.1f} {r['p50_ms'] or 0:>8.2f} {r['p99_ms'] or 0:>8.2f}")
+        mem = results['memory']
+        print(f"{size:>6} {'memory':<16} heap {mem['current_kb']:.0f} KB (peak {mem['peak_kb']:.0f} KB, "
+              f"{mem['per_device_kb']:.1f} KB/device), maxrss {mem['maxrss_kb']} KB, "
+              f"{results['requests']} requests served")
+
+
+def compare(report, baseline, tolerance):
+    """ Returns the regressions of report vs baseline: [(size, scenario, metric, old, new), ...]. """
+    regressions = []
+    for size, results in report['sizes'].items():
+        old_results = baseline.get('sizes', {}).get(size)
+        if not old_results:
+            continue
+        for scenario, r in results.items():
+            old = old_results.get(scenario)
+            if not old or scenario == 'requests':
+                continue
+            if scenario == 'memory':
+                checks = [('peak_kb', 1)]
+            else:
+                checks = [('throughput', -1), ('p99_ms', 1)]
+            for metric, direction in checks:
+                before, after = old.get(metric), r.get(metric)
+                if not before or after is None:
+                    continue
+                if direction > 0 and after > before * (1 + tolerance):
+                    regressions.append((size, scenario, metric, before, after))
+                elif direction < 0 and after < before * (1 - tolerance):
+                    regressions.append((size, scenario, metric, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load benchmarks on a simulated device fleet.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every answer")
+    parser.add_argument('--jitter', type=float, default=0.0, help="extra random latency (s)")
+    parser.add_argument('--loss', type=float, default=0.0, help="probability a request is never answered")
+    parser.add_argument('--offline', type=float, default=0.0, help="fraction of devices that never answer")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file (from --save)")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    parser.add_argument('--log-level', default='ERROR')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format='%(levelname)s %(name)s: %(message)s')
+    faults = Faults(latency=args.latency, jitter=args.jitter, loss=args.loss,
+                    offline=args.offline, hang=HANG, seed=args.seed)
+
+    report = {'faults': repr(faults), 'sizes': {}}
+    for size in args.sizes:
+        logger.warning(f"Benchmarking {size} devices...")
+        report['sizes'][str(size)] = run_size(size, faults)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nREGRESSIONS (tolerance {args.tolerance:.0%}):")
+            for size, scenario, metric, before, after in regressions:
+                print(f"  {size:>6} {scenario:<16} {metric}: {before} -> {after}")
+            return 1
+        print(f"\nNo regression vs {args.compare} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,91 +1,240 @@
+# -*- coding: utf-8 -*-
+
 # cloud/sensibo_client.py
-import requests
 import logging
-from utils.config import get_sensibo_creds  # <--- NEW IMPORT
+import time
+from utils.config import get_sensibo_creds, get_http_settings  # <--- NEW IMPORT
+from utils.http import build_session, AsyncSessionPool
+from utils.metrics import report_error
 
 logger = logging.getLogger("SensiboCloud")
 
 class SensiboCloudClient:
-    def __init__(self):
+    def __init__(self, http_settings=None):
         self.base_url = "https://home.sensibo.com/api/v2"
-        
+
         creds = get_sensibo_creds()
         self.api_key = creds['api_key']
-        
+
         if not self.api_key:
             logger.warning("SENSIBO_API_KEY missing in .env")
 
-    # ... (Rest of the class methods: set_state, send_ac_state, get_state, get_measurements remain EXACTLY the same) ...
-    def set_state(self, device_id, state, channel=None):
-        return self.send_ac_state(device_id, {'on': (state == 'on')})
+        # Keep-alive pool shared by every request of this client
+        http_settings = http_settings or get_http_settings()
+        self.session = build_session(**http_settings)
+        self._async_sessions = AsyncSessionPool(**http_settings)
 
-    def send_ac_state(self, device_id, state_dict):
-        if not self.api_key:
-            return False
+        # Last fleet-wide snapshot {pod_id: pod}, see get_fleet()
+        self.fleet = {}
+        self.fleet_updated = 0
+
+    @property
+    def available(self):
+        """ False without an API key: calls would fail. """
+        return bool(self.api_key)
 
-        url = f"{self.base_url}/pods/{device_id}/acStates"
+    # --- TRANSPORT ---
+    # Both return the 'result' of a successful call, or None (already logged).
+
+    def _request(self, method, path, fields=None, payload=None, label=""):
         params = {'apiKey': self.api_key}
-        payload = {"acState": state_dict}
-        
-        logger.info(f"Sensibo [{device_id}] Setting: {state_dict}...")
-        
+        if fields:
+            params['fields'] = fields
+
         try:
-            resp = requests.post(url, params=params, json=payload, timeout=5)
-            data = resp.json()
-            
-            if resp.status_code == 200 and data.get('status') == 'success':
-                logger.info(" -> Success.")
-                return True
+            if method == 'POST':
+                resp = self.session.post(f"{self.base_url}{path}", params=params, json=payload)
             else:
-                logger.error(f" -> Sensibo API Error: {data}")
-                return False
+                resp = self.session.get(f"{self.base_url}{path}", params=params)
+            return self._parse_response(resp.status_code, resp.json(), label)
         except Exception as e:
-            logger.error(f" -> Connection Failed: {e}")
-            return False
+            logger.error(f"Sensibo Connection Failed: {e}")
+            report_error(e)
+            return None
 
-    def get_state(self, device_id, channel=None):
-        if not self.api_key: return None
-        
-        url = f"{self.base_url}/pods/{device_id}"
-        params = {'apiKey': self.api_key, 'fields': 'acState'}
-        
-        try:
-            resp = requests.get(url, params=params, timeout=5)
-            data = resp.json()
-            
-            if resp.status_code == 200 and data.get('status') == 'success':
-                pod = data.get('result', {})
-                ac_state = pod.get('acState', {})
-                is_on = ac_state.get('on', False)
-                return 'on' if is_on else 'off'
-            else:
-                logger.error(f"Sensibo API Error: {data}")
+    async def _async_request(self, method, path, fields=None, payload=None, label=""):
+        params = {'apiKey': self.api_key}
+        if fields:
+            params['fields'] = fields
 
+        try:
+            session = self._async_sessions.get()
+            async with session.request(method, f"{self.base_url}{path}", params=params, json=payload) as resp:
+                return self._parse_response(resp.status, await resp.json(content_type=None), label)
         except Exception as e:
-            logger.error(f"Sensibo Connection Failed: {e}")
-            
+            logger.error(f"Sensibo Connection Failed: {e!r}")
+            report_error(e)
+            return None
+
+    @staticmethod
+    def _parse_response(status_code, data, label):
+        if status_code == 200 and data.get('status') == 'success':
+            return data.get('result', {})
+        logger.error(f"Sensibo API Error{label}: {data}")
         return None
-    
-    def get_measurements(self, device_id):
+
+    async def async_close(self):
+        """ Closes the aiohttp session bound to the running loop. """
+        await self._async_sessions.close()
+
+    # --- COMMANDS ---
+
+    def set_state(self, device_id, state, channel=None):
+        return self.send_ac_state(device_id, {'on': (state == 'on')})
+
+    async def async_set_state(self, device_id, state, channel=None):
+        return await self.async_send_ac_state(device_id, {'on': (state == 'on')})
+
+    def send_ac_state(self, device_id, state_dict):
+        return self.set_ac_state(device_id, state_dict) is not None
+
+    async def async_send_ac_state(self, device_id, state_dict):
+        return await self.async_set_ac_state(device_id, state_dict) is not None
+
+    def set_ac_state(self, device_id, state_dict):
+        """
+        Like send_ac_state(), but returns the full acState the pod reports
+        after the change (None on failure), so callers can update their
+        cache without reading it back.
+        """
         if not self.api_key:
             return None
 
-        url = f"{self.base_url}/pods/{device_id}"
-        params = {
-            'apiKey': self.api_key, 
-            'fields': 'measurements'
-        }
-        
-        try:
-            resp = requests.get(url, params=params, timeout=5)
-            data = resp.json()
-            
-            if resp.status_code == 200 and data.get('status') == 'success':
-                return data.get('result', {}).get('measurements', {})
-            
-            logger.error(f"Sensibo API Error (Measurements): {data}")
+        logger.info(f"Sensibo [{device_id}] Setting: {state_dict}...")
+        result = self._request('POST', f"/pods/{device_id}/acStates", payload={"acState": state_dict})
+        return self._ac_state_from_result(result, device_id)
+
+    async def async_set_ac_state(self, device_id, state_dict):
+        if not self.api_key:
             return None
-            
-        except Exception as e:
-            logger.error(f"Sensibo Connection Failed: {e}")
-            return None
\ No newline at end of file
+
+        logger.info(f"Sensibo [{device_id}] Setting: {state_dict}...")
+        result = await self._async_request('POST', f"/pods/{device_id}/acStates", payload={"acState": state_dict})
+        return self._ac_state_from_result(result, device_id)
+
+    @staticmethod
+    def _ac_state_from_result(result, device_id):
+        # The command has its own outcome ('Success' / 'Failed' + failureReason,
+        # e.g. pod offline): only a successful one with its acState counts
+        if result is None:
+            return None
+        if result.get('status') != 'Success' or not result.get('acState'):
+            logger.error(f"Sensibo [{device_id}] Command not applied: "
+                         f"{result.get('status')} ({result.get('failureReason') or 'no acState'})")
+            return None
+        logger.info(" -> Success.")
+        return result['acState']
+
+    # --- STATE READS ---
+
+    def get_state(self, device_id, channel=None, max_age=None):
+        """
+        Returns 'on'/'off'.
+        If max_age (seconds) is given and the last fleet snapshot is younger
+        than that, the answer comes from the snapshot without a request.
+        """
+        if not self.api_key: return None
+
+        pod = self._get_fleet_pod(device_id, max_age)
+        if pod is None:
+            pod = self._request('GET', f"/pods/{device_id}", fields='acState')
+        return self._state_from_pod(pod)
+
+    async def async_get_state(self, device_id, channel=None, max_age=None):
+        if not self.api_key: return None
+
+        pod = self._get_fleet_pod(device_id, max_age)
+        if pod is None:
+            pod = await self._async_request('GET', f"/pods/{device_id}", fields='acState')
+        return self._state_from_pod(pod)
+
+    def get_measurements(self, device_id, max_age=None):
+        if not self.api_key:
+            return None
+
+        pod = self._get_fleet_pod(device_id, max_age)
+        if pod is None:
+            pod = self._request('GET', f"/pods/{device_id}", fields='measurements', label=" (Measurements)")
+        return pod.get('measurements', {}) if pod is not None else None
+
+    async def async_get_measurements(self, device_id, max_age=None):
+        if not self.api_key:
+            return None
+
+        pod = self._get_fleet_pod(device_id, max_age)
+        if pod is None:
+            pod = await self._async_request('GET', f"/pods/{device_id}", fields='measurements', label=" (Measurements)")
+        return pod.get('measurements', {}) if pod is not None else None
+
+    def get_pod(self, device_id, fields='acState,measurements'):
+        """ Fetches several fields of one pod in a single request. """
+        if not self.api_key:
+            return None
+        return self._request('GET', f"/pods/{device_id}", fields=fields)
+
+    async def async_get_pod(self, device_id, fields='acState,measurements'):
+        if not self.api_key:
+            return None
+        return await self._async_request('GET', f"/pods/{device_id}", fields=fields)
+
+    @staticmethod
+    def _state_from_pod(pod):
+        if pod is None:
+            return None
+        return 'on' if pod.get('acState', {}).get('on', False) else 'off'
+
+    # --- FLEET SNAPSHOT ---
+
+    FLEET_FIELDS = 'id,acState,measurements'
+
+    def get_fleet(self):
+        """
+        Fetches acState + measurements of EVERY pod on the account in one
+        /users/me/pods call. Returns {pod_id: pod} (also kept in self.fleet).
+        """
+        if not self.api_key:
+            return {}
+
+        logger.info("Fetching Sensibo fleet snapshot...")
+        return self._store_fleet(self._request('GET', "/users/me/pods", fields=self.FLEET_FIELDS, label=" (Fleet)"))
+
+    async def async_get_fleet(self):
+        if not self.api_key:
+            return {}
+
+        logger.info("Fetching Sensibo fleet snapshot...")
+        return self._store_fleet(await self._async_request('GET', "/users/me/pods", fields=self.FLEET_FIELDS, label=" (Fleet)"))
+
+    def _store_fleet(self, pods):
+        if pods is None:
+            return {}
+        self.fleet = {pod['id']: pod for pod in pods if pod.get('id')}
+        self.fleet_updated = time.time()
+        logger.info(f" -> {len(self.fleet)} pods.")
+        return self.fleet
+
+    def get_states(self, targets):
+        """
+        Batch version of get_state() served from one fleet snapshot.
+        targets: iterable of (device_id, channel) tuples.
+        Returns {(device_id, channel): state}.
+        """
+        return self._states_from_fleet(targets, self.get_fleet())
+
+    async def async_get_states(self, targets):
+        return self._states_from_fleet(targets, await self.async_get_fleet())
+
+    def _states_from_fleet(self, targets, fleet):
+        states = {}
+        for dev_id, channel in targets:
+            pod = fleet.get(dev_id)
+            if pod is None:
+                logger.error(f"Pod {dev_id} not found in fleet snapshot.")
+                continue
+            states[(dev_id, channel)] = self._state_from_pod(pod)
+        return states
+
+    def _get_fleet_pod(self, device_id, max_age):
+        if max_age is None or time.time() - self.fleet_updated > max_age:
+            return None
+        return self.fleet.get(device_id)
@@ -1,5 +1,5 @@
 # cloud/sonoff_client.py
-import requests
+import asyncio
 import json
 import hmac
 import hashlib
@@ -8,7 +8,10 @@ import random
 import string
 import urllib3
 import logging
-from utils.config import get_sonoff_creds  # <--- NEW IMPORT
+from utils.config import get_sonoff_creds, get_http_settings  # <--- NEW IMPORT
+from utils.http import build_session, AsyncSessionPool
+from utils.coalesce import SharedReader
+from utils.metrics import report_error
 
 # Disable SSL Warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -16,7 +19,10 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 logger = logging.getLogger("SonoffCloud")
 
 class SonoffCloudClient:
-    def __init__(self, app_id=None, app_secret=None, access_token=None, region='as'):
+    # Max number of devices coolkit accepts in one POST /device/thing
+    BATCH_SIZE = 10
+
+    def __init__(self, app_id=None, app_secret=None, access_token=None, region='as', http_settings=None):
         # Allow overrides, otherwise load from .env
         creds = get_sonoff_creds()
         
@@ -31,6 +37,19 @@ class SonoffCloudClient:
             
         self.api_url = f'https://{self.region}-apia.coolkit.cc/v2'
 
+        # Keep-alive pool shared by every request of this client
+        http_settings = http_settings or get_http_settings()
+        self.session = build_session(**http_settings)
+        self._async_sessions = AsyncSessionPool(**http_settings)
+
+        # Channels of one device asking within a short window share one read
+        self._reads = SharedReader()
+
+    @property
+    def available(self):
+        """ False without credentials: calls would fail. """
+        return bool(self.app_id and self.app_secret and self.access_token)
+
     # ... (Rest of the class methods: _get_signature, _make_request, set_state, get_state remain EXACTLY the same) ...
     def _get_signature(self, data_str):
         digest = hmac.new(
@@ -40,7 +59,7 @@ class SonoffCloudClient:
         ).digest()
         return base64.b64encode(digest).decode('utf-8')
 
-    def _make_request(self, method, endpoint, payload=None):
+    def _build_request(self, endpoint, payload=None):
         url = f"{self.api_url}{endpoint}"
         data_str = json.dumps(payload, separators=(',', ':')) if payload else ''
         sign = self._get_signature(data_str)
@@ -53,20 +72,55 @@ class SonoffCloudClient:
         }
         
         headers['Sign'] = sign 
+        return url, data_str, headers
+
+    def _make_request(self, method, endpoint, payload=None):
+        url, data_str, headers = self._build_request(endpoint, payload)
 
         try:
             if method == 'POST':
-                r = requests.post(url, data=data_str, headers=headers)
+                r = self.session.post(url, data=data_str, headers=headers)
             else:
-                r = requests.get(url, headers=headers)
+                r = self.session.get(url, headers=headers)
             return r.json()
         except Exception as e:
             logger.error(f"Cloud Connection Error: {e}")
+            report_error(e)
+            return {'error': -1}
+
+    async def _async_make_request(self, method, endpoint, payload=None):
+        url, data_str, headers = self._build_request(endpoint, payload)
+
+        try:
+            session = self._async_sessions.get()
+            if method == 'POST':
+                async with session.post(url, data=data_str, headers=headers) as r:
+                    return await r.json(content_type=None)
+            async with session.get(url, headers=headers) as r:
+                return await r.json(content_type=None)
+        except Exception as e:
+            logger.error(f"Cloud Connection Error: {e!r}")
+            report_error(e)
             return {'error': -1}
+
+    async def async_close(self):
+        """ Closes the aiohttp session bound to the running loop. """
+        await self._async_sessions.close()
     
     def set_state(self, device_id, state, channel=None):
         logger.info(f"Sending {state} to {device_id} (Channel: {channel})...")
-        
+        resp = self._make_request('POST', '/device/thing/status', self._switch_payload(device_id, state, channel))
+        self._reads.invalidate(device_id)
+        return self._check_command_response(resp)
+
+    async def async_set_state(self, device_id, state, channel=None):
+        logger.info(f"Sending {state} to {device_id} (Channel: {channel})...")
+        resp = await self._async_make_request('POST', '/device/thing/status', self._switch_payload(device_id, state, channel))
+        self._reads.invalidate(device_id)
+        return self._check_command_response(resp)
+
+    @staticmethod
+    def _switch_payload(device_id, state, channel=None):
         if channel is not None:
             params = {
                 "switches": [
@@ -78,14 +132,14 @@ class SonoffCloudClient:
                 "switch": state
             }
         
-        payload = {
+        return {
             'type': 1, 
             'id': device_id,
             'params': params
         }
-        
-        resp = self._make_request('POST', '/device/thing/status', payload)
-        
+
+    @staticmethod
+    def _check_command_response(resp):
         if resp.get('error') == 0:
             logger.info("Command delivered successfully.")
             return True
@@ -94,33 +148,112 @@ class SonoffCloudClient:
             return False
         
     def get_state(self, device_id, channel=None):
-        endpoint = f'/device/thing?id={device_id}'
-        logger.info(f"Fetching status for {device_id}...")
-        
-        resp = self._make_request('GET', endpoint)
-        
+        def _fetch():
+            logger.info(f"Fetching status for {device_id}...")
+            return self._make_request('GET', f'/device/thing?id={device_id}')
+
+        resp = self._reads.read(device_id, _fetch)
+        return self._parse_state_response(resp, device_id, channel)
+
+    async def async_get_state(self, device_id, channel=None):
+        async def _fetch():
+            logger.info(f"Fetching status for {device_id}...")
+            return await self._async_make_request('GET', f'/device/thing?id={device_id}')
+
+        resp = await self._reads.async_read(device_id, _fetch)
+        return self._parse_state_response(resp, device_id, channel)
+
+    def _parse_state_response(self, resp, device_id, channel):
         if resp.get('error') != 0:
             logger.error(f"API Error {resp.get('error')}: {resp.get('msg')}")
             return None
 
-        params = None
-        data = resp.get("data", {})
+        params = self._extract_params(resp.get("data", {}), device_id)
+
+        if not params:
+            logger.error(f"Could not find params for {device_id}")
+            return None
+
+        return self._state_from_params(params, channel)
+
+    def get_states(self, targets):
+        """
+        Batch version of get_state().
+        targets: iterable of (device_id, channel) tuples.
+        Returns {(device_id, channel): state} for every target that could be read.
+        Devices are fetched BATCH_SIZE at a time with POST /device/thing,
+        so 60 channels spread over 20 relays cost 2 requests instead of 60.
+        """
+        targets = list(targets)
+        params_by_id = {}
+
+        for payload in self._batch_payloads(targets):
+            resp = self._make_request('POST', '/device/thing', payload)
+            self._collect_params(resp, params_by_id)
+
+        return self._states_from_batch(targets, params_by_id)
+
+    async def async_get_states(self, targets):
+        """ Async version of get_states(); the batches are sent concurrently. """
+        targets = list(targets)
+        params_by_id = {}
 
+        responses = await asyncio.gather(*[
+            self._async_make_request('POST', '/device/thing', payload)
+            for payload in self._batch_payloads(targets)
+        ])
+        for resp in responses:
+            self._collect_params(resp, params_by_id)
+
+        return self._states_from_batch(targets, params_by_id)
+
+    def _batch_payloads(self, targets):
+        device_ids = list(dict.fromkeys(dev_id for dev_id, _ in targets))
+        for i in range(0, len(device_ids), self.BATCH_SIZE):
+            chunk = device_ids[i:i + self.BATCH_SIZE]
+            logger.info(f"Fetching status for {len(chunk)} devices (batch)...")
+            yield {'thingList': [{'itemType': 1, 'id': dev_id} for dev_id in chunk]}
+
+    @staticmethod
+    def _collect_params(resp, params_by_id):
+        if resp.get('error') != 0:
+            logger.error(f"API Error {resp.get('error')}: {resp.get('msg')}")
+            return
+
+        for thing in resp.get("data", {}).get("thingList", []):
+            item_data = thing.get("itemData", {})
+            if item_data.get("deviceid"):
+                params_by_id[item_data["deviceid"]] = item_data.get("params", {})
+
+    def _states_from_batch(self, targets, params_by_id):
+        states = {}
+        for dev_id, channel in targets:
+            params = params_by_id.get(dev_id)
+            if not params:
+                logger.error(f"Could not find params for {dev_id}")
+                continue
+            state = self._state_from_params(params, channel)
+            if state is not None:
+                states[(dev_id, channel)] = state
+        return states
+
+    @staticmethod
+    def _extract_params(data, device_id):
+        """ Finds the 'params' block of device_id in a /device/thing response. """
         if "thingList" in data:
             for thing in data["thingList"]:
                 item_data = thing.get("itemData", {})
                 if item_data.get("deviceid") == device_id:
-                    params = item_data.get("params", {})
-                    break
+                    return item_data.get("params", {})
         elif "itemData" in data:
-            params = data["itemData"].get("params", {})
+            return data["itemData"].get("params", {})
         elif "params" in data:
-            params = data.get("params", {})
-
-        if not params:
-            logger.error(f"Could not find params for {device_id}")
-            return None
+            return data.get("params", {})
+        return None
 
+    @staticmethod
+    def _state_from_params(params, channel=None):
+        """ Reads 'on'/'off' for the given channel out of a device's params. """
         if channel is not None:
             switches = params.get("switches", [])
             for sw in switches:
@@ -135,4 +268,4 @@ class SonoffCloudClient:
         if "switch" in params:
             return params["switch"]
             
-        return None
\ No newline at end of file
+        return None
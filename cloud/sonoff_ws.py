@@ -0,0 +1,186 @@
+# cloud/sonoff_ws.py
+import json
+import time
+import random
+import string
+import asyncio
+import logging
+import threading
+
+# aiohttp is only needed by the websocket push channel
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from utils.config import get_sonoff_push_settings
+
+logger = logging.getLogger("SonoffPushCloud")
+
+
+class SonoffCloudPush:
+    """
+    Persistent eWeLink websocket subscription.
+    - asks the dispatch server which websocket host serves the account
+    - logs in with 'userOnline' (this also subscribes to every device)
+    - answers the server heartbeat with 'ping'
+    - hands each device 'update' to on_update(device_id, params)
+    - reconnects (and re-logs in) with exponential backoff when dropped
+    Run it with await run() on a loop, or start()/stop() on its own thread.
+    """
+    RECONNECT_BASE = 1
+
+    def __init__(self, client, on_update=None, apikey=None, dispatch_url=None, reconnect_max=None):
+        settings = get_sonoff_push_settings()
+        self.client = client
+        self.on_update = on_update
+        self.apikey = apikey or settings['apikey']
+        self.dispatch_url = dispatch_url or settings['dispatch_url'] or f"https://{client.region}-dispa.coolkit.cc/dispatch/app"
+        self.reconnect_max = reconnect_max or settings['reconnect_max']
+
+        self.connected = False
+        self.connects = 0
+        self.updates = 0
+        self.last_update = None
+
+        self._stop = None  # asyncio.Event of the running loop
+        self._loop = None
+        self._thread = None
+
+    # --- LIFECYCLE ---
+
+    def start(self):
+        """ Runs the subscription on a background thread with its own loop. """
+        if aiohttp is None:
+            logger.warning("Cloud push needs 'aiohttp' (pip install aiohttp); polling only.")
+            return False
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=lambda: asyncio.run(self.run()), name="SonoffCloudPush", daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    async def run(self):
+        """ Keeps the subscription up until stop() is called. """
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        delay = self.RECONNECT_BASE
+
+        async with aiohttp.ClientSession() as session:
+            while not self._stop.is_set():
+                started = time.monotonic()
+                try:
+                    await self._session(session)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Sonoff websocket error: {e!r}")
+                finally:
+                    self.connected = False
+
+                if self._stop.is_set():
+                    break
+                # A connection that lived a while resets the backoff
+                if time.monotonic() - started > self.reconnect_max:
+                    delay = self.RECONNECT_BASE
+                logger.info(f"Sonoff websocket closed, reconnecting in {delay:.0f}s...")
+                try:
+                    await asyncio.wait_for(self._stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(self.reconnect_max, delay * 2)
+
+    # --- PROTOCOL ---
+
+    async def _session(self, session):
+        url = await self._dispatch(session)
+        apikey = self.apikey or await self._fetch_apikey()
+
+        async with session.ws_connect(url) as ws:
+            await ws.send_str(json.dumps(self._login_message(apikey)))
+            reply = json.loads((await ws.receive(timeout=10)).data)
+            if reply.get('error') != 0:
+                raise ConnectionError(f"userOnline rejected: {reply}")
+
+            self.connected = True
+            self.connects += 1
+            logger.info(f"Sonoff websocket connected ({url}).")
+
+            interval = reply.get('config', {}).get('hbInterval', 90)
+            heartbeat = asyncio.create_task(self._heartbeat(ws, interval))
+            stop = asyncio.create_task(self._stop.wait())
+            try:
+                while not self._stop.is_set():
+                    receive = asyncio.create_task(ws.receive())
+                    done, _ = await asyncio.wait({receive, stop}, return_when=asyncio.FIRST_COMPLETED)
+                    if receive not in done:
+                        receive.cancel()
+                        break
+                    msg = receive.result()
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break  # closed / error: reconnect
+                    self._handle(msg.data)
+            finally:
+                heartbeat.cancel()
+                stop.cancel()
+
+    async def _dispatch(self, session):
+        async with session.get(self.dispatch_url, timeout=aiohttp.ClientTimeout(total=10)) as r:
+            data = await r.json(content_type=None)
+        if data.get('error') != 0:
+            raise ConnectionError(f"Dispatch failed: {data}")
+        # Same security as the dispatch server (a local stand-in runs plain http)
+        scheme = 'ws' if self.dispatch_url.startswith('http://') else 'wss'
+        return f"{scheme}://{data['domain']}:{data['port']}/api/ws"
+
+    async def _fetch_apikey(self):
+        resp = await self.client._async_make_request('GET', '/user/profile')
+        apikey = resp.get('data', {}).get('user', {}).get('apikey')
+        if not apikey:
+            raise ConnectionError(f"Could not read the account apikey: {resp}")
+        self.apikey = apikey
+        return apikey
+
+    def _login_message(self, apikey):
+        return {
+            "action": "userOnline",
+            "at": self.client.access_token,
+            "apikey": apikey,
+            "appid": self.client.app_id,
+            "nonce": ''.join(random.choices(string.ascii_letters + string.digits, k=8)),
+            "ts": int(time.time()),
+            "userAgent": "app",
+            "sequence": str(int(time.time() * 1000)),
+            "version": 8
+        }
+
+    @staticmethod
+    async def _heartbeat(ws, interval):
+        # The server drops clients that stay silent longer than hbInterval
+        while True:
+            await asyncio.sleep(interval * 0.8)
+            await ws.send_str("ping")
+
+    def _handle(self, text):
+        if text == "pong":
+            return
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            logger.debug(f"Ignoring websocket message: {text[:80]}")
+            return
+
+        if msg.get('action') != 'update' or not msg.get('deviceid'):
+            return
+        self.updates += 1
+        self.last_update = time.time()
+        # A coalesced REST read from before the change must not be reused
+        self.client._reads.invalidate(msg['deviceid'])
+        if self.on_update:
+            try:
+                self.on_update(msg['deviceid'], msg.get('params', {}))
+            except Exception as e:
+                logger.error(f"Push update handler failed for {msg['deviceid']}: {e}")
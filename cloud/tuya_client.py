@@ -2,12 +2,21 @@
 import tinytuya
 import logging
 from utils.config import get_tuya_creds  # <--- NEW IMPORT
+from utils.coalesce import SharedReader
+from utils.metrics import report_error
 
 logger = logging.getLogger("TuyaCloud")
 
 class TuyaCloudClient:
+    # Max number of device IDs the OpenAPI accepts in one device_ids query
+    BATCH_SIZE = 20
+
     def __init__(self, api_region="eu"):
         self.cloud = None
+        # Last known cloud connectivity {device_id: bool}, see get_online_flags()
+        self.online = {}
+        # Channels of one device asking within a short window share one getstatus()
+        self._reads = SharedReader()
 
         # Load credentials
         creds = get_tuya_creds()
@@ -33,6 +42,11 @@ class TuyaCloudClient:
         else:
             logger.warning("Tuya credentials missing in .env")
 
+    @property
+    def available(self):
+        """ False without credentials / connection: calls would fail. """
+        return self.cloud is not None
+
     # ... (Rest of the class methods: set_state, get_state remain EXACTLY the same) ...
     def set_state(self, device_id, state, channel=None):
         if not self.cloud:
@@ -54,6 +68,7 @@ class TuyaCloudClient:
         
         try:
             result = self.cloud.sendcommand(device_id, commands)
+            self._reads.invalidate(device_id)
             if result and result.get('success'):
                 logger.info("Command delivered successfully.")
                 return True
@@ -62,29 +77,123 @@ class TuyaCloudClient:
                 return False
         except Exception as e:
             logger.error(f"Exception sending command: {e}")
+            report_error(e)
             return False
 
     def get_state(self, device_id, channel=None):
         if not self.cloud:
             return None
         
-        logger.info(f"Fetching status for {device_id}...")
+        def _fetch():
+            logger.info(f"Fetching status for {device_id}...")
+            return self.cloud.getstatus(device_id)
+
         try:
-            result = self.cloud.getstatus(device_id)
+            result = self._reads.read(device_id, _fetch)
             
             if result and result.get('success'):
-                status_list = result.get('result', [])
-                target_code = f"switch_{channel if channel else '1'}"
-                
-                for item in status_list:
-                    if item.get('code') == target_code:
-                        return 'on' if item.get('value') else 'off'
-                
-                logger.warning(f"Code {target_code} not found in cloud response.")
+                return self._state_from_status(result.get('result', []), channel)
             else:
                 logger.error(f"Cloud Get Status Failed: {result}")
                 
         except Exception as e:
             logger.error(f"Exception fetching status: {e}")
+            report_error(e)
             
-        return None
\ No newline at end of file
+        return None
+
+    # --- BULK READS ---
+
+    def get_statuses(self, device_ids):
+        """
+        Fetches the status list of many devices, BATCH_SIZE IDs per request.
+        Returns {device_id: [{'code': ..., 'value': ...}, ...]}.
+        """
+        if not self.cloud:
+            return {}
+
+        statuses = {}
+        for chunk in self._chunks(device_ids):
+            logger.info(f"Fetching status for {len(chunk)} devices (batch)...")
+            result = self._bulk_request('/v1.0/iot-03/devices/status', chunk)
+            for item in result or []:
+                if item.get('id'):
+                    statuses[item['id']] = item.get('status', [])
+        return statuses
+
+    def get_online_flags(self, device_ids):
+        """
+        Fetches the cloud 'online' flag of many devices, BATCH_SIZE IDs per request.
+        Returns {device_id: bool} (also merged into self.online).
+        """
+        if not self.cloud:
+            return {}
+
+        flags = {}
+        for chunk in self._chunks(device_ids):
+            result = self._bulk_request('/v1.0/iot-03/devices', chunk)
+            # Depending on the endpoint version the list is wrapped or not
+            if isinstance(result, dict):
+                result = result.get('list') or result.get('devices') or []
+            for item in result or []:
+                if item.get('id'):
+                    flags[item['id']] = bool(item.get('online'))
+
+        self.online.update(flags)
+        return flags
+
+    def get_states(self, targets):
+        """
+        Batch version of get_state().
+        targets: iterable of (device_id, channel) tuples.
+        Every channel of a multi-gang switch is decoded from the same status
+        list, so a 4-gang device costs one entry in one request, not four calls.
+        Devices the cloud reports as offline are left out (their cloud status
+        is only the last cached value).
+        Returns {(device_id, channel): state}.
+        """
+        targets = list(targets)
+        device_ids = list(dict.fromkeys(dev_id for dev_id, _ in targets))
+
+        try:
+            statuses = self.get_statuses(device_ids)
+            online = self.get_online_flags(device_ids)
+        except Exception as e:
+            logger.error(f"Exception fetching bulk status: {e}")
+            return {}
+
+        states = {}
+        for dev_id, channel in targets:
+            if online.get(dev_id) is False:
+                logger.warning(f"{dev_id} is offline according to Tuya Cloud.")
+                continue
+            if dev_id not in statuses:
+                continue
+            state = self._state_from_status(statuses[dev_id], channel)
+            if state is not None:
+                states[(dev_id, channel)] = state
+        return states
+
+    def _chunks(self, device_ids):
+        device_ids = list(dict.fromkeys(device_ids))
+        for i in range(0, len(device_ids), self.BATCH_SIZE):
+            yield device_ids[i:i + self.BATCH_SIZE]
+
+    def _bulk_request(self, url, device_ids):
+        result = self.cloud.cloudrequest(url, action='GET', query={'device_ids': ','.join(device_ids)})
+        if result and result.get('success'):
+            return result.get('result')
+        logger.error(f"Cloud Bulk Request Failed ({url}): {result}")
+        return None
+
+    @staticmethod
+    def _state_from_status(status_list, channel=None):
+        """ Decodes 'on'/'off' of one channel from a Tuya status list. """
+        target_code = f"switch_{channel if channel else '1'}"
+        
+        for item in status_list:
+            if item.get('code') == target_code:
+                return 'on' if item.get('value') else 'off'
+        
+        logger.warning(f"Code {target_code} not found in cloud response.")
+        return None
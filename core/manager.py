@@ -1,14 +1,30 @@
 # core/manager.py
+# Imported first: starts the start-up clock and times the imports below
+from utils.startup_profile import startup
+startup.track_imports()
+import asyncio
 import logging
-import concurrent.futures
 from cloud.sonoff_client import SonoffCloudClient
 from cloud.tuya_client import TuyaCloudClient
 from cloud.sensibo_client import SensiboCloudClient
+from cloud.sonoff_ws import SonoffCloudPush
+from devices.brands.sonoff import apply_update
+from devices.brands.sonoff_lan import get_default_transport
+from devices.brands.sonoff_mdns import SonoffPushSubscriber
+from devices.brands.tuya_discovery import TuyaBroadcastListener
 from utils.loader import load_devices
+from utils.state_refresh import refresh_states, async_refresh_states, unwrap_chain
+from utils.routing import routes
+from utils.metrics import metrics, MetricsExporter
+from utils.warmup import StateWarmup
+from utils.config import get_sonoff_push_settings, get_metrics_settings
 
 # Import your existing scanner tools
 from utils.scanner import get_my_ip_prefix, ping_device, get_mac_addresses
 
+# Imports timed: unhook __import__ even if initialize() (-> finish()) never runs
+startup.stop_tracking_imports()
+
 logger = logging.getLogger("SmartHomeManager")
 
 class SmartHomeManager:
@@ -22,24 +38,119 @@ class SmartHomeManager:
     def __init__(self):
         self.devices = {}
         self.categories = {}
+        self.warmup = None
+        self._warmup_task = None
         
         # 1. Initialize Cloud Clients
         logger.info("Initializing Cloud Clients...")
-        self.sonoff = SonoffCloudClient()
-        self.tuya = TuyaCloudClient()
-        self.sensibo = SensiboCloudClient()
+        with startup.phase('clients'):
+            with startup.phase('sonoff'):
+                self.sonoff = SonoffCloudClient()
+            with startup.phase('tuya'):
+                self.tuya = TuyaCloudClient()
+            with startup.phase('sensibo'):
+                self.sensibo = SensiboCloudClient()
+
+        # Sonoff DIY state announcements (mDNS), see start_push_updates()
+        self.push = SonoffPushSubscriber(on_update=self._on_push_update)
+        # Tuya UDP broadcasts: follows devices across DHCP changes
+        self.tuya_discovery = TuyaBroadcastListener()
+        # eWeLink websocket (optional, SONOFF_CLOUD_PUSH=1): updates of cloud-only devices
+        self.cloud_push = SonoffCloudPush(self.sonoff, on_update=self._on_cloud_update)
+        # Prometheus-text endpoint on localhost (optional, METRICS_PORT)
+        self.metrics_exporter = MetricsExporter()
+
+    def initialize(self, background=False):
+        """
+        Loads the configuration and builds the device map, then reads the
+        initial device states.
+        background=True returns as soon as the device map is built; states
+        are then read on a background thread (see get_warmup_progress() and
+        wait_for_device()).
+        """
+        self.categories = self._load_devices()
+        self.devices = self.categories.get('all', {})
+        self.warmup = StateWarmup(self.devices)
+        if background:
+            self.warmup.start()
+        else:
+            self.warmup.run()
+        with startup.phase('push_updates'):
+            self.start_push_updates()
+        if get_metrics_settings()['port']:
+            self.start_metrics_exporter()
+        startup.finish()
+        logger.info(f"System Ready. Loaded {len(self.devices)} devices"
+                    + (" (states loading in background)." if background else "."))
 
-    def initialize(self):
+    async def async_initialize(self, background=False):
         """
-        Loads the configuration and builds the device map.
+        Async version of initialize(). Building the device graph is blocking
+        (config parsing, device constructors) and runs in a worker thread;
+        the initial state pass then runs concurrently on the event loop
+        (as a task of its own with background=True).
         """
-        self.categories = load_devices(
-            sonoff_cloud=self.sonoff,
-            tuya_cloud=self.tuya,
-            sensibo_cloud=self.sensibo
-        )
+        self.categories = await asyncio.to_thread(self._load_devices)
         self.devices = self.categories.get('all', {})
-        logger.info(f"System Ready. Loaded {len(self.devices)} devices.")
+        self.warmup = StateWarmup(self.devices)
+        if background:
+            self._warmup_task = asyncio.create_task(self.warmup.async_run())
+        else:
+            await self.warmup.async_run()
+        with startup.phase('push_updates'):
+            self.start_push_updates()
+        if get_metrics_settings()['port']:
+            self.start_metrics_exporter()
+        startup.finish()
+        logger.info(f"System Ready. Loaded {len(self.devices)} devices"
+                    + (" (states loading in background)." if background else "."))
+
+    def _load_devices(self):
+        # Device graph only: the initial states are read by StateWarmup
+        with startup.phase('load_devices'):
+            return load_devices(
+                sonoff_cloud=self.sonoff,
+                tuya_cloud=self.tuya,
+                sensibo_cloud=self.sensibo,
+                fetch_state=False
+            )
+
+    # --- STARTUP PROFILE ---
+    def get_startup_report(self):
+        """
+        Where the start-up time went (see utils/startup_profile.py):
+        {'ready_at', 'imports_total', 'phases': [...], 'devices': {name: {step: s}}, 'imports': {...}}
+        """
+        return startup.report()
+
+    def get_startup_summary(self, n=10):
+        """ Printable list of the n slowest phases / device steps / imports. """
+        return startup.summary(n)
+
+    # --- STARTUP WARMUP ---
+    def get_warmup_progress(self):
+        """
+        Progress of the initial state pass:
+        {'total', 'ready', 'pending', 'offline', 'done', 'elapsed', 'error'}
+        """
+        if self.warmup is None:
+            return None
+        return self.warmup.progress()
+
+    def wait_for_device(self, name, timeout=None):
+        """
+        Blocks until one device has its first state (other devices keep
+        loading). Returns the device, or None if unknown / timed out.
+        """
+        if self.warmup is None or not self.warmup.wait(name, timeout):
+            return None
+        return self.devices.get(name)
+
+    async def async_wait_for_device(self, name, timeout=None):
+        """ Async version of wait_for_device(). """
+        if self.warmup is None or not await self.warmup.async_wait(name, timeout):
+            return None
+        return self.devices.get(name)
 
     def get_device(self, name):
         return self.devices.get(name)
@@ -52,25 +163,78 @@ class SmartHomeManager:
         """
         Forces a state refresh for ALL devices in parallel.
         Useful if the script has been running for a while.
+        LAN is tried first for every device; whatever misses on LAN is
+        fetched from the cloud in batches (see utils/state_refresh.py).
         """
         logger.info("Refreshing all device states...")
-        
-        def _refresh(device):
-            # This calls the device's get_state method (LAN -> Cloud fallback)
-            device.get_state()
-            return device
-
-        # Use threads to make this fast (otherwise 20 devices = 20 seconds)
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            list(executor.map(_refresh, self.devices.values()))
-            
+        refresh_states(self.devices.values())
+        logger.info("Refresh complete.")
+
+    async def async_refresh_all(self):
+        """
+        Async version of refresh_all(): every device is read concurrently on
+        one event loop, cloud fallback still batched per client.
+        """
+        logger.info("Refreshing all device states (async)...")
+        await async_refresh_states(self.devices.values())
         logger.info("Refresh complete.")
 
+    # --- PUSH UPDATES ---
+    def start_push_updates(self):
+        """
+        Subscribes to Sonoff DIY mDNS announcements: button presses and other
+        state changes update the matching devices without polling.
+        Also starts the Tuya broadcast listener, which repoints devices
+        whose IP changed, and the eWeLink websocket if SONOFF_CLOUD_PUSH is set.
+        Returns False if zeroconf is not installed.
+        """
+        self.tuya_discovery.start()
+        if get_sonoff_push_settings()['enabled']:
+            self.cloud_push.start()
+        return self.push.start()
+
+    def stop_push_updates(self):
+        self.push.stop()
+        self.tuya_discovery.stop()
+        self.cloud_push.stop()
+
+    def _on_cloud_update(self, device_id, params):
+        self._on_push_update(apply_update(device_id, params))
+
+    def get_tuya_registry(self):
+        """ {device_id: {'ip', 'version', 'product_key', 'last_seen', 'age'}} seen on the LAN. """
+        return self.tuya_discovery.snapshot()
+
+    def _on_push_update(self, updated):
+        # Wrappers (Light, Switch...) keep their own cached copy of the state
+        updated = {id(dev) for dev in updated}
+        for dev in self.devices.values():
+            chain = unwrap_chain(dev)
+            if id(chain[-1]) in updated:
+                for wrapper in chain[:-1]:
+                    wrapper._copy_state_from(chain[-1])
+
+    async def async_close(self):
+        """ Closes the aiohttp sessions opened on the running loop. """
+        self.stop_push_updates()
+        self.stop_metrics_exporter()
+        if self._warmup_task is not None and not self._warmup_task.done():
+            self._warmup_task.cancel()
+        for client in (self.sonoff, self.sensibo):
+            await client.async_close()
+        await get_default_transport().async_close()
+
     # --- ADDITION 2: SYSTEM HEALTH REPORT ---
     def get_system_health(self):
         """
         Returns a dictionary summary of the system.
         """
+        # Devices never read yet (or whose cache expired) would each trigger a
+        # LAN/cloud fetch via .state below; read them all in one batched pass instead.
+        unknown = [dev for dev in self.devices.values() if not dev.stateless and not dev.is_state_fresh()]
+        if unknown:
+            refresh_states(unknown)
+
         total = len(self.devices)
         online = 0
         offline = 0
@@ -89,5 +253,56 @@ class SmartHomeManager:
             "total_devices": total,
             "online": online,
             "offline": offline,
-            "stateless_ir": total - (online + offline)
+            "stateless_ir": total - (online + offline),
+            "routing": routes.stats()
         }
+
+    # --- DEVICE METRICS ---
+    def get_metrics(self, level=None):
+        """
+        Latency histograms and success / failure / timeout / fallback counts of
+        every LAN and cloud call (see utils/metrics.py).
+        level: 'devices', 'brands' or 'clients' for one aggregation only.
+        """
+        snapshot = metrics.snapshot()
+        return snapshot[level] if level else snapshot
+
+    def get_metrics_text(self):
+        """ Same metrics in the Prometheus text format. """
+        return metrics.prometheus()
+
+    def reset_metrics(self):
+        metrics.reset()
+
+    def start_metrics_exporter(self, port=None, host=None):
+        """ Serves get_metrics_text() on http://127.0.0.1:<port>/metrics. Returns the URL or None. """
+        if port is not None or host is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = MetricsExporter(port=port, host=host)
+        return self.metrics_exporter.url if self.metrics_exporter.start() else None
+
+    def stop_metrics_exporter(self):
+        self.metrics_exporter.stop()
+
+    # --- LAN / CLOUD ROUTING ---
+    def get_routing_report(self):
+        """
+        Routing decision and counters of every physical LAN device:
+        {(brand, device_id): {'route': 'lan'|'cloud', 'devices', 'consecutive_failures',
+         'open_for', 'next_probe_in', 'last_error', 'lan_ok', 'lan_failed',
+         'lan_skipped', 'times_opened', 'probes'}}
+        """
+        return routes.report()
+
+    def reset_routing(self, device_id=None):
+        """ Sends a device (or every device) back to LAN-first routing. """
+        for key in routes.report():
+            if device_id is None or key[1] == device_id:
+                routes.reset(key)
+
+    async def async_get_system_health(self):
+        """ Async version of get_system_health(). """
+        unknown = [dev for dev in self.devices.values() if not dev.stateless and not dev.is_state_fresh()]
+        if unknown:
+            await async_refresh_states(unknown)
+        return self.get_system_health()
@@ -110,9 +110,9 @@ class AirConditioner(SmartDevice):
         """
         Looks up the key in commands.yaml and sends via the blaster.
         """
-        hex_code = self.commands.get(cmd_key)
+        code = self.commands.get(cmd_key)
         
-        if not hex_code:
+        if not code:
             # Silent fail for 'on'/'off' lookups (so we can fallback)
             # But specific fail for mode/temp
             if cmd_key not in ['on', 'power', 'off']:
@@ -122,10 +122,13 @@ class AirConditioner(SmartDevice):
         logger.info(f"[{self.name}] Sending IR command: '{cmd_key}' via {self.device.name}")
         
         # Determine how to send based on the backing device type
-        if hasattr(self.device, 'send_hex'):
-            return self.device.send_hex(hex_code)
+        # (codes are pre-decoded packet bytes, see utils/config_cache.py)
+        if hasattr(self.device, 'send_code'):
+            return self.device.send_code(code)
+        elif hasattr(self.device, 'send_hex'):
+            return self.device.send_hex(code if isinstance(code, str) else code.hex())
         elif hasattr(self.device, 'send'):
-            return self.device.send(hex_code)
+            return self.device.send(code)
         
         logger.error(f"[{self.name}] Backing device {self.device.name} has no send method.")
         return False
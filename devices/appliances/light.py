@@ -47,6 +47,13 @@ class Light(SmartDevice):
         """
         return self.device.get_state()
 
+    async def async_set_state_lan(self, state):
+        """ Async version: awaits the backing device's own LAN -> Cloud logic. """
+        return await self.device.async_set_state(state)
+
+    async def async_get_state_lan(self):
+        return await self.device.async_get_state()
+
     # Explicit on/off methods for convenience
     def on(self):
         return self.set_state('on')
@@ -22,5 +22,11 @@ class Other(SmartDevice):
     def get_state_lan(self):
         return self.device.get_state()
     
+    async def async_set_state_lan(self, state):
+        return await self.device.async_set_state(state)
+
+    async def async_get_state_lan(self):
+        return await self.device.async_get_state()
+
     def on(self): return self.set_state('on')
     def off(self): return self.set_state('off')
\ No newline at end of file
@@ -12,13 +12,14 @@ class Television(SmartDevice):
         self.commands = command_dict
 
     def send(self, command_name):
-        hex_code = self.commands.get(command_name)
-        if not hex_code:
+        code = self.commands.get(command_name)
+        if not code:
             logger.error(f"[{self.name}] Command '{command_name}' not found.")
             return False
             
         logger.info(f"[{self.name}] Sending '{command_name}' via {self.blaster.name}...")
-        return self.blaster.send_hex(hex_code, repeat=1)
+        # Codes are pre-decoded packet bytes (utils/config_cache.py)
+        return self.blaster.send_code(code, repeat=1)
 
     def on(self):
         return self.send('power')
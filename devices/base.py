@@ -1,9 +1,31 @@
 # devices/base.py
+import asyncio
 import logging
+import time
+
+from utils.config import get_state_cache_settings
+from utils.routing import routes
+from utils.metrics import metrics, metered, async_metered, PATH_LAN, PATH_CLOUD
 
 logger = logging.getLogger("DeviceBase")
 
+# Where a cached state came from (SmartDevice.state_source)
+SOURCE_LAN = 'lan'
+SOURCE_CLOUD = 'cloud'
+SOURCE_PUSH = 'push'    # announced by the device itself (mDNS / broadcast)
+
+_cache_settings = get_state_cache_settings()
+
 class SmartDevice:
+    # State cache policy, seconds (None = never expires).
+    # - state_ttl: how long a known 'on'/'off' is trusted by the .state property
+    # - offline_ttl: how long an 'OFFLINE' result is trusted before retrying
+    # Override per class or per instance (device.state_ttl = 10).
+    state_ttl = _cache_settings['state_ttl']
+    offline_ttl = _cache_settings['offline_ttl']
+    # False for cloud-only devices: no LAN attempt, no LAN -> Cloud fallback counted
+    has_lan = True
+
     def __init__(self, name, ip, device_id, channel=None, cloud_client=None, stateless=False):
         self.name = name
         self.ip = ip
@@ -12,35 +34,129 @@ class SmartDevice:
         self.cloud_client = cloud_client
         self.stateless = stateless
         self._state = None
+        self._state_time = None    # time.monotonic() of the last update
+        self._state_source = None  # SOURCE_LAN / SOURCE_CLOUD / ...
     
     @property
     def state(self):
         if self.stateless:
             return "N/A"
-        # Only fetch if we really don't know (None). 
-        # If it is 'OFFLINE' or 'ERROR', we might want to respect that until forced refresh.
-        if self._state is None:
-             logger.info(f"[{self.name}] State unknown. Fetching...")
+        # Served from the cache while it is fresh (see state_ttl / offline_ttl).
+        # Unknown or expired states trigger one LAN -> Cloud fetch.
+        if not self.is_state_fresh():
+             logger.info(f"[{self.name}] State unknown or expired. Fetching...")
              self.get_state()
         return self._state
 
+    # --- STATE CACHE ---
+
+    @property
+    def state_age(self):
+        """ Seconds since the cached state was recorded (None if never). """
+        if self._state_time is None:
+            return None
+        return time.monotonic() - self._state_time
+
+    @property
+    def state_source(self):
+        return self._state_source
+
+    def is_state_fresh(self, max_age=None):
+        """
+        True if the cached state can be used without a network round-trip:
+        it exists, is younger than the TTL of its kind, and younger than
+        max_age if one is given.
+        """
+        if self._state is None or self._state_time is None:
+            return False
+
+        limit = self.offline_ttl if self._state == "OFFLINE" else self.state_ttl
+        if max_age is not None:
+            limit = max_age if limit is None else min(limit, max_age)
+
+        return limit is None or self.state_age <= limit
+
+    def _set_state(self, state, source):
+        self._state = state
+        self._state_time = time.monotonic()
+        self._state_source = source
+
+    def _copy_state_from(self, other):
+        """ Takes over the cached state (with its age and source) of another device. """
+        self._state = other._state
+        self._state_time = other._state_time
+        self._state_source = other._state_source
+
+    def _store_lan_state(self, state):
+        # Wrappers (Light, Switch...) read through their backing device, which
+        # knows whether the answer actually came from LAN or Cloud.
+        backing = getattr(self, 'device', None)
+        if isinstance(backing, SmartDevice) and backing._state == state:
+            self._copy_state_from(backing)
+        else:
+            self._set_state(state, SOURCE_LAN)
+
+    # --- LAN ROUTING ---
+
+    def _lan_circuit(self):
+        """
+        LAN circuit breaker of the physical device (see utils/routing.py).
+        Only devices with a per-device LAN key have one; wrappers delegate to
+        their backing device, which routes on its own.
+        """
+        key = getattr(self, '_read_key', None)
+        return routes.circuit(key, self) if key is not None else None
+
+    def _lan_allowed(self, circuit):
+        # Without a usable cloud route LAN stays the only way in, open circuit or not
+        if circuit is None or not _cloud_usable(self.cloud_client) or circuit.allow_lan():
+            return True
+        logger.debug(f"[{self.name}] LAN circuit open, going straight to Cloud.")
+        return False
+
+    @property
+    def route(self):
+        """ 'lan' or 'cloud' (LAN skipped until a background probe succeeds). """
+        circuit = self._lan_circuit()
+        return circuit.snapshot()['route'] if circuit is not None else 'lan'
+
+    # --- METRICS ---
+
+    def _metrics(self):
+        """
+        DeviceMetrics of this device (see utils/metrics.py), or None for
+        wrappers: their backing device records the actual LAN / cloud calls.
+        """
+        entry = self.__dict__.get('_device_metrics')
+        if entry is None:
+            wrapper = isinstance(getattr(self, 'device', None), SmartDevice)
+            entry = self._device_metrics = False if wrapper else metrics.for_device(self)
+        return entry or None
+
     def set_state_lan(self, state):
         raise NotImplementedError("Subclasses must implement set_state_lan()")
 
     def set_state(self, state):
-        # 1. Try LAN
-        try:
-            if self.set_state_lan(state):
-                self._state = state
-                return True
-        except Exception as e:
-            logger.warning(f"[{self.name}] LAN Exception: {e}")
+        meter = self._metrics()
+        # 1. Try LAN (unless its circuit is open)
+        circuit = self._lan_circuit()
+        if self.has_lan and self._lan_allowed(circuit):
+            try:
+                ok = metered(meter, 'set', PATH_LAN, self.set_state_lan, state)
+                _record(circuit, ok)
+                if ok:
+                    self._store_lan_state(state)
+                    return True
+            except Exception as e:
+                _record(circuit, False, e)
+                logger.warning(f"[{self.name}] LAN Exception: {e}")
 
         # 2. Fallback to Cloud
-        if self.cloud_client:
+        if _cloud_usable(self.cloud_client):
             logger.info(f"[{self.name}] LAN failed/unreachable. Switching to Cloud...")
-            if self.cloud_client.set_state(self.device_id, state, self.channel):
-                self._state = state
+            _count_fallback(self, meter, 'set')
+            if metered(meter, 'set', PATH_CLOUD, self.cloud_client.set_state, self.device_id, state, self.channel):
+                self._set_state(state, SOURCE_CLOUD)
                 return True
             else:
                 return False
@@ -54,32 +170,157 @@ class SmartDevice:
     def off(self):
         return self.set_state('off')
     
-    def get_state(self):
+    def get_state(self, max_age=None):
+        """
+        Returns the device state (LAN -> Cloud fallback).
+        max_age: if the cached state is younger than this many seconds it is
+        returned without touching the network.
+        """
         if self.stateless:
             return "N/A"
+
+        if max_age is not None and self.is_state_fresh(max_age):
+            return self._state
         
-        # 1. Try LAN
-        try:
-            state = self.get_state_lan()
-            if state is not None:
-                self._state = state
-                logger.info(f"[{self.name}] State (LAN): {state}")
-                return state
-        except Exception as e:
-            logger.debug(f"[{self.name}] LAN Get-State Error: {e}")
+        meter = self._metrics()
+        # 1. Try LAN (unless its circuit is open)
+        circuit = self._lan_circuit()
+        if self.has_lan and self._lan_allowed(circuit):
+            try:
+                state = metered(meter, 'get', PATH_LAN, self.get_state_lan)
+                _record(circuit, state is not None)
+                if state is not None:
+                    self._store_lan_state(state)
+                    logger.info(f"[{self.name}] State (LAN): {state}")
+                    return state
+            except Exception as e:
+                _record(circuit, False, e)
+                logger.debug(f"[{self.name}] LAN Get-State Error: {e}")
 
         # 2. Fallback to Cloud
-        if self.cloud_client:
+        if _cloud_usable(self.cloud_client):
             logger.info(f"[{self.name}] LAN unreachable. Fetching state from Cloud...")
-            state = self.cloud_client.get_state(self.device_id, self.channel)
+            _count_fallback(self, meter, 'get')
+            state = metered(meter, 'get', PATH_CLOUD, self.cloud_client.get_state, self.device_id, self.channel)
             if state is not None:
-                self._state = state
+                self._set_state(state, SOURCE_CLOUD)
                 return state
         
         logger.error(f"[{self.name}] Error: Could not retrieve state (Device Offline).")
         # CHANGED: Mark as offline to prevent infinite fetch loops in the .state property
-        self._state = "OFFLINE"
+        # (negative-cached for offline_ttl seconds)
+        self._set_state("OFFLINE", None)
         return "OFFLINE"
 
     def get_state_lan(self):
-        raise NotImplementedError("Subclasses must implement get_state_lan()")
\ No newline at end of file
+        raise NotImplementedError("Subclasses must implement get_state_lan()")
+
+    # --- ASYNC API ---
+    # Same LAN -> Cloud fallback as set_state()/get_state().
+    # Subclasses with a non-blocking transport override async_set_state_lan()
+    # and async_get_state_lan(); by default the blocking versions run in a
+    # worker thread so every device can be awaited.
+
+    async def async_set_state_lan(self, state):
+        return await asyncio.to_thread(self.set_state_lan, state)
+
+    async def async_get_state_lan(self):
+        return await asyncio.to_thread(self.get_state_lan)
+
+    async def async_set_state(self, state):
+        meter = self._metrics()
+        # 1. Try LAN (unless its circuit is open)
+        circuit = self._lan_circuit()
+        if self.has_lan and self._lan_allowed(circuit):
+            try:
+                ok = await async_metered(meter, 'set', PATH_LAN, self.async_set_state_lan, state)
+                _record(circuit, ok)
+                if ok:
+                    self._store_lan_state(state)
+                    return True
+            except Exception as e:
+                _record(circuit, False, e)
+                logger.warning(f"[{self.name}] LAN Exception: {e}")
+
+        # 2. Fallback to Cloud
+        if _cloud_usable(self.cloud_client):
+            logger.info(f"[{self.name}] LAN failed/unreachable. Switching to Cloud...")
+            _count_fallback(self, meter, 'set')
+            if await async_metered(meter, 'set', PATH_CLOUD, _cloud_call,
+                                   self.cloud_client, 'set_state', self.device_id, state, self.channel):
+                self._set_state(state, SOURCE_CLOUD)
+                return True
+            else:
+                return False
+
+        logger.error(f"[{self.name}] Failed: LAN unreachable and no Cloud client connected.")
+        return False
+
+    async def async_on(self):
+        return await self.async_set_state('on')
+
+    async def async_off(self):
+        return await self.async_set_state('off')
+
+    async def async_get_state(self, max_age=None):
+        if self.stateless:
+            return "N/A"
+
+        if max_age is not None and self.is_state_fresh(max_age):
+            return self._state
+
+        meter = self._metrics()
+        # 1. Try LAN (unless its circuit is open)
+        circuit = self._lan_circuit()
+        if self.has_lan and self._lan_allowed(circuit):
+            try:
+                state = await async_metered(meter, 'get', PATH_LAN, self.async_get_state_lan)
+                _record(circuit, state is not None)
+                if state is not None:
+                    self._store_lan_state(state)
+                    logger.info(f"[{self.name}] State (LAN): {state}")
+                    return state
+            except Exception as e:
+                _record(circuit, False, e)
+                logger.debug(f"[{self.name}] LAN Get-State Error: {e}")
+
+        # 2. Fallback to Cloud
+        if _cloud_usable(self.cloud_client):
+            logger.info(f"[{self.name}] LAN unreachable. Fetching state from Cloud...")
+            _count_fallback(self, meter, 'get')
+            state = await async_metered(meter, 'get', PATH_CLOUD, _cloud_call,
+                                        self.cloud_client, 'get_state', self.device_id, self.channel)
+            if state is not None:
+                self._set_state(state, SOURCE_CLOUD)
+                return state
+
+        logger.error(f"[{self.name}] Error: Could not retrieve state (Device Offline).")
+        self._set_state("OFFLINE", None)
+        return "OFFLINE"
+
+
+async def _cloud_call(client, method, *args):
+    """
+    Calls client.async_<method>() if the cloud client has a native async
+    version, otherwise runs the blocking <method>() in a worker thread.
+    """
+    native = getattr(client, f"async_{method}", None)
+    if native is not None:
+        return await native(*args)
+    return await asyncio.to_thread(getattr(client, method), *args)
+
+
+def _cloud_usable(client):
+    # Clients expose `available` (credentials / connection present)
+    return client is not None and getattr(client, 'available', True)
+
+
+def _record(circuit, ok, error=None):
+    if circuit is not None:
+        circuit.record(bool(ok), error)
+
+
+def _count_fallback(device, meter, op):
+    # Cloud-only devices (Sensibo) never tried LAN: not a fallback
+    if meter is not None and device.has_lan:
+        meter.fallback(op)
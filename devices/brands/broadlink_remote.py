@@ -1,31 +1,118 @@
 # devices/brands/broadlink_remote.py
 import broadlink
 import logging
+import threading
 from ..base import SmartDevice
+from utils.startup_profile import startup
+from utils.metrics import metered, PATH_LAN
 
 logger = logging.getLogger("Broadlink")
 
+
+class BroadlinkDiscovery:
+    """
+    ONE broadcast discovery shared by every BroadlinkRemote, instead of a
+    unicast hello() (and its timeout) per blaster. Started in the background
+    when the first remote is built; _connect() waits for it on first send.
+    """
+    TIMEOUT = 3
+
+    def __init__(self):
+        self._found = None
+        self._lock = threading.Lock()        # held while broadcasting
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """ Runs the discovery in the background (once). """
+        with self._start_lock:
+            if self._found is None and self._thread is None:
+                self._thread = threading.Thread(target=self.devices, name="BroadlinkDiscovery", daemon=True)
+                self._thread.start()
+
+    def devices(self):
+        """ {ip or mac hex: broadlink device} of every blaster that answered. """
+        with self._lock:
+            if self._found is None:
+                found = {}
+                try:
+                    devices = broadlink.discover(timeout=self.TIMEOUT)
+                    for device in devices:
+                        found[device.host[0]] = device
+                        found[_mac_key(device.mac)] = device
+                    logger.info(f"Broadlink discovery: {len(devices)} device(s) answered.")
+                except Exception as e:
+                    logger.warning(f"Broadlink discovery failed: {e}")
+                self._found = found
+            return self._found
+
+    def find(self, ip, mac=None):
+        found = self.devices()
+        if mac and _mac_key(mac) in found:
+            return found[_mac_key(mac)]
+        return found.get(ip)
+
+    def forget(self):
+        """ Next find() broadcasts again (e.g. after a blaster changed IP). """
+        with self._lock, self._start_lock:
+            self._found = None
+            self._thread = None
+
+
+def _mac_key(mac):
+    if isinstance(mac, (bytes, bytearray)):
+        return mac.hex()
+    return str(mac).lower().replace(':', '').replace('-', '')
+
+
+_discovery = BroadlinkDiscovery()
+
+
 class BroadlinkRemote(SmartDevice):
-    def __init__(self, name, ip, device_id, mac, cloud_client=None, stateless=True):
+    # Unicast fallback for blasters that did not answer the broadcast (other subnet)
+    HELLO_TIMEOUT = 2
+    PORT = 80
+
+    def __init__(self, name, ip, device_id, mac, cloud_client=None, stateless=True, discovery=None, port=None):
         super().__init__(name, ip, device_id, stateless=stateless)
         self.mac = mac
+        self.port = port or self.PORT
         self.device = None
         
-        # Try to connect immediately, but don't crash if it fails
-        self._connect()
+        # Connect lazily on first send; the shared broadcast discovery warms up meanwhile.
+        # Only blasters on the standard port answer the broadcast.
+        self.discovery = discovery or _discovery
+        if self.port == self.PORT:
+            self.discovery.start()
 
     def _connect(self):
-        try:
-            self.device = broadlink.hello(self.ip)
-            self.device.auth()
-            logger.info(f"[{self.name}] Connected to Broadlink device.")
-            return True
-        except Exception as e:
-            logger.warning(f"[{self.name}] Connection failed during init: {e}")
-            self.device = None
-            return False
+        with startup.measure_device(self.name, 'connect'):
+            try:
+                device = self.discovery.find(self.ip, self.mac) if self.port == self.PORT else None
+                if device is None:
+                    device = broadlink.hello(self.ip, port=self.port, timeout=self.HELLO_TIMEOUT)
+                device.auth()
+                self.device = device
+                logger.info(f"[{self.name}] Connected to Broadlink device.")
+                return True
+            except Exception as e:
+                logger.warning(f"[{self.name}] Connection failed: {e}")
+                self.device = None
+                return False
 
     def send_hex(self, hex_data, repeat=1):
+        return self.send_packet(bytes.fromhex(hex_data), repeat)
+
+    def send_code(self, code, repeat=1):
+        """ Sends a learned code: raw packet bytes, or hex text. """
+        if isinstance(code, str):
+            return self.send_hex(code, repeat)
+        return self.send_packet(code, repeat)
+
+    def send_packet(self, packet, repeat=1):
+        return metered(self._metrics(), 'send', PATH_LAN, self._send_packet, packet, repeat)
+
+    def _send_packet(self, packet, repeat):
         # 1. Ensure we have a device object
         if not self.device:
             logger.info(f"[{self.name}] Device not connected. Retrying...")
@@ -34,7 +121,6 @@ class BroadlinkRemote(SmartDevice):
 
         # 2. Send Data
         try:
-            packet = bytes.fromhex(hex_data)
             for _ in range(repeat):
                 self.device.send_data(packet)
             return True
@@ -6,63 +6,180 @@ Created on Thu Jan 29 19:19:13 2026
 """
 
 # devices/sensibo.py
-from ..base import SmartDevice
+import time
+from ..base import SmartDevice, SOURCE_CLOUD
+from utils.metrics import metered, async_metered, PATH_CLOUD
 import logging
 
 logger = logging.getLogger("SensiboDevice")
 
 class SensiboAC(SmartDevice):
+    # The climate snapshot (acState + measurements) is trusted this many seconds
+    climate_ttl = 60
+    # Cloud API only
+    has_lan = False
+
     def __init__(self, name, device_id, cloud_client=None, stateless=False):
         super().__init__(name, ip=None, device_id=device_id, channel=None, cloud_client=cloud_client, stateless=stateless)
 
+        # Cached climate model, filled from ONE combined request
+        self._ac_state = None
+        self._measurements = None
+        self._climate_time = None  # time.monotonic() of the last full read
+
     def set_state_lan(self, state):
         return False # Always force cloud
 
     def get_state_lan(self):
         return None # Always force cloud
 
+    # --- CLIMATE SNAPSHOT ---
+
+    def get_climate(self, max_age=None):
+        """
+        Returns the full climate picture of the AC:
+        {'on', 'mode', 'target_temperature', 'temperature_unit', 'fan_level',
+         'swing', 'room_temperature', 'humidity'}
+        Served from the cache (or a fresh fleet snapshot) when younger than
+        max_age (default: climate_ttl), otherwise fetched with one request.
+        Returns None if the AC could not be read.
+        """
+        if not self._load_cached_climate(max_age):
+            if not self.cloud_client:
+                return None
+            self._apply_pod(metered(self._metrics(), 'get', PATH_CLOUD, self.cloud_client.get_pod, self.device_id))
+        return self._build_climate()
+
+    async def async_get_climate(self, max_age=None):
+        if not self._load_cached_climate(max_age):
+            if not self.cloud_client:
+                return None
+            self._apply_pod(await async_metered(self._metrics(), 'get', PATH_CLOUD,
+                                                self.cloud_client.async_get_pod, self.device_id))
+        return self._build_climate()
+
+    def _load_cached_climate(self, max_age):
+        """ True if the cache (possibly refilled from the fleet snapshot) is fresh enough. """
+        max_age = self.climate_ttl if max_age is None else max_age
+
+        if self._climate_time is not None and time.monotonic() - self._climate_time <= max_age:
+            return True
+
+        # refresh_all fetches every pod in one call; reuse it if recent enough
+        client = self.cloud_client
+        fleet_updated = getattr(client, 'fleet_updated', 0)
+        if fleet_updated and time.time() - fleet_updated <= max_age:
+            pod = client.fleet.get(self.device_id)
+            if pod is not None:
+                self._apply_pod(pod, age=time.time() - fleet_updated)
+                return True
+        return False
+
+    def _apply_pod(self, pod, age=0):
+        if pod is None:
+            return
+        self._ac_state = pod.get('acState', {})
+        self._measurements = pod.get('measurements', {})
+        self._climate_time = time.monotonic() - age
+        self._set_state('on' if self._ac_state.get('on') else 'off', SOURCE_CLOUD)
+        self._state_time = self._climate_time
+
+    def _apply_ac_state(self, ac_state):
+        """
+        Updates the cache from the acState returned by a write.
+        None (command failed or not confirmed) leaves the cache as it was.
+        """
+        if ac_state is None:
+            return False
+        self._ac_state = ac_state
+        self._set_state('on' if ac_state.get('on') else 'off', SOURCE_CLOUD)
+        return True
+
+    def _build_climate(self):
+        if self._ac_state is None:
+            return None
+        measurements = self._measurements or {}
+        return {
+            'on': self._ac_state.get('on', False),
+            'mode': self._ac_state.get('mode'),
+            'target_temperature': self._ac_state.get('targetTemperature'),
+            'temperature_unit': self._ac_state.get('temperatureUnit'),
+            'fan_level': self._ac_state.get('fanLevel'),
+            'swing': self._ac_state.get('swing'),
+            'room_temperature': measurements.get('temperature'),
+            'humidity': measurements.get('humidity')
+        }
+
+    # --- STATE (served by the climate snapshot) ---
+
+    def get_state(self, max_age=None):
+        if self.stateless:
+            return "N/A"
+        # No max_age = forced read, same as SmartDevice.get_state()
+        climate = self.get_climate(max_age=0 if max_age is None else max_age)
+        return self._state_from_climate(climate)
+
+    async def async_get_state(self, max_age=None):
+        if self.stateless:
+            return "N/A"
+        climate = await self.async_get_climate(max_age=0 if max_age is None else max_age)
+        return self._state_from_climate(climate)
+
+    def _state_from_climate(self, climate):
+        if climate is None:
+            logger.error(f"[{self.name}] Error: Could not retrieve state (Device Offline).")
+            self._set_state("OFFLINE", None)
+            return "OFFLINE"
+        return self._state
+
+    def set_state(self, state):
+        return self._send({'on': (state == 'on')})
+
+    async def async_set_state(self, state):
+        return await self._async_send({'on': (state == 'on')})
+
+    def _send(self, state_dict):
+        if not self.cloud_client:
+            logger.error(f"[{self.name}] Failed: no Cloud client connected.")
+            return False
+        return self._apply_ac_state(metered(self._metrics(), 'set', PATH_CLOUD,
+                                            self.cloud_client.set_ac_state, self.device_id, state_dict))
+
+    async def _async_send(self, state_dict):
+        if not self.cloud_client:
+            logger.error(f"[{self.name}] Failed: no Cloud client connected.")
+            return False
+        return self._apply_ac_state(await async_metered(self._metrics(), 'set', PATH_CLOUD,
+                                                        self.cloud_client.async_set_ac_state, self.device_id, state_dict))
+
     # --- NEW AC CAPABILITIES ---
 
     def set_temperature(self, degrees):
         """ Sets target temperature (Integer) """
-        if self.cloud_client:
-            return self.cloud_client.send_ac_state(self.device_id, {'targetTemperature': int(degrees)})
-        return False
+        return self._send({'targetTemperature': int(degrees)})
 
     def set_mode(self, mode):
         """ Options: 'cool', 'heat', 'fan', 'dry', 'auto' """
-        if self.cloud_client:
-            # Also ensure device is ON when setting mode
-            return self.cloud_client.send_ac_state(self.device_id, {'on': True, 'mode': mode})
-        return False
+        # Also ensure device is ON when setting mode
+        return self._send({'on': True, 'mode': mode})
 
     def set_fan(self, level):
         """ Options: 'quiet', 'low', 'medium', 'medium_high', 'high', 'auto' """
-        if self.cloud_client:
-            return self.cloud_client.send_ac_state(self.device_id, {'fanLevel': level})
-        return False
-    
+        return self._send({'fanLevel': level})
+
     def get_room_temperature(self):
         """ Returns the actual room temperature in Celsius. """
-        if self.cloud_client:
-            data = self.cloud_client.get_measurements(self.device_id)
-            if data:
-                return data.get('temperature')
-        return None
+        climate = self.get_climate()
+        return climate['room_temperature'] if climate else None
 
     def get_humidity(self):
         """ Returns the relative humidity %. """
-        if self.cloud_client:
-            data = self.cloud_client.get_measurements(self.device_id)
-            if data:
-                return data.get('humidity')
-        return None
+        climate = self.get_climate()
+        return climate['humidity'] if climate else None
 
     # --- SWING CONTROL ---
     def set_swing(self, mode):
         """
         Common modes: 'stopped', 'rangeFull', 'fixedTop', 'fixedMiddle', 'fixedBottom'
         """
-        if self.cloud_client:
-            return self.cloud_client.send_ac_state(self.device_id, {'swing': mode})
-        return False
\ No newline at end of file
+        return self._send({'swing': mode})
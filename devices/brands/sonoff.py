@@ -1,88 +1,72 @@
 # devices/sonoff.py
-import requests
-import json
-import time
-import base64
-import hashlib
 import logging # <--- NEW IMPORT
-from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
-from Crypto.Random import get_random_bytes
 
-from ..base import SmartDevice
+from ..base import SmartDevice, SOURCE_LAN, SOURCE_PUSH
+from utils.metrics import is_timeout
+from utils.coalesce import lan_reads, lan_writes, channels
+from .sonoff_lan import get_default_transport
 
 logger = logging.getLogger("SonoffLAN") # <--- NEW LOGGER
 
 class SonoffSwitch(SmartDevice):
-    def __init__(self, name, ip, device_id, device_key, mac=None, channel=None, cloud_client=None, stateless=False):
+    def __init__(self, name, ip, device_id, device_key, mac=None, channel=None, cloud_client=None, stateless=False, transport=None, port=None):
         super().__init__(name, ip, device_id, channel, cloud_client, stateless=stateless)
         self.device_key = device_key
         self.mac = mac
-        self.port = 8081
-
-    def _encrypt_payload(self, data_dict):
-        # ... (Same encryption logic as before) ...
-        data_str = json.dumps(data_dict, separators=(',', ':'))
-        key_bytes = hashlib.md5(self.device_key.encode('utf-8')).digest()
-        iv = get_random_bytes(16)
-        cipher = AES.new(key_bytes, AES.MODE_CBC, iv)
-        ct_bytes = cipher.encrypt(pad(data_str.encode('utf-8'), AES.block_size))
-        encoded_data = base64.b64encode(ct_bytes).decode('utf-8')
-        encoded_iv = base64.b64encode(iv).decode('utf-8')
-        return encoded_data, encoded_iv
+        self.port = port or 8081
+        # Shared keep-alive / key-caching / decrypting transport (sonoff_lan.py)
+        self.transport = transport or get_default_transport()
+
+        # All channel objects of this relay share one /zeroconf/info read
+        self._read_key = ('sonoff', self.device_id)
+        channels.register(self._read_key, self)
 
     def _send_lan_request(self, endpoint, data_body):
-        url = f"http://{self.ip}:{self.port}/zeroconf/{endpoint}"
-        
-        payload = {
-            "sequence": str(int(time.time() * 1000)),
-            "deviceid": self.device_id,
-            "selfApikey": "123", 
+        return self.transport.request(self.ip, self.device_id, self.device_key, endpoint, data_body, self.port)
+
+    async def _async_send_lan_request(self, endpoint, data_body):
+        return await self.transport.async_request(self.ip, self.device_id, self.device_key, endpoint, data_body, self.port)
+
+    @property
+    def lan_timing(self):
+        """ Recent LAN latency of this device, see SonoffLanTransport.get_timing(). """
+        return self.transport.get_timing(self.device_id)
+
+    @staticmethod
+    def _switch_command(items):
+        """
+        Returns (endpoint, payload) for {channel: state, ...}.
+        Several outlets of one relay go out in a single 'switches' payload.
+        """
+        if None in items:
+            return "switch", {"switch": items[None]}
+        return "switches", {
+            "switches": [
+                {"outlet": int(channel), "switch": state}
+                for channel, state in items.items()
+            ]
         }
 
-        if self.device_key:
-            enc_data, iv = self._encrypt_payload(data_body)
-            payload["encrypt"] = True
-            payload["iv"] = iv
-            payload["data"] = enc_data
-        else:
-            payload["data"] = data_body
+    def _send_switch(self, items):
+        endpoint, payload = self._switch_command(items)
+        resp = self._send_lan_request(endpoint, payload)
+        lan_reads.invalidate(self._read_key)
+        return self._check_switch_response(resp)
 
-        r = requests.post(url, json=payload, timeout=2) 
-        return r.json()
+    async def _async_send_switch(self, items):
+        endpoint, payload = self._switch_command(items)
+        resp = await self._async_send_lan_request(endpoint, payload)
+        lan_reads.invalidate(self._read_key)
+        return self._check_switch_response(resp)
 
-    def set_state_lan(self, state):
-        try:
-            # logger.debug is useful here to avoid cluttering logs unless debugging
-            logger.debug(f"[{self.name}] Trying LAN control (Sonoff)...") # <--- CHANGED
-            
-            if self.channel is not None:
-                endpoint = "switches"
-                payload = {
-                    "switches": [
-                        {"outlet": int(self.channel), "switch": state}
-                    ]
-                }
-            else:
-                endpoint = "switch"
-                payload = {"switch": state}
-
-            resp = self._send_lan_request(endpoint, payload)
-            
-            if resp.get('error') == 0:
-                logger.info(f"[{self.name}] LAN Success.") # <--- CHANGED
-                return True
-            else:
-                logger.error(f"[{self.name}] LAN Error: {resp}") # <--- CHANGED
-                return False
-                
-        except Exception as e:
-            logger.warning(f"[{self.name}] LAN Unreachable ({e})") # <--- CHANGED
-            return False
-        
-    def get_state_lan(self):
-        resp = self._send_lan_request('info', {})
-        
+    def _check_switch_response(self, resp):
+        if resp and resp.get('error') == 0:
+            logger.info(f"[{self.name}] LAN Success.") # <--- CHANGED
+            return True
+        logger.error(f"[{self.name}] LAN Error: {resp}") # <--- CHANGED
+        return False
+
+    def _state_from_info(self, resp):
         if not resp or resp.get('error') != 0:
             return None
 
@@ -96,4 +80,65 @@ class SonoffSwitch(SmartDevice):
         else:
             return data.get('switch')
             
-        return None
\ No newline at end of file
+        return None
+
+    def set_state_lan(self, state):
+        try:
+            # logger.debug is useful here to avoid cluttering logs unless debugging
+            logger.debug(f"[{self.name}] Trying LAN control (Sonoff)...") # <--- CHANGED
+            # Concurrent writes to other outlets of this relay are merged in
+            return lan_writes.write(self._read_key, self.channel, state, self._send_switch, self)
+                
+        except Exception as e:
+            logger.warning(f"[{self.name}] LAN Unreachable ({e})") # <--- CHANGED
+            if is_timeout(e):
+                raise  # counted as a timeout by the metered caller
+            return False
+        
+    def get_state_lan(self):
+        resp = lan_reads.read(self._read_key, lambda: self._send_lan_request('info', {}))
+        self._fill_siblings(resp)
+        return self._state_from_info(resp)
+
+    def _fill_siblings(self, resp):
+        """ One info response holds every outlet: update the other channel objects too. """
+        for sibling in channels.siblings(self._read_key, self):
+            state = sibling._state_from_info(resp)
+            if state is not None:
+                sibling._set_state(state, SOURCE_LAN)
+
+    # --- ASYNC (non-blocking aiohttp transport) ---
+
+    async def async_set_state_lan(self, state):
+        try:
+            logger.debug(f"[{self.name}] Trying LAN control (Sonoff, async)...")
+            return await lan_writes.async_write(self._read_key, self.channel, state, self._async_send_switch, self)
+
+        except Exception as e:
+            logger.warning(f"[{self.name}] LAN Unreachable ({e!r})")
+            if is_timeout(e):
+                raise
+            return False
+
+    async def async_get_state_lan(self):
+        resp = await lan_reads.async_read(self._read_key, lambda: self._async_send_lan_request('info', {}))
+        self._fill_siblings(resp)
+        return self._state_from_info(resp)
+
+
+def apply_update(device_id, data, source=SOURCE_PUSH):
+    """
+    Applies a state block pushed by a relay ({'switch': ...} or
+    {'switches': [...]}, from mDNS or the cloud websocket) to every
+    SonoffSwitch channel of that relay. Returns the channel objects updated.
+    """
+    updated = []
+    for device in channels.siblings(('sonoff', device_id)):
+        state = device._state_from_info({'error': 0, 'data': data})
+        if state is None:
+            continue  # partial update that does not mention this outlet
+        if state != device._state:
+            logger.info(f"[{device.name}] State ({source}): {state}")
+        device._set_state(state, source)
+        updated.append(device)
+    return updated
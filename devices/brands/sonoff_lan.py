@@ -0,0 +1,164 @@
+# devices/brands/sonoff_lan.py
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+import functools
+from collections import deque
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad, unpad
+from Crypto.Random import get_random_bytes
+
+from utils.config import get_lan_http_settings
+from utils.http import build_session, AsyncSessionPool
+
+logger = logging.getLogger("SonoffLAN")
+
+
+@functools.lru_cache(maxsize=1024)
+def derive_key(device_key):
+    """ AES-128 key of a Sonoff DIY device = MD5(device_key). Cached per key. """
+    return hashlib.md5(device_key.encode('utf-8')).digest()
+
+
+def encrypt_data(device_key, data_dict):
+    """ Returns (base64 ciphertext, base64 iv) for a DIY 'data' block. """
+    data_str = json.dumps(data_dict, separators=(',', ':'))
+    iv = get_random_bytes(16)
+    cipher = AES.new(derive_key(device_key), AES.MODE_CBC, iv)
+    ct_bytes = cipher.encrypt(pad(data_str.encode('utf-8'), AES.block_size))
+    return base64.b64encode(ct_bytes).decode('utf-8'), base64.b64encode(iv).decode('utf-8')
+
+
+def decrypt_data(device_key, data_b64, iv_b64):
+    """ Inverse of encrypt_data(); returns the decoded JSON (dict). """
+    cipher = AES.new(derive_key(device_key), AES.MODE_CBC, base64.b64decode(iv_b64))
+    plain = unpad(cipher.decrypt(base64.b64decode(data_b64)), AES.block_size)
+    return json.loads(plain.decode('utf-8'))
+
+
+class SonoffLanTransport:
+    """
+    Sonoff DIY LAN transport shared by every SonoffSwitch:
+    - one keep-alive pool (a small pool per device IP), sync and async
+    - derived AES keys cached per device key
+    - encrypted responses ('encrypt': true) are decrypted transparently,
+      so callers always get 'data' as a dict
+    - per-request timing, see get_timing()
+    """
+    PORT = 8081
+    TIMING_WINDOW = 50  # latencies kept per device
+
+    def __init__(self, http_settings=None):
+        http_settings = http_settings or get_lan_http_settings()
+        self.session = build_session(**http_settings)
+        self._async_sessions = AsyncSessionPool(**http_settings)
+
+        self._timings = {}
+        self._timings_lock = threading.Lock()
+
+    # --- REQUESTS ---
+
+    def request(self, ip, device_id, device_key, endpoint, data_body, port=None):
+        url, payload = self._build_request(ip, device_id, device_key, endpoint, data_body, port)
+
+        start = time.perf_counter()
+        try:
+            r = self.session.post(url, json=payload)
+            resp = r.json()
+        finally:
+            self._record(device_id, time.perf_counter() - start)
+        return self._decode_response(device_key, resp)
+
+    async def async_request(self, ip, device_id, device_key, endpoint, data_body, port=None):
+        url, payload = self._build_request(ip, device_id, device_key, endpoint, data_body, port)
+
+        start = time.perf_counter()
+        try:
+            async with self._async_sessions.get().post(url, json=payload) as r:
+                resp = await r.json(content_type=None)
+        finally:
+            self._record(device_id, time.perf_counter() - start)
+        return self._decode_response(device_key, resp)
+
+    async def async_close(self):
+        """ Closes the aiohttp session bound to the running loop. """
+        await self._async_sessions.close()
+
+    def _build_request(self, ip, device_id, device_key, endpoint, data_body, port):
+        url = f"http://{ip}:{port or self.PORT}/zeroconf/{endpoint}"
+
+        payload = {
+            "sequence": str(int(time.time() * 1000)),
+            "deviceid": device_id,
+            "selfApikey": "123",
+        }
+
+        if device_key:
+            enc_data, iv = encrypt_data(device_key, data_body)
+            payload["encrypt"] = True
+            payload["iv"] = iv
+            payload["data"] = enc_data
+        else:
+            payload["data"] = data_body
+
+        return url, payload
+
+    def _decode_response(self, device_key, resp):
+        # A JSON list / null is not a DIY answer
+        if not isinstance(resp, dict):
+            logger.warning(f"Unexpected LAN response: {resp!r:.80}")
+            return None
+        data = resp.get('data')
+
+        if resp.get('encrypt') and isinstance(data, str) and data:
+            if not device_key:
+                logger.warning(f"Encrypted response from {resp.get('deviceid')} but no device_key configured.")
+                return resp
+            resp['data'] = decrypt_data(device_key, data, resp.get('iv', ''))
+
+        # Some firmwares send the plain 'data' block as a JSON string
+        elif isinstance(data, str) and data:
+            resp['data'] = json.loads(data)
+
+        return resp
+
+    # --- TIMING ---
+
+    def _record(self, device_id, elapsed):
+        with self._timings_lock:
+            window = self._timings.get(device_id)
+            if window is None:
+                window = self._timings[device_id] = deque(maxlen=self.TIMING_WINDOW)
+            window.append(elapsed)
+
+    def get_timing(self, device_id):
+        """
+        Latency of the recent LAN requests to one device (seconds):
+        {'last', 'avg', 'max', 'count'} or None if it was never contacted.
+        """
+        with self._timings_lock:
+            window = list(self._timings.get(device_id, ()))
+        if not window:
+            return None
+        return {
+            'last': window[-1],
+            'avg': sum(window) / len(window),
+            'max': max(window),
+            'count': len(window)
+        }
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+def get_default_transport():
+    """ The transport shared by every SonoffSwitch that was not given its own. """
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = SonoffLanTransport()
+    return _default_transport
@@ -0,0 +1,145 @@
+# devices/brands/sonoff_mdns.py
+import json
+import socket
+import logging
+import threading
+
+# zeroconf is only needed for push updates (SmartHomeManager.start_push_updates)
+try:
+    from zeroconf import ServiceBrowser, Zeroconf, ServiceListener
+except ImportError:
+    Zeroconf = None
+    ServiceListener = object
+
+from utils.coalesce import lan_reads, channels
+from utils.routing import routes
+from .sonoff import apply_update
+from .sonoff_lan import decrypt_data
+
+logger = logging.getLogger("SonoffPush")
+
+SERVICE_TYPE = "_ewelink._tcp.local."
+
+
+def parse_txt(properties):
+    """ zeroconf TXT properties (bytes -> bytes) as a str -> str dict. """
+    props = {}
+    for k, v in properties.items():
+        key = k.decode('utf-8') if isinstance(k, bytes) else k
+        val = v.decode('utf-8') if isinstance(v, bytes) else v
+        props[key] = val or ''
+    return props
+
+
+def decode_txt_data(props, device_key=None):
+    """
+    Returns the state block of a Sonoff DIY announcement as a dict
+    ({'switch': 'on', ...} or {'switches': [...]}), or None.
+    The block is split over data1..data4; if 'encrypt' is set it is
+    AES-CBC encrypted with the device key, like /zeroconf responses.
+    """
+    data = ''.join(props.get(f"data{i}", '') for i in range(1, 5))
+    if not data:
+        return None
+
+    if props.get('encrypt', '').lower() == 'true':
+        if not device_key:
+            logger.debug(f"[{props.get('id')}] Encrypted announcement but no device_key configured.")
+            return None
+        return decrypt_data(device_key, data, props.get('iv', ''))
+
+    return json.loads(data)
+
+
+class SonoffPushListener(ServiceListener):
+    """
+    Applies Sonoff DIY state announcements to the matching SonoffSwitch
+    objects (every channel of the relay) as soon as the device publishes them,
+    e.g. after a physical button press.
+    on_update(devices) is called with the channel objects that changed.
+    """
+    def __init__(self, on_update=None):
+        self.on_update = on_update
+        self._last_seq = {}
+
+    def add_service(self, zc, type_, name):
+        self._handle(zc, type_, name)
+
+    def update_service(self, zc, type_, name):
+        self._handle(zc, type_, name)
+
+    def remove_service(self, zc, type_, name):
+        pass
+
+    def _handle(self, zc, type_, name):
+        try:
+            info = zc.get_service_info(type_, name)
+            if info:
+                self.apply(parse_txt(info.properties), [socket.inet_ntoa(a) for a in info.addresses])
+        except Exception as e:
+            logger.warning(f"Could not process announcement {name}: {e}")
+
+    def apply(self, props, addresses=()):
+        """ Updates the devices from one TXT record. Returns the channel objects updated. """
+        device_id = props.get('id')
+        key = ('sonoff', device_id)
+        devices = channels.siblings(key)
+        if not device_id or not devices:
+            return []
+
+        # The same record is re-announced (and re-delivered) several times
+        seq = props.get('seq')
+        if seq is not None and self._last_seq.get(device_id) == seq:
+            return []
+
+        data = decode_txt_data(props, devices[0].device_key)
+        if data is None:
+            return []
+        self._last_seq[device_id] = seq
+
+        # The device just spoke on the LAN: drop stale reads, reopen LAN routing
+        lan_reads.invalidate(key)
+        routes.reset(key)
+
+        for device in devices:
+            if addresses and device.ip != addresses[0]:
+                logger.info(f"[{device.name}] IP changed {device.ip} -> {addresses[0]}")
+                device.ip = addresses[0]
+
+        updated = apply_update(device_id, data)
+
+        if updated and self.on_update:
+            self.on_update(updated)
+        return updated
+
+
+class SonoffPushSubscriber:
+    """ Long-running mDNS browser for _ewelink._tcp (start() / stop()). """
+    def __init__(self, on_update=None):
+        self.listener = SonoffPushListener(on_update)
+        self._zeroconf = None
+        self._browser = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._zeroconf is not None
+
+    def start(self):
+        if Zeroconf is None:
+            logger.warning("Push updates need the 'zeroconf' library (pip install zeroconf); polling only.")
+            return False
+        with self._lock:
+            if self._zeroconf is None:
+                self._zeroconf = Zeroconf()
+                self._browser = ServiceBrowser(self._zeroconf, SERVICE_TYPE, self.listener)
+                logger.info("Listening for Sonoff DIY announcements...")
+        return True
+
+    def stop(self):
+        with self._lock:
+            if self._zeroconf is not None:
+                self._browser.cancel()
+                self._zeroconf.close()
+                self._zeroconf = None
+                self._browser = None
@@ -7,30 +7,36 @@ Created on Mon Jan 26 18:58:58 2026
 
 # devices/tuya.py
 import tinytuya
-import time
-from ..base import SmartDevice
+from ..base import SmartDevice, SOURCE_LAN
+from utils.metrics import is_timeout
+from utils.coalesce import lan_reads, lan_writes, channels
+from .tuya_protocol import async_request, TUYA_PORT
+from .tuya_pool import get_default_pool
 import logging  # <--- NEW IMPORT
 
 logger = logging.getLogger("TuyaLAN")  # <--- NEW LOGGER
 
 class TuyaSwitch(SmartDevice):
-    def __init__(self, name, ip, device_id, local_key, version=3.3, channel=None, cloud_client=None, stateless=False):
+    def __init__(self, name, ip, device_id, local_key, version=3.3, channel=None, cloud_client=None, stateless=False, pool=None, port=None):
         super().__init__(name, ip, device_id, channel, cloud_client, stateless=stateless)
         
         self.local_key = local_key
         self.version = version
+        self.port = port or TUYA_PORT
         
-        # Initialize TinyTuya Device
-        # We use OutletDevice as a generic handler for switches/plugs
-        self.device = tinytuya.OutletDevice(
-            dev_id=self.device_id,
-            address=self.ip,
-            local_key=self.local_key, 
-            version=self.version
-        )
-        
-        # Optimization: Persist connection if possible, but handle disconnects gracefully
-        self.device.set_socketPersistent(False) 
+        # Persistent socket shared by every channel of this physical device.
+        # The pool keeps it alive with heartbeats and reconnects with backoff.
+        self.pool = pool or get_default_pool()
+        self.connection = self.pool.get(self.device_id, self.ip, self.local_key, self.version, self.port)
+
+        # All channel objects of this device share one status() read
+        self._read_key = ('tuya', self.device_id)
+        channels.register(self._read_key, self)
+
+    @property
+    def device(self):
+        """ The shared tinytuya OutletDevice of this physical device. """
+        return self.connection.device
 
     def _get_dps_index(self):
         """
@@ -43,32 +49,33 @@ class TuyaSwitch(SmartDevice):
         """
         Implementation of Abstract Method.
         Uses TinyTuya to send command locally.
+        Concurrent writes to other channels of this device are merged into
+        the same CONTROL payload (e.g. {'1': True, '2': True, '3': True}).
         """
         logger.debug(f"[{self.name}] Trying LAN control (Tuya)...")
         
         try:
-            target_bool = (state == 'on')
-            dps_index = self._get_dps_index()
-            
-            # Send payload: {'1': True} or {'2': False}
-            payload = self.device.generate_payload(
-                tinytuya.CONTROL, 
-                {dps_index: target_bool}
-            )
-            
-            # Send request
-            data = self.device._send_receive(payload)
-            
-            # TinyTuya returns None on failure or a dict on success
-            if data and 'Error' not in data:
-                logger.info(f"[{self.name}] LAN Success.")  # <--- NOW HAS TIMESTAMP
-                return True
-            else:
-                logger.error(f"[{self.name}] LAN Error: {data}")
-                return False
+            return lan_writes.write(self._read_key, self._get_dps_index(), (state == 'on'), self._send_dps, self)
                 
         except Exception as e:
             logger.warning(f"[{self.name}] LAN Unreachable ({e})")
+            if is_timeout(e):
+                raise  # counted as a timeout by the metered caller
+            return False
+
+    def _send_dps(self, dps):
+        # Send payload: {'1': True, '2': False, ...} on the shared socket
+        data = self.connection.call(
+            lambda device: device._send_receive(device.generate_payload(tinytuya.CONTROL, dps))
+        )
+        lan_reads.invalidate(self._read_key)
+        
+        # TinyTuya returns None on failure or a dict on success
+        if data and 'Error' not in data:
+            logger.info(f"[{self.name}] LAN Success.")  # <--- NOW HAS TIMESTAMP
+            return True
+        else:
+            logger.error(f"[{self.name}] LAN Error: {data}")
             return False
 
     def get_state_lan(self):
@@ -77,20 +84,71 @@ class TuyaSwitch(SmartDevice):
         Parses Tuya's 'dps' dictionary (e.g. {'1': True, '2': False}).
         """
         try:
-            data = self.device.status()
-            
-            if not data or 'dps' not in data:
-                return None
-            
-            dps = data['dps']
-            dps_index = self._get_dps_index()
-            
-            if dps_index in dps:
-                is_on = dps[dps_index]
-                return 'on' if is_on else 'off'
-            
-            return None
+            data = lan_reads.read(self._read_key, lambda: self.connection.call(lambda device: device.status()))
+            self._fill_siblings(data)
+            return self._state_from_status(data)
             
         except Exception as e:
             logger.debug(f"[{self.name}] LAN Get-State Error: {e}")
-            return None
\ No newline at end of file
+            if is_timeout(e):
+                raise
+            return None
+
+    def _fill_siblings(self, data):
+        """ One status() holds every dps index: update the other channel objects too. """
+        for sibling in channels.siblings(self._read_key, self):
+            state = sibling._state_from_status(data)
+            if state is not None:
+                sibling._set_state(state, SOURCE_LAN)
+
+    def _state_from_status(self, data):
+        if not data or 'dps' not in data:
+            return None
+        
+        dps = data['dps']
+        dps_index = self._get_dps_index()
+        
+        if dps_index in dps:
+            is_on = dps[dps_index]
+            return 'on' if is_on else 'off'
+        
+        return None
+
+    # --- ASYNC (pooled socket in a worker thread, see tuya_protocol.py) ---
+
+    async def async_set_state_lan(self, state):
+        logger.debug(f"[{self.name}] Trying LAN control (Tuya, async)...")
+
+        try:
+            return await lan_writes.async_write(self._read_key, self._get_dps_index(), (state == 'on'), self._async_send_dps, self)
+
+        except Exception as e:
+            logger.warning(f"[{self.name}] LAN Unreachable ({e!r})")
+            if is_timeout(e):
+                raise
+            return False
+
+    async def _async_send_dps(self, dps):
+        data = await async_request(self.device, tinytuya.CONTROL, dps, blocking_call=self.connection.call)
+        lan_reads.invalidate(self._read_key)
+
+        # None / an error dict is a failure
+        if data is not None and 'Error' not in data:
+            logger.info(f"[{self.name}] LAN Success.")
+            return True
+        logger.error(f"[{self.name}] LAN Error: {data}")
+        return False
+
+    async def async_get_state_lan(self):
+        try:
+            data = await lan_reads.async_read(
+                self._read_key,
+                lambda: async_request(self.device, tinytuya.DP_QUERY, blocking_call=self.connection.call)
+            )
+            self._fill_siblings(data)
+            return self._state_from_status(data)
+        except Exception as e:
+            logger.debug(f"[{self.name}] LAN Get-State Error: {e!r}")
+            if is_timeout(e):
+                raise
+            return None
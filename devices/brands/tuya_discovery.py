@@ -0,0 +1,163 @@
+# devices/brands/tuya_discovery.py
+import json
+import time
+import socket
+import logging
+import threading
+import tinytuya
+
+from utils.coalesce import lan_reads, channels
+from utils.routing import routes
+
+logger = logging.getLogger("TuyaDiscovery")
+
+# 6666: plain (3.1), 6667: encrypted (3.3+). 7000 is the app port, not devices.
+BROADCAST_PORTS = (6666, 6667)
+
+
+def decode_broadcast(packet):
+    """
+    Decodes one Tuya discovery broadcast into a dict
+    ({'gwId', 'ip', 'version', 'productKey', ...}) or None.
+    """
+    try:
+        payload = tinytuya.decrypt_udp(packet)
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        data = json.loads(payload)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or not data.get('gwId') or not data.get('ip'):
+        return None
+    return data
+
+
+class TuyaBroadcastListener:
+    """
+    Listens for the UDP broadcasts every Tuya device sends every few seconds
+    and keeps a device_id -> {'ip', 'version', 'product_key', 'last_seen'}
+    registry. When a known device shows up on a new IP (DHCP) or protocol
+    version, its pooled connection and TuyaSwitch objects are repointed live.
+    """
+    def __init__(self, ports=BROADCAST_PORTS, on_change=None):
+        self.ports = ports
+        self.on_change = on_change
+        self.registry = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def start(self):
+        if self._stop.is_set():
+            # Stopped but possibly still inside recvfrom(): let those exit first
+            self._join()
+        if self.running:
+            return True
+        self._stop.clear()
+        self._threads = []
+        for port in self.ports:
+            try:
+                sock = self._open_socket(port)
+            except OSError as e:
+                logger.warning(f"Cannot listen on UDP {port}: {e}")
+                continue
+            thread = threading.Thread(target=self._listen, args=(sock,), name=f"TuyaUDP{port}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        if self._threads:
+            logger.info(f"Listening for Tuya broadcasts on UDP {', '.join(str(p) for p in self.ports)}...")
+        return bool(self._threads)
+
+    def stop(self, timeout=2):
+        """ Stops listening and waits (up to `timeout` s) for the listen threads to exit. """
+        self._stop.set()
+        self._join(timeout)
+
+    def _join(self, timeout=2):
+        # The sockets time out every second, so the threads see _stop quickly
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def get(self, device_id):
+        with self._lock:
+            entry = self.registry.get(device_id)
+            return dict(entry) if entry else None
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            return {
+                dev_id: {**entry, 'age': now - entry['last_seen']}
+                for dev_id, entry in self.registry.items()
+            }
+
+    @staticmethod
+    def _open_socket(port):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            # Lets tinytuya's own scanner run alongside
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(('', port))
+        sock.settimeout(1)
+        return sock
+
+    def _listen(self, sock):
+        with sock:
+            while not self._stop.is_set():
+                try:
+                    packet, _ = sock.recvfrom(4096)
+                except socket.timeout:
+                    continue
+                except OSError as e:
+                    logger.warning(f"Tuya broadcast socket error: {e}")
+                    return
+
+                data = decode_broadcast(packet)
+                if data is not None:
+                    self.apply(data)
+
+    def apply(self, data):
+        """ Records one decoded broadcast. Returns True if the device moved. """
+        device_id, ip = data['gwId'], data['ip']
+        version = data.get('version')
+
+        with self._lock:
+            previous = self.registry.get(device_id)
+            self.registry[device_id] = {
+                'ip': ip,
+                'version': version,
+                'product_key': data.get('productKey'),
+                'last_seen': time.time()
+            }
+        if previous and previous['ip'] == ip and previous['version'] == version:
+            return False
+
+        key = ('tuya', device_id)
+        devices = channels.siblings(key)
+        if not devices:
+            if previous is None:
+                logger.debug(f"Unconfigured Tuya device {device_id} at {ip} (v{version})")
+            return False
+
+        # Channels share one pooled connection (normally one pool for all)
+        pools = {id(d.pool): d.pool for d in devices}.values()
+        moved = any([pool.repoint(device_id, ip, version) for pool in pools])
+        for device in devices:
+            device.ip = ip
+            if version:
+                device.version = float(version)
+
+        if moved:
+            # Old address failures no longer apply
+            lan_reads.invalidate(key)
+            routes.reset(key)
+            if self.on_change:
+                self.on_change(device_id, ip, version)
+        return moved
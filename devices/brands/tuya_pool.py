@@ -0,0 +1,238 @@
+# devices/brands/tuya_pool.py
+import time
+import logging
+import threading
+import tinytuya
+
+from utils.config import get_tuya_pool_settings
+from .tuya_protocol import TUYA_PORT, raise_for_timeout
+
+logger = logging.getLogger("TuyaPool")
+
+
+class TuyaConnection:
+    """
+    One persistent tinytuya socket to ONE physical Tuya device.
+    Shared by every TuyaSwitch channel of that device; calls are serialized
+    with a lock because a tinytuya device object is not thread-safe.
+    After a failure the connection backs off exponentially and fails fast
+    (so callers fall back to the cloud) until the backoff has elapsed.
+    Every call enforces the socket cap of the pool it belongs to.
+    """
+    def __init__(self, device_id, address, local_key, version, settings, port=TUYA_PORT, pool=None):
+        self.device_id = device_id
+        self.pool = pool
+        self.address = address
+        self.port = port
+        self.local_key = local_key
+        self.version = version
+        self.settings = settings
+        # tinytuya device built on first use (a missing IP makes tinytuya scan the LAN)
+        self._device = None
+
+        self.lock = threading.RLock()
+        self.last_used = time.monotonic()
+        self.failures = 0
+        self.retry_at = 0
+
+    @property
+    def device(self):
+        if self._device is None:
+            with self.lock:
+                if self._device is None:
+                    self._device = self._build_device()
+        return self._device
+
+    def _build_device(self):
+        device = tinytuya.OutletDevice(
+            dev_id=self.device_id,
+            address=self.address,
+            local_key=self.local_key,
+            version=self.version,
+            port=self.port,
+            connection_timeout=self.settings['connect_timeout'],
+            connection_retry_limit=1,
+            connection_retry_delay=0
+        )
+        device.set_socketPersistent(True)
+        return device
+
+    @property
+    def is_open(self):
+        return self._device is not None and self._device.socket is not None
+
+    def call(self, func):
+        """
+        Runs func(tinytuya_device) on the persistent socket.
+        Raises ConnectionError while backing off after failures, and
+        TimeoutError when the device did not answer in time.
+        """
+        now = time.monotonic()
+        if now < self.retry_at:
+            raise ConnectionError(f"backing off for {self.retry_at - now:.1f}s after {self.failures} failures")
+
+        with self.lock:
+            self.last_used = time.monotonic()
+            try:
+                result = func(self.device)
+            except Exception:
+                self._failed()
+                raise
+
+            if result is None or (isinstance(result, dict) and 'Error' in result):
+                self._failed()
+            else:
+                self.failures = 0
+                self.retry_at = 0
+        if self.pool is not None:
+            self.pool._enforce_cap(keep=self)
+        return raise_for_timeout(result)
+
+    def heartbeat(self):
+        """ Keeps an idle socket alive. Skipped if the device is busy. """
+        if not self.is_open or not self.lock.acquire(blocking=False):
+            return
+        try:
+            self.device.heartbeat(nowait=False)
+        except Exception as e:
+            logger.debug(f"[{self.device_id}] Heartbeat failed: {e}")
+            self._failed()
+        finally:
+            self.lock.release()
+
+    def repoint(self, address, version=None):
+        """ Moves the connection to a new IP (and/or protocol version). """
+        with self.lock:
+            self.close()
+            self.address = address
+            if version is not None:
+                self.version = float(version)
+            if self._device is not None:
+                self._device.address = address
+                if float(self.version) != float(self._device.version):
+                    self._device.set_version(float(self.version))
+            self.failures = 0
+            self.retry_at = 0
+
+    def close(self):
+        with self.lock:
+            if self._device is None:
+                return
+            try:
+                self._device.close()
+            except Exception:
+                pass
+            self._device.socket = None
+
+    def _failed(self):
+        self.failures += 1
+        delay = min(self.settings['backoff_max'], self.settings['backoff_base'] * 2 ** (self.failures - 1))
+        self.retry_at = time.monotonic() + delay
+        self.close()
+        logger.debug(f"[{self.device_id}] LAN failure #{self.failures}, retry in {delay:.1f}s")
+
+
+class TuyaConnectionPool:
+    """
+    Persistent Tuya sockets keyed by physical device ID.
+    - one connection per device_id, shared by all its channels
+    - background heartbeats keep idle sockets alive
+    - at most max_sockets sockets open (least recently used closed first)
+    - sockets idle longer than idle_timeout are closed
+    """
+    def __init__(self, **settings):
+        self.settings = {**get_tuya_pool_settings(), **settings}
+        self._conns = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def get(self, device_id, address, local_key, version, port=TUYA_PORT):
+        with self._lock:
+            conn = self._conns.get(device_id)
+            if conn is None:
+                conn = TuyaConnection(device_id, address, local_key, version, self.settings, port, pool=self)
+                self._conns[device_id] = conn
+            elif address and conn.address != address:
+                logger.warning(f"[{device_id}] Configured with two IPs ({conn.address}, {address}); keeping the first.")
+            self._ensure_thread()
+        return conn
+
+    def call(self, device_id, func):
+        """ Runs func(tinytuya_device) on the shared socket of device_id. """
+        return self._conns[device_id].call(func)
+
+    def repoint(self, device_id, address, version=None):
+        """ Moves a device to a new IP / version. Returns True if anything changed. """
+        conn = self._conns.get(device_id)
+        if conn is None:
+            return False
+        moved = conn.address != address
+        upgraded = version is not None and float(version) != float(conn.version)
+        if not (moved or upgraded):
+            return False
+        logger.info(f"[{device_id}] Repointing LAN connection to {address} (v{version or conn.version})")
+        conn.repoint(address, version)
+        return True
+
+    def stats(self):
+        with self._lock:
+            conns = list(self._conns.values())
+        return {
+            'devices': len(conns),
+            'open_sockets': sum(1 for c in conns if c.is_open),
+            'backing_off': sum(1 for c in conns if c.retry_at > time.monotonic())
+        }
+
+    def close_all(self):
+        self._stop.set()
+        with self._lock:
+            conns = list(self._conns.values())
+        for conn in conns:
+            conn.close()
+
+    # --- MAINTENANCE ---
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._maintain, name="TuyaPool", daemon=True)
+            self._thread.start()
+
+    def _maintain(self):
+        while not self._stop.wait(self.settings['heartbeat_interval']):
+            now = time.monotonic()
+            with self._lock:
+                conns = list(self._conns.values())
+
+            for conn in conns:
+                if not conn.is_open:
+                    continue
+                if now - conn.last_used > self.settings['idle_timeout']:
+                    logger.debug(f"[{conn.device_id}] Closing idle socket.")
+                    conn.close()
+                else:
+                    conn.heartbeat()
+
+    def _enforce_cap(self, keep=None):
+        with self._lock:
+            open_conns = [c for c in self._conns.values() if c.is_open and c is not keep]
+        excess = len(open_conns) + (1 if keep is not None and keep.is_open else 0) - self.settings['max_sockets']
+        if excess <= 0:
+            return
+        for conn in sorted(open_conns, key=lambda c: c.last_used)[:excess]:
+            logger.debug(f"[{conn.device_id}] Socket cap reached, closing least recently used.")
+            conn.close()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+def get_default_pool():
+    """ The pool shared by every TuyaSwitch that was not given its own. """
+    global _default_pool
+    if _default_pool is None:
+        with _default_lock:
+            if _default_pool is None:
+                _default_pool = TuyaConnectionPool()
+    return _default_pool
@@ -0,0 +1,40 @@
+# devices/brands/tuya_protocol.py
+import asyncio
+import logging
+import tinytuya
+
+logger = logging.getLogger("TuyaAsync")
+
+TUYA_PORT = 6668
+
+# tinytuya returns these as error dicts instead of raising: no answer in time
+TIMEOUT_ERRORS = (str(tinytuya.ERR_TIMEOUT), str(tinytuya.ERR_OFFLINE))
+
+
+async def async_request(device, command, data=None, blocking_call=None):
+    """
+    Sends one command to a tinytuya device from async code, in a worker thread.
+    Returns the decoded reply (dict, may contain 'Error'), or raises on
+    network errors / timeout.
+
+    blocking_call(func) runs func(device) on a shared persistent socket
+    (TuyaConnection.call, which serializes access to it); every TuyaSwitch
+    passes it, because many devices accept only one local connection and a
+    second socket next to the pooled one would fail. Without it tinytuya
+    uses the device's own socket.
+    """
+    func = lambda dev: _blocking_request(dev, command, data)
+    if blocking_call is not None:
+        return await asyncio.to_thread(blocking_call, func)
+    return await asyncio.to_thread(func, device)
+
+
+def raise_for_timeout(reply):
+    """ Returns a tinytuya reply, raising TimeoutError if it is a timeout error dict. """
+    if isinstance(reply, dict) and reply.get('Err') in TIMEOUT_ERRORS:
+        raise TimeoutError(reply.get('Error'))
+    return reply
+
+
+def _blocking_request(device, command, data):
+    return raise_for_timeout(device._send_receive(device.generate_payload(command, data)))
@@ -1,4 +1,5 @@
 # devices/DeviceGroup.py
+import asyncio
 import concurrent.futures
 import logging # <--- NEW IMPORT
 
@@ -56,4 +57,33 @@ class DeviceGroup:
         return self.set_state('on')
 
     def off(self):
-        return self.set_state('off')
\ No newline at end of file
+        return self.set_state('off')
+
+    # --- ASYNC API ---
+
+    async def async_set_state(self, state):
+        """
+        Async version of set_state(): all devices are switched concurrently on
+        the running event loop (no worker cap). Returns {device_name: success}.
+        """
+        logger.info(f"[{self.name}] Setting group to '{state}' (async)...")
+
+        devices = list(self.devices.values())
+        outcomes = await asyncio.gather(
+            *[dev.async_set_state(state) for dev in devices],
+            return_exceptions=True
+        )
+
+        results = {}
+        for dev, outcome in zip(devices, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error(f"[{self.name}] {dev.name} failed: {outcome!r}")
+                outcome = False
+            results[dev.name] = outcome
+        return results
+
+    async def async_on(self):
+        return await self.async_set_state('on')
+
+    async def async_off(self):
+        return await self.async_set_state('off')
\ No newline at end of file
@@ -1,8 +1,14 @@
 import broadlink
 import time
+import os
+
+from utils.ir_store import add_packet
 
 # --- CONFIGURATION ---
 IP = "192.168.1.48" # Your Broadlink IP
+DEVICE_NAME = "Bed room TV"   # Television / ac_ir name in switches.yaml
+BLASTER_NAME = None           # Broadlink name in switches.yaml (only needed if not in commands.yaml)
+STORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'ir_learned.bin')
 # ---------------------
 
 def learn_ir():
@@ -47,11 +53,14 @@ def learn_ir():
                     print(f"   Code: {hex_code}")
                     print("   Try holding the button slightly longer.")
                 else:
-                    print(f"✅ SUCCESS! Valid code captured ({len(hex_code)} chars).")
+                    print(f"✅ SUCCESS! Valid code captured ({len(packet)} bytes).")
+                    # Saved as raw bytes, picked up by the loader on next start
+                    add_packet(STORE_FILE, DEVICE_NAME, cmd_name, packet, ir_device=BLASTER_NAME)
+                    print(f"Saved '{cmd_name}' for '{DEVICE_NAME}' in {STORE_FILE}")
                     print("-" * 20)
                     print(f"{cmd_name}: \"{hex_code}\"")
                     print("-" * 20)
-                    print("Copy the line above into your commands.yaml")
+                    print("(Or copy the line above into your commands.yaml)")
             else:
                 print("❌ Timeout. No data received.")
 
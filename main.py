@@ -19,6 +19,9 @@ if __name__ == "__main__":
     health = manager.get_system_health()
     print(f"\n[System Health] Online: {health['online']} | Offline: {health['offline']} | IR: {health['stateless_ir']}")
 
+    # Where the start-up seconds went
+    print(f"\n{manager.get_startup_summary(10)}")
+
     # 2. Control Logic (Existing)
     bedroom_names = ['Bed room switch', 'Bed room TV', 'Bed room AC', 'Lamp']
     bedroom_devices = [manager.get_device(n) for n in bedroom_names if manager.get_device(n)]
@@ -0,0 +1,117 @@
+# simulators/broadlink.py
+import os
+import struct
+import asyncio
+import logging
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from simulators.faults import Faults
+
+logger = logging.getLogger("BroadlinkSim")
+
+# Factory key / IV every Broadlink device starts a session with
+INIT_KEY = bytes.fromhex("097628343fe99e23765c1513accf8b02")
+INIT_IV = bytes.fromhex("562e17996d093d28ddb3ba695a2e6f58")
+RM_MINI_3 = 0x2737
+
+
+def _checksum(packet):
+    return sum(packet, 0xBEAF) & 0xFFFF
+
+
+def _cbc(key, data, decrypt=False):
+    cipher = Cipher(algorithms.AES(key), modes.CBC(INIT_IV))
+    ctx = cipher.decryptor() if decrypt else cipher.encryptor()
+    return ctx.update(data) + ctx.finalize()
+
+
+class BroadlinkStandIn(asyncio.DatagramProtocol):
+    """
+    Local stand-in for one Broadlink IR blaster (RM mini 3) on UDP:
+    answers hello (discovery), auth (0x65, hands out a session key) and
+    commands (0x6A): send_data codes are recorded in `sent`.
+
+        blaster = BroadlinkStandIn(mac='aabbccddeeff')
+        port = await blaster.start()
+        BroadlinkRemote('Blaster', '127.0.0.1', None, 'aabbccddeeff', port=port)
+    """
+    def __init__(self, mac, host='127.0.0.1', port=0, devtype=RM_MINI_3, name='Sim RM', faults=None):
+        self.mac = bytes.fromhex(mac.replace(':', '')) if isinstance(mac, str) else bytes(mac)
+        self.host = host
+        self.port = port
+        self.devtype = devtype
+        self.name = name
+        self.faults = faults or Faults()
+        self.key = os.urandom(16)
+        self.session_id = struct.unpack('<I', os.urandom(4))[0]
+        self.sent = []       # raw IR packets received through send_data
+        self.requests = 0
+        self._transport = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+        self.port = self._transport.get_extra_info('sockname')[1]
+        return self.port
+
+    async def stop(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    # --- PROTOCOL ---
+
+    def datagram_received(self, data, addr):
+        self.requests += 1
+        if not self.faults.answers(self.mac.hex()):
+            return  # no answer: the client times out
+        asyncio.get_running_loop().create_task(self._answer(data, addr))
+
+    async def _answer(self, data, addr):
+        await self.faults.wait()
+        if len(data) == 0x30 and data[0x26] == 6:
+            reply = self._hello_reply()
+        elif data[:8] == bytes.fromhex("5aa5aa555aa5aa55") and len(data) >= 0x38:
+            reply = self._command_reply(data)
+        else:
+            return
+        if self._transport is not None:
+            self._transport.sendto(reply, addr)
+
+    def _hello_reply(self):
+        packet = bytearray(0x80)
+        packet[0x26] = 7
+        packet[0x34:0x36] = self.devtype.to_bytes(2, 'little')
+        packet[0x3A:0x40] = self.mac[::-1]
+        name = self.name.encode('utf-8')[:0x3E]
+        packet[0x40:0x40 + len(name)] = name
+        packet[0x20:0x22] = _checksum(packet).to_bytes(2, 'little')
+        return bytes(packet)
+
+    def _command_reply(self, data):
+        packet_type = int.from_bytes(data[0x26:0x28], 'little')
+        if packet_type == 0x65:
+            # auth: session id + session key, encrypted with the factory key
+            payload = struct.pack('<I', self.session_id) + self.key + bytes(12)
+            return self._packet(data, 0x3E9, _cbc(INIT_KEY, payload))
+
+        body = _cbc(self.key, bytes(data[0x38:]), decrypt=True)
+        command = struct.unpack('<I', body[:4])[0]
+        if command == 0x2:
+            # Trailing zeros are the AES padding added by the client
+            self.sent.append(body[4:].rstrip(b'\0'))
+        payload = struct.pack('<I', command) + bytes(12)
+        return self._packet(data, 0x3EE, _cbc(self.key, payload))
+
+    def _packet(self, request, reply_type, payload):
+        packet = bytearray(0x38)
+        packet[0x00:0x08] = request[0x00:0x08]
+        packet[0x22:0x24] = (0).to_bytes(2, 'little')  # error code
+        packet[0x24:0x26] = self.devtype.to_bytes(2, 'little')
+        packet[0x26:0x28] = reply_type.to_bytes(2, 'little')
+        packet[0x28:0x2A] = request[0x28:0x2A]
+        packet[0x2A:0x30] = self.mac[::-1]
+        packet[0x30:0x34] = struct.pack('<I', self.session_id)
+        packet.extend(payload)
+        packet[0x20:0x22] = _checksum(packet).to_bytes(2, 'little')
+        return bytes(packet)
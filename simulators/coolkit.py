@@ -0,0 +1,123 @@
+# simulators/coolkit.py
+import json
+import logging
+from aiohttp import web
+
+from simulators.faults import Faults
+
+logger = logging.getLogger("CoolkitSim")
+
+
+class CoolkitStandIn:
+    """
+    Local stand-in for the eWeLink (coolkit) v2 REST API used by
+    SonoffCloudClient:
+        GET  /v2/device/thing?id=...      one device
+        POST /v2/device/thing             batch ({'thingList': [...]})
+        POST /v2/device/thing/status      command
+        GET  /v2/user/profile             account apikey
+    Pass the `devices` dict of a SonoffDiyStandIn to serve the same relays
+    over LAN and cloud. Offline devices are listed with 'online': False and
+    reject commands (error 4002), like the real API.
+
+        coolkit = CoolkitStandIn(devices=diy.devices)
+        client = SonoffCloudClient(app_id='sim', app_secret='sim', access_token='sim')
+        client.api_url = await coolkit.start()
+    """
+    def __init__(self, host='127.0.0.1', port=0, devices=None, faults=None, apikey='sim'):
+        self.host = host
+        self.port = port
+        self.devices = {} if devices is None else devices
+        self.faults = faults or Faults()
+        self.apikey = apikey
+        self.requests = 0
+        self._runner = None
+
+    def add_device(self, device_id, outlets=None, state='off'):
+        if outlets:
+            params = {'switches': [{'outlet': i, 'switch': state} for i in range(outlets)]}
+        else:
+            params = {'switch': state}
+        self.devices[device_id] = {'key': None, 'params': params}
+        return params
+
+    async def start(self):
+        """ Starts the server, returns the API base URL (SonoffCloudClient.api_url). """
+        app = web.Application()
+        app.router.add_get('/v2/device/thing', self._get_thing)
+        app.router.add_post('/v2/device/thing', self._post_things)
+        app.router.add_post('/v2/device/thing/status', self._set_status)
+        app.router.add_get('/v2/user/profile', self._profile)
+        app.middlewares.append(self._conditions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/v2"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # --- HANDLERS ---
+
+    @web.middleware
+    async def _conditions(self, request, handler):
+        self.requests += 1
+        if not self.faults.answers():
+            await self.faults.hold()
+            request.transport.close()
+            return web.Response(status=504)
+        await self.faults.wait()
+        if not request.headers.get('Authorization', '').startswith('Bearer ') or not request.headers.get('X-CK-Appid'):
+            return web.json_response({'error': 401, 'msg': 'token invalid', 'data': {}})
+        return await handler(request)
+
+    def _thing(self, device_id):
+        device = self.devices.get(device_id)
+        if device is None:
+            return None
+        return {
+            'itemType': 1,
+            'itemData': {
+                'deviceid': device_id,
+                'name': device_id,
+                'online': not self.faults.is_offline(device_id),
+                'params': device['params']
+            }
+        }
+
+    async def _get_thing(self, request):
+        thing = self._thing(request.query.get('id'))
+        if thing is None:
+            return web.json_response({'error': 405, 'msg': 'device does not exist', 'data': {}})
+        return web.json_response({'error': 0, 'msg': '', 'data': {'thingList': [thing]}})
+
+    async def _post_things(self, request):
+        body = json.loads(await request.text() or "{}")
+        things = [self._thing(item.get('id')) for item in body.get('thingList', [])]
+        return web.json_response({'error': 0, 'msg': '', 'data': {'thingList': [t for t in things if t]}})
+
+    async def _set_status(self, request):
+        body = json.loads(await request.text() or "{}")
+        device_id = body.get('id')
+        device = self.devices.get(device_id)
+        if device is None:
+            return web.json_response({'error': 405, 'msg': 'device does not exist', 'data': {}})
+        if self.faults.is_offline(device_id):
+            return web.json_response({'error': 4002, 'msg': 'device is offline', 'data': {}})
+
+        params = device['params']
+        changes = body.get('params', {})
+        if 'switch' in changes:
+            params['switch'] = changes['switch']
+        for change in changes.get('switches', []):
+            for outlet in params.get('switches', []):
+                if outlet['outlet'] == change.get('outlet'):
+                    outlet['switch'] = change.get('switch')
+        return web.json_response({'error': 0, 'msg': '', 'data': {}})
+
+    async def _profile(self, request):
+        return web.json_response({'error': 0, 'msg': '', 'data': {'user': {'apikey': self.apikey}}})
@@ -0,0 +1,90 @@
+# simulators/faults.py
+import random
+import asyncio
+import threading
+
+
+class Faults:
+    """
+    Network conditions applied by a stand-in:
+    - latency: seconds added before every answer (+ up to `jitter` more)
+    - loss: probability that one request never gets an answer
+    - offline: fraction of the devices that never answer (drawn once per device)
+    A request that is not answered is held for `hang` seconds and then the
+    connection is dropped, so clients hit their own timeouts like on a real LAN.
+    """
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0, offline=0.0, hang=10.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.offline = offline
+        self.hang = hang
+        self._rng = random.Random(seed)
+        self._offline = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def is_offline(self, device_id):
+        with self._lock:
+            offline = self._offline.get(device_id)
+            if offline is None:
+                offline = self._offline[device_id] = self.offline > 0 and self._rng.random() < self.offline
+            return offline
+
+    def set_offline(self, device_id, offline=True):
+        with self._lock:
+            self._offline[device_id] = offline
+
+    def answers(self, device_id=None):
+        """ False if this request is lost (or its device offline). """
+        if device_id is not None and self.is_offline(device_id):
+            self.dropped += 1
+            return False
+        with self._lock:
+            lost = self.loss > 0 and self._rng.random() < self.loss
+        if lost:
+            self.dropped += 1
+        return not lost
+
+    def delay(self):
+        if not self.jitter:
+            return self.latency
+        with self._lock:
+            return self.latency + self._rng.uniform(0, self.jitter)
+
+    async def wait(self):
+        delay = self.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def hold(self):
+        """ Keeps an unanswered request open for `hang` seconds. """
+        await asyncio.sleep(self.hang)
+
+    def __repr__(self):
+        return (f"Faults(latency={self.latency}, jitter={self.jitter}, loss={self.loss}, "
+                f"offline={self.offline})")
+
+
+class StandInThread:
+    """
+    Runs stand-ins on an event loop of their own, for blocking callers
+    (benchmarks, scripts):
+
+        sims = StandInThread()
+        port = sims.run(diy.start())
+        ...
+        sims.close()
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="StandIns", daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """ Runs a coroutine on the stand-in loop and returns its result. """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(5)
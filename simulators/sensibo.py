@@ -0,0 +1,108 @@
+# simulators/sensibo.py
+import json
+import logging
+from aiohttp import web
+
+from simulators.faults import Faults
+
+logger = logging.getLogger("SensiboSim")
+
+
+class SensiboStandIn:
+    """
+    Local stand-in for the Sensibo v2 REST API used by SensiboCloudClient:
+        GET  /api/v2/pods/{id}             one pod (acState / measurements)
+        POST /api/v2/pods/{id}/acStates    command, returns the new acState
+        GET  /api/v2/users/me/pods         fleet snapshot
+    Offline pods are still readable (last known state) but reject commands.
+
+        sensibo = SensiboStandIn()
+        sensibo.add_pod('AbCd1234')
+        client.base_url = await sensibo.start()
+        client.api_key = sensibo.api_key
+    """
+    def __init__(self, host='127.0.0.1', port=0, faults=None, api_key='sim'):
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        self.api_key = api_key
+        self.pods = {}
+        self.requests = 0
+        self._runner = None
+
+    def add_pod(self, pod_id, on=False, mode='cool', target=24, temperature=26.5, humidity=48):
+        self.pods[pod_id] = {
+            'id': pod_id,
+            'acState': {
+                'on': on, 'mode': mode, 'targetTemperature': target,
+                'temperatureUnit': 'C', 'fanLevel': 'auto', 'swing': 'stopped'
+            },
+            'measurements': {'temperature': temperature, 'humidity': humidity}
+        }
+        return self.pods[pod_id]
+
+    async def start(self):
+        """ Starts the server, returns the API base URL (SensiboCloudClient.base_url). """
+        app = web.Application()
+        app.router.add_get('/api/v2/pods/{pod_id}', self._get_pod)
+        app.router.add_post('/api/v2/pods/{pod_id}/acStates', self._set_ac_state)
+        app.router.add_get('/api/v2/users/me/pods', self._get_pods)
+        app.middlewares.append(self._conditions)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/api/v2"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # --- HANDLERS ---
+
+    @web.middleware
+    async def _conditions(self, request, handler):
+        self.requests += 1
+        if not self.faults.answers():
+            await self.faults.hold()
+            request.transport.close()
+            return web.Response(status=504)
+        await self.faults.wait()
+        if request.query.get('apiKey') != self.api_key:
+            return web.json_response({'status': 'error', 'reason': 'Unauthorized'}, status=401)
+        return await handler(request)
+
+    def _view(self, pod, fields):
+        pod = {**pod, 'connectionStatus': {'isAlive': not self.faults.is_offline(pod['id'])}}
+        if not fields or fields == '*':
+            return pod
+        wanted = fields.split(',')
+        return {k: v for k, v in pod.items() if k in wanted}
+
+    async def _get_pod(self, request):
+        pod = self.pods.get(request.match_info['pod_id'])
+        if pod is None:
+            return web.json_response({'status': 'error', 'reason': 'Not found'}, status=404)
+        return web.json_response({'status': 'success', 'result': self._view(pod, request.query.get('fields'))})
+
+    async def _get_pods(self, request):
+        fields = request.query.get('fields')
+        return web.json_response({'status': 'success', 'result': [self._view(p, fields) for p in self.pods.values()]})
+
+    async def _set_ac_state(self, request):
+        pod_id = request.match_info['pod_id']
+        pod = self.pods.get(pod_id)
+        if pod is None:
+            return web.json_response({'status': 'error', 'reason': 'Not found'}, status=404)
+        if self.faults.is_offline(pod_id):
+            return web.json_response({'status': 'error', 'reason': 'Pod is offline'}, status=500)
+
+        changes = (json.loads(await request.text() or "{}")).get('acState', {})
+        changed = [k for k, v in changes.items() if pod['acState'].get(k) != v]
+        pod['acState'].update(changes)
+        return web.json_response({
+            'status': 'success',
+            'result': {'status': 'Success', 'acState': dict(pod['acState']), 'changedProperties': changed}
+        })
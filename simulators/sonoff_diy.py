@@ -0,0 +1,118 @@
+# simulators/sonoff_diy.py
+import json
+import time
+import logging
+from aiohttp import web
+
+from devices.brands.sonoff_lan import encrypt_data, decrypt_data
+from simulators.faults import Faults
+
+logger = logging.getLogger("SonoffDiySim")
+
+
+class SonoffDiyStandIn:
+    """
+    Local stand-in for Sonoff DIY relays (LAN API on /zeroconf/*).
+    One HTTP server answers for any number of relays; each request is routed
+    by its 'deviceid'. Relays with a device_key get and send AES-CBC 'data'
+    blocks, like real firmware in DIY mode:
+
+        diy = SonoffDiyStandIn(faults=Faults(latency=0.01, loss=0.02))
+        diy.add_device('1000abcdef', device_key='secret', outlets=4)
+        port = await diy.start()
+        SonoffSwitch('Relay', '127.0.0.1', '1000abcdef', 'secret', channel=0, port=port)
+    """
+    def __init__(self, host='127.0.0.1', port=0, faults=None):
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        # device_id -> {'key': device_key or None, 'params': {'switch'} or {'switches': [...]}}
+        self.devices = {}
+        self.requests = 0
+        self._seq = 0
+        self._runner = None
+
+    def add_device(self, device_id, device_key=None, outlets=None, state='off'):
+        """ outlets=None: single relay ('switch'), N: N outlets ('switches'). """
+        if outlets:
+            params = {'switches': [{'outlet': i, 'switch': state} for i in range(outlets)]}
+        else:
+            params = {'switch': state}
+        self.devices[device_id] = {'key': device_key, 'params': params}
+        return params
+
+    def state(self, device_id):
+        return self.devices[device_id]['params']
+
+    async def start(self):
+        """ Starts the server, returns its port. """
+        app = web.Application()
+        app.router.add_post('/zeroconf/{endpoint}', self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    # --- HANDLER ---
+
+    async def _handle(self, request):
+        self.requests += 1
+        body = json.loads(await request.text() or "{}")
+        device_id = body.get('deviceid')
+        device = self.devices.get(device_id)
+
+        if device is None or not self.faults.answers(device_id):
+            await self.faults.hold()
+            request.transport.close()
+            return web.Response(status=504)
+        await self.faults.wait()
+
+        data = body.get('data', {})
+        if body.get('encrypt'):
+            if not device['key']:
+                return self._reply(body, device, error=400)
+            try:
+                data = decrypt_data(device['key'], data, body.get('iv', ''))
+            except Exception:
+                return self._reply(body, device, error=401)
+        elif isinstance(data, str):
+            data = json.loads(data or '{}')
+
+        endpoint = request.match_info['endpoint']
+        params = device['params']
+        if endpoint == 'info':
+            return self._reply(body, device, data={**params, 'ssid': 'sim', 'bssid': '00:00:00:00:00:00', 'signalStrength': -40})
+        if endpoint == 'switch' and 'switch' in params and data.get('switch') in ('on', 'off'):
+            params['switch'] = data['switch']
+            return self._reply(body, device)
+        if endpoint == 'switches' and 'switches' in params:
+            outlets = {sw['outlet']: sw for sw in params['switches']}
+            for change in data.get('switches', []):
+                if change.get('outlet') not in outlets:
+                    return self._reply(body, device, error=422)
+                outlets[change['outlet']]['switch'] = change.get('switch')
+            return self._reply(body, device)
+        return self._reply(body, device, error=422)
+
+    def _reply(self, body, device, data=None, error=0):
+        self._seq += 1
+        resp = {
+            'seq': self._seq,
+            'sequence': body.get('sequence', str(int(time.time() * 1000))),
+            'deviceid': body.get('deviceid'),
+            'error': error
+        }
+        if data is not None:
+            if device['key']:
+                resp['encrypt'] = True
+                resp['data'], resp['iv'] = encrypt_data(device['key'], data)
+            else:
+                resp['data'] = json.dumps(data)
+        return web.json_response(resp)
@@ -0,0 +1,98 @@
+# simulators/sonoff_ws.py
+import json
+import asyncio
+import logging
+from aiohttp import web, WSMsgType
+
+logger = logging.getLogger("SonoffWsSim")
+
+
+class SonoffWsStandIn:
+    """
+    Local stand-in for the eWeLink dispatch + websocket servers, so the cloud
+    push channel (cloud/sonoff_ws.py) can be exercised offline:
+
+        sim = SonoffWsStandIn()
+        dispatch_url = await sim.start()
+        push = SonoffCloudPush(client, on_update, apikey='sim', dispatch_url=dispatch_url)
+        await sim.push_update('1000abcdef', {'switch': 'on'})
+        await sim.drop_clients()   # forces a reconnect + re-login
+    """
+    def __init__(self, host='127.0.0.1', port=0, hb_interval=90):
+        self.host = host
+        self.port = port
+        self.hb_interval = hb_interval
+        self.logins = []   # every userOnline message received
+        self.pings = 0
+        self._clients = set()
+        self._runner = None
+
+    async def start(self):
+        """ Starts both endpoints, returns the dispatch URL. """
+        app = web.Application()
+        app.router.add_get('/dispatch/app', self._dispatch)
+        app.router.add_get('/api/ws', self._ws)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        return f"http://{self.host}:{self.port}/dispatch/app"
+
+    async def stop(self):
+        await self.drop_clients()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def push_update(self, device_id, params):
+        """ Sends an 'update' event to every logged-in client. """
+        msg = json.dumps({"action": "update", "deviceid": device_id, "apikey": "sim", "params": params})
+        for ws in list(self._clients):
+            await ws.send_str(msg)
+
+    async def drop_clients(self):
+        """ Closes every websocket, like a server restart. """
+        for ws in list(self._clients):
+            await ws.close()
+        self._clients.clear()
+
+    async def wait_for_clients(self, count=1, timeout=5):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(self._clients) < count:
+            if loop.time() > deadline:
+                raise TimeoutError(f"{len(self._clients)}/{count} clients connected")
+            await asyncio.sleep(0.01)
+
+    # --- HANDLERS ---
+
+    async def _dispatch(self, request):
+        return web.json_response({"error": 0, "reason": "ok", "domain": self.host, "port": self.port})
+
+    async def _ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            if msg.data == "ping":
+                self.pings += 1
+                await ws.send_str("pong")
+                continue
+
+            data = json.loads(msg.data)
+            if data.get('action') == 'userOnline':
+                self.logins.append(data)
+                ok = bool(data.get('at')) and bool(data.get('apikey'))
+                await ws.send_str(json.dumps({
+                    "error": 0 if ok else 406,
+                    "apikey": data.get('apikey'),
+                    "config": {"hb": 1, "hbInterval": self.hb_interval},
+                    "sequence": data.get('sequence')
+                }))
+                if ok:
+                    self._clients.add(ws)
+
+        self._clients.discard(ws)
+        return ws
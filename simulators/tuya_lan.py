@@ -0,0 +1,133 @@
+# simulators/tuya_lan.py
+import json
+import time
+import struct
+import asyncio
+import logging
+import tinytuya
+
+from simulators.faults import Faults
+
+logger = logging.getLogger("TuyaLanSim")
+
+HEADER_FMT = tinytuya.MESSAGE_HEADER_FMT
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+RETCODE_OK = struct.pack(tinytuya.MESSAGE_RETCODE_FMT, 0)
+VERSION_HEADER = b'3.3' + b'\0' * 12
+
+
+class TuyaLanStandIn:
+    """
+    Local stand-in for Tuya WiFi switches speaking the LAN protocol 3.3
+    (0x55AA frames, AES-ECB payloads, CRC32). One TCP server answers for any
+    number of devices: a connection is bound to the device whose local key
+    decrypts its first frame. Handles DP_QUERY, CONTROL and HEART_BEAT on
+    persistent sockets (as TuyaConnectionPool keeps them).
+    Protocol 3.4/3.5 (session key negotiation) is not simulated.
+
+        tuya = TuyaLanStandIn(faults=Faults(latency=0.02))
+        tuya.add_device('bf0123456789abcdef', 'abcdef0123456789', channels=3)
+        port = await tuya.start()
+        TuyaSwitch('Plug', '127.0.0.1', 'bf0123456789abcdef', 'abcdef0123456789', channel=1, port=port)
+    """
+    def __init__(self, host='127.0.0.1', port=0, faults=None):
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        # device_id -> {'key': bytes, 'dps': {'1': False, ...}}
+        self.devices = {}
+        self.requests = 0
+        self.connections = 0
+        self._server = None
+
+    def add_device(self, device_id, local_key, channels=1, state=False):
+        self.devices[device_id] = {
+            'key': local_key.encode('latin1'),
+            'dps': {str(i): state for i in range(1, channels + 1)}
+        }
+        return self.devices[device_id]['dps']
+
+    def state(self, device_id):
+        return self.devices[device_id]['dps']
+
+    async def start(self):
+        """ Starts the server, returns its port. """
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    # --- PROTOCOL ---
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        device_id = None
+        try:
+            while True:
+                header = await reader.readexactly(HEADER_SIZE)
+                prefix, seqno, cmd, length = struct.unpack(HEADER_FMT, header)
+                if prefix != tinytuya.PREFIX_55AA_VALUE:
+                    break
+                frame = header + await reader.readexactly(length)
+                self.requests += 1
+
+                msg = tinytuya.unpack_message(frame, no_retcode=True)
+                device_id, request = self._decrypt(msg.payload, device_id)
+                if device_id is None:
+                    break
+
+                if not self.faults.answers(device_id):
+                    await self.faults.hold()
+                    break
+                await self.faults.wait()
+
+                reply = self._answer(device_id, cmd, request)
+                writer.write(tinytuya.pack_message(tinytuya.TuyaMessage(
+                    seqno, cmd, 0, RETCODE_OK + reply, 0, True, tinytuya.PREFIX_55AA_VALUE, None
+                )))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _decrypt(self, payload, device_id):
+        """ Returns (device_id, request dict); tries every key until one fits. """
+        if payload.startswith(b'3.3'):
+            payload = payload[len(VERSION_HEADER):]
+        if not payload:
+            return device_id, {}
+
+        candidates = [device_id] if device_id else list(self.devices)
+        for candidate in candidates:
+            cipher = tinytuya.AESCipher(self.devices[candidate]['key'])
+            try:
+                request = json.loads(cipher.decrypt(payload, False, decode_text=True))
+            except Exception:
+                continue
+            return candidate, request
+        logger.debug("Frame for an unknown device (no key fits).")
+        return None, None
+
+    def _answer(self, device_id, cmd, request):
+        device = self.devices[device_id]
+        cipher = tinytuya.AESCipher(device['key'])
+
+        if cmd == tinytuya.HEART_BEAT:
+            return b''
+        if cmd == tinytuya.CONTROL:
+            changed = {k: v for k, v in request.get('dps', {}).items() if k in device['dps']}
+            device['dps'].update(changed)
+            body = {'devId': device_id, 'dps': changed, 't': int(time.time())}
+            return VERSION_HEADER + cipher.encrypt(json.dumps(body).encode('utf-8'), False)
+        if cmd == tinytuya.DP_QUERY:
+            body = {'devId': device_id, 'dps': dict(device['dps'])}
+            return cipher.encrypt(json.dumps(body).encode('utf-8'), False)
+
+        logger.debug(f"[{device_id}] Unsupported command {cmd}.")
+        return b''
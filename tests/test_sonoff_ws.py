@@ -0,0 +1,82 @@
+# tests/test_sonoff_ws.py
+"""
+SonoffCloudPush (cloud/sonoff_ws.py) against the local eWeLink stand-in
+(simulators/sonoff_ws.py): login, update delivery, reconnect.
+
+    python -m pytest -q tests
+"""
+import asyncio
+
+from cloud.sonoff_client import SonoffCloudClient
+from cloud.sonoff_ws import SonoffCloudPush
+from simulators.sonoff_ws import SonoffWsStandIn
+
+DEVICE_ID = '1000abcdef'
+
+
+async def _wait_until(condition, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def _run_push(scenario):
+    """ Runs scenario(sim, push, updates) with a push client subscribed to a fresh stand-in. """
+    async def main():
+        sim = SonoffWsStandIn()
+        dispatch_url = await sim.start()
+        client = SonoffCloudClient(app_id='sim', app_secret='sim', access_token='sim')
+        updates = []
+        push = SonoffCloudPush(client, lambda device_id, params: updates.append((device_id, params)),
+                               apikey='sim', dispatch_url=dispatch_url)
+        push.RECONNECT_BASE = 0.05
+        task = asyncio.create_task(push.run())
+        try:
+            await sim.wait_for_clients()
+            await scenario(sim, push, updates)
+        finally:
+            push.stop()
+            await asyncio.wait_for(task, 5)
+            await sim.stop()
+            await client.async_close()
+
+    asyncio.run(main())
+
+
+def test_login():
+    async def scenario(sim, push, updates):
+        assert push.connected
+        assert push.connects == 1
+        login = sim.logins[0]
+        assert login['action'] == 'userOnline'
+        assert login['at'] == 'sim'
+        assert login['apikey'] == 'sim'
+
+    _run_push(scenario)
+
+
+def test_update_delivery():
+    async def scenario(sim, push, updates):
+        await sim.push_update(DEVICE_ID, {'switch': 'on'})
+        await _wait_until(lambda: updates)
+        assert updates == [(DEVICE_ID, {'switch': 'on'})]
+        assert push.updates == 1
+
+    _run_push(scenario)
+
+
+def test_reconnect_after_drop():
+    async def scenario(sim, push, updates):
+        await sim.drop_clients()
+        await _wait_until(lambda: push.connects == 2 and push.connected)
+        await sim.wait_for_clients()
+        assert len(sim.logins) == 2
+
+        # Updates flow again on the new connection
+        await sim.push_update(DEVICE_ID, {'switches': [{'outlet': 0, 'switch': 'off'}]})
+        await _wait_until(lambda: updates)
+        assert updates == [(DEVICE_ID, {'switches': [{'outlet': 0, 'switch': 'off'}]})]
+
+    _run_push(scenario)
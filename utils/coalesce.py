@@ -0,0 +1,288 @@
+# utils/coalesce.py
+import time
+import asyncio
+import logging
+import threading
+import weakref
+
+from utils.config import get_coalesce_settings
+
+logger = logging.getLogger("Coalesce")
+
+
+class _Entry:
+    __slots__ = ('result', 'error', 'time', 'done', 'event')
+
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self.time = 0
+        self.done = False
+        self.event = threading.Event()
+
+    def value(self):
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SharedReader:
+    """
+    Coalesces reads of the same physical device.
+    - Single flight: while one caller is reading a key, other callers wait
+      for that result instead of sending their own request.
+    - Short window: a result (or error) is reused for `window` seconds.
+    A 4-gang switch read by its 4 channel objects costs one request.
+    """
+    def __init__(self, window=None):
+        self.window = get_coalesce_settings()['read_window'] if window is None else window
+        self._entries = {}
+        self._async_inflight = {}
+        self._lock = threading.Lock()
+
+    def read(self, key, fetch):
+        """ Returns fetch() for key, shared with concurrent / recent callers. """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.done and time.monotonic() - entry.time <= self.window:
+                return entry.value()
+            leader = entry is None or entry.done
+            if leader:
+                entry = self._entries[key] = _Entry()
+
+        if not leader:
+            entry.event.wait()
+            return entry.value()
+
+        try:
+            entry.result = fetch()
+        except Exception as e:
+            entry.error = e
+        except BaseException:
+            # Interrupted: release the waiters, cache nothing
+            entry.error = ConnectionError(f"{key}: read interrupted")
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+            raise
+        finally:
+            entry.time = time.monotonic()
+            entry.done = True
+            entry.event.set()
+        return entry.value()
+
+    async def async_read(self, key, fetch):
+        """ Async version of read(); fetch is a coroutine function. """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.done and time.monotonic() - entry.time <= self.window:
+                return entry.value()
+            future = self._async_inflight.get((loop, key))
+            leader = future is None
+            if leader:
+                future = self._async_inflight[(loop, key)] = loop.create_future()
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        entry = _Entry()
+        try:
+            entry.result = await fetch()
+        except Exception as e:
+            entry.error = e
+        except BaseException:
+            # Cancelled: release the followers, cache nothing
+            with self._lock:
+                self._async_inflight.pop((loop, key), None)
+            _set_error(future, ConnectionError(f"{key}: read cancelled"))
+            raise
+
+        entry.time = time.monotonic()
+        entry.done = True
+        entry.event.set()
+        with self._lock:
+            self._entries[key] = entry
+            self._async_inflight.pop((loop, key), None)
+        if entry.error is not None:
+            _set_error(future, entry.error)
+        else:
+            future.set_result(entry.result)
+        return entry.value()
+
+    def invalidate(self, key):
+        """ Drops a cached result (e.g. after a write changed the device). """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.done:
+                del self._entries[key]
+
+
+def _set_error(future, error):
+    future.set_exception(error)
+    # Mark retrieved so lone leaders don't log "exception never retrieved"
+    future.exception()
+
+
+class _Batch:
+    __slots__ = ('items', 'result', 'error', 'event', 'after')
+
+    def __init__(self, after=None):
+        self.items = {}
+        self.result = None
+        self.error = None
+        self.event = threading.Event()
+        self.after = after  # batch that must be sent first (same channel written twice)
+
+    @staticmethod
+    def single(channel, result):
+        # send() result of a lone write, read like a batch of one
+        if isinstance(result, dict):
+            return result.get(channel, False)
+        return result
+
+    def value(self, channel):
+        if self.error is not None:
+            raise self.error
+        # send() may answer per channel ({channel: bool}) or for the whole batch
+        if isinstance(self.result, dict):
+            return self.result.get(channel, False)
+        return self.result
+
+
+class WriteCoalescer:
+    """
+    Merges simultaneous writes to different channels of ONE physical device
+    into a single command (multi-outlet / multi-dps payload), so a group
+    switching 4 channels of one small MCU sends it one request, not 4 racing ones.
+
+    The first writer of a key opens a batch and waits `window` seconds for
+    the others to join, then calls send({channel: state, ...}) once.
+    Every participant gets the result for its own channel.
+    Devices without sibling channels (in `registry`) send at once, and a
+    second write to a channel already in the batch opens the next batch,
+    sent after this one, so no write is silently dropped. A batch opened
+    while the previous one is still being sent also waits for it.
+    """
+    def __init__(self, window=None, registry=None):
+        self.window = get_coalesce_settings()['write_window'] if window is None else window
+        self.registry = registry
+        self._open = {}      # key -> batch still accepting writes
+        self._sending = {}   # key -> closed batch whose send() has not returned
+        self._lock = threading.Lock()
+
+    def _alone(self, key, device):
+        return self.registry is not None and device is not None and not self.registry.siblings(key, device)
+
+    def write(self, key, channel, state, send, device=None):
+        if self._alone(key, device):
+            return _Batch.single(channel, send({channel: state}))
+        batch, leader = self._join(key, channel, state)
+
+        if not leader:
+            batch.event.wait()
+            return batch.value(channel)
+
+        try:
+            if self.window > 0:
+                time.sleep(self.window)
+            if batch.after is not None:
+                batch.after.event.wait()
+            batch.result = send(self._close(key, batch))
+        except Exception as e:
+            batch.error = e
+        except BaseException:
+            batch.error = ConnectionError(f"{key}: write interrupted")
+            raise
+        finally:
+            self._finish(key, batch)
+        return batch.value(channel)
+
+    async def async_write(self, key, channel, state, send, device=None):
+        """ Async version of write(); send is a coroutine function. """
+        if self._alone(key, device):
+            return _Batch.single(channel, await send({channel: state}))
+        batch, leader = self._join(key, channel, state)
+
+        if not leader:
+            # Leader may live on a thread or another task: don't block the loop
+            await self._async_wait(batch)
+            return batch.value(channel)
+
+        try:
+            if self.window > 0:
+                await asyncio.sleep(self.window)
+            if batch.after is not None:
+                await self._async_wait(batch.after)
+            batch.result = await send(self._close(key, batch))
+        except Exception as e:
+            batch.error = e
+        except BaseException:
+            # Cancelled: the followers get an error instead of waiting forever
+            batch.error = ConnectionError(f"{key}: write cancelled")
+            raise
+        finally:
+            self._finish(key, batch)
+        return batch.value(channel)
+
+    async def _async_wait(self, batch):
+        while not batch.event.is_set():
+            await asyncio.sleep(self.window / 4 or 0.005)
+
+    def _join(self, key, channel, state):
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None or channel in batch.items
+            if leader:
+                batch = self._open[key] = _Batch(after=batch or self._sending.get(key))
+            batch.items[channel] = state
+        return batch, leader
+
+    def _close(self, key, batch):
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            # Batches opened from now on are sent after this one
+            self._sending[key] = batch
+            items = dict(batch.items)
+        batch.after = None
+        if len(items) > 1:
+            logger.info(f"{key}: merged {len(items)} channel writes into one command.")
+        return items
+
+    def _finish(self, key, batch):
+        # Runs whatever happened to the leader (error, cancel): an open or
+        # unanswered batch would block its followers and every later batch
+        with self._lock:
+            if self._open.get(key) is batch:
+                del self._open[key]
+            if self._sending.get(key) is batch:
+                del self._sending[key]
+        batch.after = None
+        batch.event.set()
+
+
+class ChannelRegistry:
+    """
+    Tracks every channel object (SonoffSwitch / TuyaSwitch) of each physical
+    device so one read can update all of them. Holds weak references only.
+    """
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def register(self, key, device):
+        with self._lock:
+            self._channels.setdefault(key, weakref.WeakSet()).add(device)
+
+    def siblings(self, key, device=None):
+        """ Other channel objects of the same physical device. """
+        with self._lock:
+            members = list(self._channels.get(key, ()))
+        return [d for d in members if d is not device]
+
+
+# Shared by every LAN device class
+lan_reads = SharedReader()
+channels = ChannelRegistry()
+lan_writes = WriteCoalescer(registry=channels)
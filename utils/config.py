@@ -38,4 +38,137 @@ def get_tuya_creds():
 def get_sensibo_creds():
     return {
         'api_key': os.getenv('SENSIBO_API_KEY')
-    }
\ No newline at end of file
+    }
+
+def get_http_settings():
+    """
+    Connection pool / timeout / retry policy for the cloud clients.
+    pool_connections = number of hosts kept pooled, pool_maxsize = keep-alive
+    connections per host (should be >= the refresh thread pool size).
+    """
+    return {
+        'pool_connections': int(os.getenv('HTTP_POOL_CONNECTIONS', '10')),
+        'pool_maxsize': int(os.getenv('HTTP_POOL_MAXSIZE', '20')),
+        'timeout': float(os.getenv('HTTP_TIMEOUT', '5')),
+        'retries': int(os.getenv('HTTP_RETRIES', '2')),
+        'backoff_factor': float(os.getenv('HTTP_BACKOFF', '0.3'))
+    }
+
+def get_lan_http_settings():
+    """
+    Same as get_http_settings(), for LAN devices (Sonoff DIY).
+    One small pool per device IP, short timeout and no retries so that an
+    unreachable device falls back to the cloud quickly.
+    """
+    return {
+        'pool_connections': int(os.getenv('LAN_HTTP_POOL_CONNECTIONS', '64')),
+        'pool_maxsize': int(os.getenv('LAN_HTTP_POOL_MAXSIZE', '2')),
+        'timeout': float(os.getenv('LAN_HTTP_TIMEOUT', '2')),
+        'retries': int(os.getenv('LAN_HTTP_RETRIES', '0')),
+        'backoff_factor': float(os.getenv('LAN_HTTP_BACKOFF', '0'))
+    }
+
+def get_state_cache_settings():
+    """
+    Device state cache policy (seconds). Empty STATE_TTL = never expires.
+    """
+    state_ttl = os.getenv('STATE_TTL', '')
+    return {
+        'state_ttl': float(state_ttl) if state_ttl else None,
+        'offline_ttl': float(os.getenv('OFFLINE_TTL', '30'))
+    }
+
+def get_tuya_pool_settings():
+    """
+    Persistent Tuya LAN sockets (devices/brands/tuya_pool.py).
+    """
+    return {
+        'max_sockets': int(os.getenv('TUYA_MAX_SOCKETS', '32')),
+        'idle_timeout': float(os.getenv('TUYA_IDLE_TIMEOUT', '120')),
+        'heartbeat_interval': float(os.getenv('TUYA_HEARTBEAT_INTERVAL', '10')),
+        'connect_timeout': float(os.getenv('TUYA_CONNECT_TIMEOUT', '2')),
+        'backoff_base': float(os.getenv('TUYA_BACKOFF_BASE', '1')),
+        'backoff_max': float(os.getenv('TUYA_BACKOFF_MAX', '60'))
+    }
+
+def get_coalesce_settings():
+    """
+    Reads of one physical device (all its channels) are shared for read_window
+    seconds; writes to its channels within write_window seconds are merged
+    into one command (0 = only merge writes that are already in flight).
+    """
+    return {
+        'read_window': float(os.getenv('READ_COALESCE_WINDOW', '0.5')),
+        'write_window': float(os.getenv('WRITE_COALESCE_WINDOW', '0.05'))
+    }
+
+def get_routing_settings():
+    """
+    LAN circuit breaker (utils/routing.py): after failure_threshold LAN
+    failures in a row a device goes straight to the cloud; a background probe
+    retries LAN every probe_interval seconds (doubling up to probe_max).
+    """
+    return {
+        'failure_threshold': int(os.getenv('LAN_FAILURE_THRESHOLD', '3')),
+        'probe_interval': float(os.getenv('LAN_PROBE_INTERVAL', '30')),
+        'probe_max': float(os.getenv('LAN_PROBE_MAX', '300'))
+    }
+
+def get_sonoff_push_settings():
+    """
+    Sonoff cloud websocket (cloud/sonoff_ws.py), off unless SONOFF_CLOUD_PUSH=1.
+    apikey is the account apikey (read from /user/profile when missing);
+    dispatch_url overrides the regional dispatch server (e.g. a local stand-in).
+    """
+    return {
+        'enabled': os.getenv('SONOFF_CLOUD_PUSH', '0').lower() in ('1', 'true', 'yes'),
+        'apikey': os.getenv('SONOFF_APIKEY'),
+        'dispatch_url': os.getenv('SONOFF_DISPATCH_URL'),
+        'reconnect_max': float(os.getenv('SONOFF_WS_RECONNECT_MAX', '60'))
+    }
+
+def get_ir_settings():
+    """
+    Learned IR tables are loaded per device on first use; at most
+    max_tables of them are kept in memory (least recently used evicted).
+    """
+    return {
+        'max_tables': int(os.getenv('IR_CACHE_TABLES', '8'))
+    }
+
+def get_metrics_settings():
+    """
+    Prometheus-text exporter of the per device metrics (utils/metrics.py).
+    Off unless METRICS_PORT is set; only listens on localhost by default.
+    """
+    return {
+        'port': int(os.getenv('METRICS_PORT', '0')),
+        'host': os.getenv('METRICS_HOST', '127.0.0.1')
+    }
+
+def get_scanner_settings():
+    """
+    Network sweep (utils/scanner.py): a host is up if one of `ports` accepts
+    or refuses a TCP connect within `timeout` s, or if it shows up in the ARP
+    table; at most `concurrency` sockets (hosts x ports) are open at once.
+    """
+    return {
+        'ports': [int(p) for p in os.getenv('SCAN_PORTS', '80,443,6668,8081').split(',') if p.strip()],
+        'timeout': float(os.getenv('SCAN_TIMEOUT', '0.5')),
+        'concurrency': int(os.getenv('SCAN_CONCURRENCY', '512'))
+    }
+
+def get_discovery_settings():
+    """
+    Device discovery (utils/discovery.py): per-probe timeout, how long
+    to listen for mDNS announcements and Tuya UDP broadcasts (Tuya devices
+    broadcast every ~5 s), and how long a host that matched no brand
+    (phone, PC...) is remembered before being probed again (seconds).
+    """
+    return {
+        'probe_timeout': float(os.getenv('DISCOVERY_PROBE_TIMEOUT', '1')),
+        'mdns_timeout': float(os.getenv('DISCOVERY_MDNS_TIMEOUT', '3')),
+        'tuya_timeout': float(os.getenv('DISCOVERY_TUYA_TIMEOUT', '6')),
+        'hello_workers': int(os.getenv('DISCOVERY_HELLO_WORKERS', '16')),
+        'unknown_ttl': float(os.getenv('DISCOVERY_UNKNOWN_TTL', '86400'))
+    }
@@ -0,0 +1,168 @@
+# utils/config_cache.py
+import os
+import pickle
+import hashlib
+import logging
+import yaml
+
+from utils.ir_store import write_store
+
+logger = logging.getLogger("ConfigCache")
+
+# libyaml bindings are ~10x faster on big files; fall back to pure Python
+try:
+    YamlLoader = yaml.CSafeLoader
+except AttributeError:
+    YamlLoader = yaml.SafeLoader
+
+# Bump when the compiled layout changes so old caches are rebuilt
+CACHE_VERSION = 3
+
+# Singular -> plural category names accepted in switches.yaml
+CATEGORY_MAP = {
+    'light': 'lights',
+    'switch': 'switches',
+    'ac': 'acs',
+    'tv': 'tvs',
+    'ir': 'ir'
+}
+
+
+def normalize_category(category):
+    return CATEGORY_MAP.get(category, category) if category else category
+
+
+def load_yaml(path):
+    with open(path, 'rb') as f:
+        return yaml.load(f, Loader=YamlLoader)
+
+
+def load_config(yaml_file, cmd_file, cache_file=None):
+    """
+    Returns the compiled configuration:
+        {'devices': [item, ...],             # 'type' lowercased, 'category' normalized
+         'commands': {device_name: {'IR_device': blaster}},
+         'ir_store': path}                   # IR packets, see utils/ir_store.py
+    Served from cache_file (default: config/.cache/compiled.pickle) while both
+    YAML files are unchanged (same mtime+size, or same content hash);
+    otherwise re-parsed with the C YAML loader and recompiled.
+    The IR codes themselves live in an indexed store next to the cache and
+    are only read when a device first sends a command.
+    Raises FileNotFoundError / yaml.YAMLError like yaml.safe_load would.
+    """
+    if cache_file is None:
+        cache_file = os.path.join(os.path.dirname(yaml_file), '.cache', 'compiled.pickle')
+    store_file = os.path.join(os.path.dirname(cache_file), 'ir_codes.bin')
+
+    stamps = [_stamp(yaml_file, required=True), _stamp(cmd_file)]
+    cached = _read_cache(cache_file) if os.path.exists(store_file) else None
+
+    if cached is not None:
+        if cached['stamps'] == stamps:
+            logger.debug("Config served from compiled cache.")
+            return {**cached['config'], 'ir_store': store_file}
+
+        # Touched but not edited (git checkout, copy...): hash before re-parsing
+        hashes = [_hash(yaml_file), _hash(cmd_file)]
+        if cached['hashes'] == hashes:
+            _write_cache(cache_file, stamps, hashes, cached['config'])
+            return {**cached['config'], 'ir_store': store_file}
+    else:
+        hashes = [_hash(yaml_file), _hash(cmd_file)]
+
+    logger.info("Config changed, recompiling...")
+    config, tables = compile_config(yaml_file, cmd_file)
+    try:
+        os.makedirs(os.path.dirname(store_file), exist_ok=True)
+        write_store(store_file, tables)
+    except OSError as e:
+        logger.warning(f"Could not write IR code store ({e}).")
+        return {**config, 'ir_store': None, 'ir_tables': tables}
+    _write_cache(cache_file, stamps, hashes, config)
+    return {**config, 'ir_store': store_file}
+
+
+def compile_config(yaml_file, cmd_file):
+    """ Returns (config, {device_name: {command: bytes}}). """
+    data = load_yaml(yaml_file) or {}
+    # commands.yaml is optional
+    cmd_data = {}
+    if os.path.exists(cmd_file):
+        cmd_data = load_yaml(cmd_file) or {}
+
+    devices = []
+    for item in data.get('devices', []) or []:
+        item = dict(item)
+        item['type'] = (item.get('type') or 'sonoff').lower()
+        item['category'] = normalize_category(item.get('category'))
+        devices.append(item)
+
+    commands = {}
+    tables = {}
+    for name, entries in cmd_data.items():
+        if not isinstance(entries, dict):
+            continue
+        commands[name] = {'IR_device': entries.get('IR_device')}
+        codes = ((k, decode_ir(name, k, v)) for k, v in entries.items() if k != 'IR_device')
+        tables[name] = {k: packet for k, packet in codes if packet is not None}
+
+    return {'devices': devices, 'commands': commands}, tables
+
+
+def decode_ir(device_name, command, code):
+    """ Broadlink hex text -> raw packet bytes (None if it is not hex). """
+    if isinstance(code, (bytes, bytearray)):
+        return bytes(code)
+    try:
+        return bytes.fromhex(str(code))
+    except ValueError:
+        logger.warning(f"[{device_name}] Command '{command}' is not valid hex, skipped.")
+        return None
+
+
+# --- CACHE FILE ---
+
+def _stamp(path, required=False):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        if required:
+            raise
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _hash(path):
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_cache(cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable config cache ({e}).")
+        return None
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION:
+        return None
+    return cached
+
+
+def _write_cache(cache_file, stamps, hashes, config):
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        tmp = f"{cache_file}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump({'version': CACHE_VERSION, 'stamps': stamps, 'hashes': hashes, 'config': config},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except OSError as e:
+        logger.warning(f"Could not write config cache ({e}).")
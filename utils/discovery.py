@@ -0,0 +1,405 @@
+# utils/discovery.py
+"""
+Finds the smart devices on the network and writes them into switches.yaml.
+
+    python -m utils.discovery [192.168.1.0/24] [--dry-run] [--full]
+
+1. Sweeps the network (utils/scanner.py) -> live hosts {ip: mac}.
+2. Fingerprints the hosts that are new, changed IP or were not fully
+   identified since the last run (cached by MAC in
+   config/.cache/discovery.json; hosts that matched no brand are
+   re-probed after DISCOVERY_UNKNOWN_TTL, or with --full), concurrently:
+   - Sonoff DIY: TCP 8081 + POST /zeroconf/info, or an _ewelink mDNS record
+   - Tuya: TCP 6668, device id / version from its UDP broadcast
+   - Broadlink: unicast hello (UDP 80) on hosts with no other match
+   - other mDNS types of utils/mdns_scanner.py are reported, not written
+3. Merges the supported devices into switches.yaml: known entries (same
+   MAC or device id) get their new IP, new devices are appended.
+   Tuya local keys cannot be discovered and are left empty.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import logging
+import argparse
+import aiohttp
+import yaml
+import broadlink
+
+from utils.scanner import async_scan, _normalize_mac
+from utils.mdns_scanner import SERVICE_TYPES
+from utils.config import get_discovery_settings
+from devices.brands.sonoff_mdns import parse_txt, decode_txt_data
+from devices.brands.tuya_discovery import TuyaBroadcastListener
+
+# zeroconf is optional: without it discovery relies on the port probes only
+try:
+    from zeroconf import ServiceBrowser, Zeroconf, ServiceListener
+except ImportError:
+    Zeroconf = None
+    ServiceListener = object
+
+logger = logging.getLogger("Discovery")
+
+SONOFF_PORT = 8081
+TUYA_PORT = 6668
+BROADLINK_PORT = 80
+SUPPORTED = ('sonoff', 'tuya', 'broadlink')
+
+
+def _config_paths(config_dir=None):
+    if config_dir is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        config_dir = os.path.join(os.path.dirname(current_dir), 'config')
+    return (os.path.join(config_dir, 'switches.yaml'),
+            os.path.join(config_dir, '.cache', 'discovery.json'))
+
+def _host_key(ip, mac):
+    return mac or f"ip:{ip}"
+
+def _needs_probe(cached, ip, unknown_ttl, now):
+    """
+    True if a host must be fingerprinted (again): never seen, moved to
+    another IP, a Sonoff / Tuya whose device id was missed (e.g. no broadcast
+    heard in time), or a host that matched no brand more than unknown_ttl ago.
+    """
+    if not cached or cached.get('ip') != ip:
+        return True
+    if not cached.get('brand'):
+        return now - cached.get('probed_at', 0) > unknown_ttl
+    return cached['brand'] in ('sonoff', 'tuya') and not cached.get('device_id')
+
+# --- PASSIVE LISTENERS ---
+
+class _MdnsCollector(ServiceListener):
+    def __init__(self):
+        self.found = {}  # ip -> {'service', 'name', 'port', 'props'}
+
+    def add_service(self, zc, type_, name):
+        info = zc.get_service_info(type_, name)
+        if not info:
+            return
+        for addr in info.addresses:
+            self.found[socket.inet_ntoa(addr)] = {
+                'service': type_, 'name': name, 'port': info.port, 'props': parse_txt(info.properties)
+            }
+
+    update_service = add_service
+
+    def remove_service(self, zc, type_, name):
+        pass
+
+def browse_mdns(timeout):
+    """ {ip: mDNS record} of the SERVICE_TYPES announced within `timeout` s. """
+    if Zeroconf is None:
+        logger.info("zeroconf not installed, mDNS skipped.")
+        return {}
+    try:
+        zeroconf = Zeroconf()
+    except OSError as e:
+        logger.warning(f"mDNS unavailable ({e}), skipped.")
+        return {}
+    collector = _MdnsCollector()
+    try:
+        browsers = [ServiceBrowser(zeroconf, s, collector) for s in SERVICE_TYPES]  # noqa: F841 (kept alive)
+        time.sleep(timeout)
+    finally:
+        zeroconf.close()
+    return dict(collector.found)
+
+def listen_tuya(timeout):
+    """ {ip: {'device_id', 'version', 'product_key'}} of the Tuya broadcasts heard within `timeout` s. """
+    listener = TuyaBroadcastListener()
+    if not listener.start():
+        return {}
+    try:
+        time.sleep(timeout)
+    finally:
+        listener.stop()
+    return {
+        entry['ip']: {'device_id': dev_id, 'version': entry['version'], 'product_key': entry['product_key']}
+        for dev_id, entry in listener.snapshot().items()
+    }
+
+# --- ACTIVE PROBES ---
+
+async def _port_open(ip, port, timeout):
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+async def _sonoff_info(session, ip, port, device_id=''):
+    """ The /zeroconf/info answer of a DIY relay, {} if it is not JSON. """
+    url = f"http://{ip}:{port}/zeroconf/info"
+    try:
+        async with session.post(url, json={'deviceid': device_id, 'data': {}}) as resp:
+            return json.loads(await resp.text())
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+        return {}
+
+def _broadlink_hello(ip, port, timeout):
+    try:
+        device = broadlink.hello(ip, port=port, timeout=timeout)
+    except Exception:
+        return None
+    mac = ':'.join(f"{b:02x}" for b in device.mac)
+    return {'mac': mac, 'devtype': device.devtype, 'model': f"{device.manufacturer} {device.model}"}
+
+class Fingerprinter:
+    """
+    Classifies live hosts as {'ip', 'mac', 'brand', 'device_id', ...}.
+    The ports can be overridden (e.g. stand-ins from simulators/).
+    """
+    def __init__(self, settings=None, sonoff_port=SONOFF_PORT, tuya_port=TUYA_PORT, broadlink_port=BROADLINK_PORT):
+        self.settings = settings or get_discovery_settings()
+        self.sonoff_port = sonoff_port
+        self.tuya_port = tuya_port
+        self.broadlink_port = broadlink_port
+        self.mdns = {}
+        self.tuya = {}
+
+    async def run(self, hosts, listen=True):
+        """ hosts: {ip: mac}. Returns [fingerprint, ...] in the same order. """
+        if not hosts:
+            return []
+        timeout = self.settings['probe_timeout']
+        passive = []
+        if listen:
+            passive = [
+                asyncio.to_thread(browse_mdns, self.settings['mdns_timeout']),
+                asyncio.to_thread(listen_tuya, self.settings['tuya_timeout'])
+            ]
+        hello_slots = asyncio.Semaphore(self.settings['hello_workers'])
+
+        client_timeout = aiohttp.ClientTimeout(total=timeout)
+        async with aiohttp.ClientSession(timeout=client_timeout) as session:
+            probes = asyncio.gather(*[self._probe(session, hello_slots, ip, mac) for ip, mac in hosts.items()])
+            if passive:
+                results, self.mdns, self.tuya = await asyncio.gather(probes, *passive)
+            else:
+                results = await probes
+
+        return [self._classify(result) for result in results]
+
+    async def _probe(self, session, hello_slots, ip, mac):
+        timeout = self.settings['probe_timeout']
+        sonoff, tuya = await asyncio.gather(
+            _port_open(ip, self.sonoff_port, timeout),
+            _port_open(ip, self.tuya_port, timeout)
+        )
+        result = {'ip': ip, 'mac': mac, 'ports': []}
+        if sonoff:
+            result['ports'].append(self.sonoff_port)
+            result['sonoff_info'] = await _sonoff_info(session, ip, self.sonoff_port)
+        if tuya:
+            result['ports'].append(self.tuya_port)
+        if not sonoff and not tuya:
+            async with hello_slots:
+                result['broadlink'] = await asyncio.to_thread(
+                    _broadlink_hello, ip, self.broadlink_port, timeout
+                )
+        return result
+
+    def _classify(self, result):
+        """ Merges port probes, handshakes and passive records into one fingerprint. """
+        ip = result['ip']
+        found = {'ip': ip, 'mac': result['mac'], 'brand': None}
+        mdns = self.mdns.get(ip)
+        if mdns:
+            found['service'] = mdns['service']
+
+        if (mdns and 'ewelink' in mdns['service']) or 'sonoff_info' in result:
+            props = mdns['props'] if mdns else {}
+            info = result.get('sonoff_info') or {}
+            found['brand'] = 'sonoff'
+            found['device_id'] = props.get('id') or info.get('deviceid') or ''
+            try:
+                state = decode_txt_data(props) if props else None
+            except Exception:
+                state = None  # encrypted: needs the device key
+            if state and 'switches' in state:
+                found['outlets'] = len(state['switches'])
+        elif self.tuya_port in result['ports']:
+            broadcast = self.tuya.get(ip, {})
+            found['brand'] = 'tuya'
+            found['device_id'] = broadcast.get('device_id', '')
+            found['version'] = broadcast.get('version')
+        elif result.get('broadlink'):
+            hello = result['broadlink']
+            found['brand'] = 'broadlink'
+            found['mac'] = found['mac'] or hello['mac']
+            found['model'] = hello['model']
+        elif mdns:
+            found['brand'] = mdns['service'].split('.')[0].lstrip('_')
+        return found
+
+# --- SWITCHES.YAML ---
+
+def _entry_name(found, taken, channel=None):
+    suffix = (found.get('device_id') or (found.get('mac') or '').replace(':', '') or found['ip'].split('.')[-1])[-6:]
+    base = name = f"{found['brand']}_{suffix}" + (f"_ch{channel}" if channel is not None else '')
+    i = 2
+    while name in taken:
+        name, i = f"{base}_{i}", i + 1
+    taken.add(name)
+    return name
+
+def to_entries(found, taken):
+    """ switches.yaml entries (same fields as convert_csv_yaml.py) of one supported device. """
+    base = {
+        'ip': found['ip'],
+        'type': found['brand'],
+        'device_id': found.get('device_id', ''),
+        'device_key': '',
+        'mac': found.get('mac') or '',
+        'stateless': found['brand'] == 'broadlink',
+        'category': ''
+    }
+    outlets = found.get('outlets')
+    if not outlets:
+        return [{'name': _entry_name(found, taken), **base}]
+    entries = []
+    for channel in range(outlets):
+        entry = {'name': _entry_name(found, taken, channel), **base}
+        entry['channel'] = channel
+        entries.append(entry)
+    return entries
+
+def merge_entries(entries, discovered):
+    """
+    Merges fingerprints into the switches.yaml entries (in place).
+    A device is matched by MAC, then device id, then IP + type; matched
+    entries get the new IP (and any missing MAC / device id), everything
+    else (names, keys, categories) is kept. Returns {'added', 'updated'}.
+    """
+    by_mac, by_id, by_ip = {}, {}, {}
+    for entry in entries:
+        if entry.get('mac'):
+            by_mac.setdefault(_normalize_mac(entry['mac']), []).append(entry)
+        if entry.get('device_id'):
+            by_id.setdefault(entry['device_id'], []).append(entry)
+        if entry.get('ip'):
+            by_ip.setdefault((entry['ip'], entry.get('type')), []).append(entry)
+
+    taken = {entry.get('name') for entry in entries}
+    changes = {'added': [], 'updated': []}
+    for found in discovered:
+        if found['brand'] not in SUPPORTED:
+            continue
+        mac = found.get('mac')
+        matches = (by_mac.get(mac) if mac else None) \
+            or (by_id.get(found.get('device_id')) if found.get('device_id') else None) \
+            or by_ip.get((found['ip'], found['brand']))
+
+        if not matches:
+            new = to_entries(found, taken)
+            entries.extend(new)
+            changes['added'].extend(entry['name'] for entry in new)
+            continue
+
+        for entry in matches:
+            updates = {'ip': found['ip']}
+            if mac and not entry.get('mac'):
+                updates['mac'] = mac
+            if found.get('device_id') and not entry.get('device_id'):
+                updates['device_id'] = found['device_id']
+            for field, value in updates.items():
+                if entry.get(field) != value:
+                    changes['updated'].append((entry.get('name'), field, entry.get(field), value))
+                    entry[field] = value
+    return changes
+
+# --- PIPELINE ---
+
+def _load_cache(cache_file):
+    try:
+        with open(cache_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache_file, cache):
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp = f"{cache_file}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp, cache_file)
+
+async def async_discover(network=None, config_dir=None, full=False, dry_run=False, fingerprinter=None):
+    """
+    Scans, fingerprints the new / moved hosts and merges them into switches.yaml.
+    full=True re-probes every host; dry_run=True writes nothing.
+    Returns {'hosts', 'probed', 'devices': [fingerprint, ...], 'added', 'updated'}.
+    """
+    yaml_file, cache_file = _config_paths(config_dir)
+    start = time.perf_counter()
+    hosts = await async_scan(network)
+
+    cache = {} if full else _load_cache(cache_file)
+    # Known hosts are skipped (see _needs_probe): a rescan only probes new,
+    # moved or half-identified hosts
+    now = time.time()
+    unknown_ttl = get_discovery_settings()['unknown_ttl']
+    to_probe = {
+        ip: mac for ip, mac in hosts.items()
+        if _needs_probe(cache.get(_host_key(ip, mac)), ip, unknown_ttl, now)
+    }
+    fingerprinter = fingerprinter or Fingerprinter()
+    probed = await fingerprinter.run(to_probe)
+    for (ip, mac), found in zip(to_probe.items(), probed):
+        # Keyed by what the sweep sees, so the next run finds it (the
+        # fingerprint may have learnt the MAC from a handshake)
+        cache[_host_key(ip, mac)] = {**found, 'probed_at': now}
+
+    devices = [cache[_host_key(ip, mac)] for ip, mac in hosts.items() if _host_key(ip, mac) in cache]
+    logger.info(f"{len(hosts)} hosts up, {len(to_probe)} probed "
+                f"({time.perf_counter() - start:.1f}s), "
+                f"{sum(1 for d in devices if d['brand'] in SUPPORTED)} supported devices.")
+
+    try:
+        with open(yaml_file) as f:
+            config = yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        config = {}
+    entries = config.setdefault('devices', [])
+    changes = merge_entries(entries, devices)
+
+    if not dry_run:
+        if changes['added'] or changes['updated']:
+            if os.path.exists(yaml_file):
+                os.replace(yaml_file, f"{yaml_file}.bak")
+            with open(yaml_file, 'w') as yf:
+                yaml.dump(config, yf, sort_keys=False, default_flow_style=False)
+            logger.info(f"{yaml_file} updated ({len(changes['added'])} added, "
+                        f"{len(changes['updated'])} changes), previous version in .bak")
+        _save_cache(cache_file, cache)
+
+    return {'hosts': len(hosts), 'probed': len(to_probe), 'devices': devices, **changes}
+
+def discover(network=None, config_dir=None, full=False, dry_run=False):
+    """ Blocking version of async_discover(). """
+    return asyncio.run(async_discover(network, config_dir, full, dry_run))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Discover devices and merge them into switches.yaml.")
+    parser.add_argument('network', nargs='?', help="CIDR to scan (default: local /24)")
+    parser.add_argument('--full', action='store_true', help="ignore the cache, probe every host")
+    parser.add_argument('--dry-run', action='store_true', help="only print what would change")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+
+    result = discover(args.network, full=args.full, dry_run=args.dry_run)
+    for found in result['devices']:
+        if found['brand']:
+            print(f"{found['ip']:<16} {found['mac'] or '-':<18} {found['brand']:<10} {found.get('device_id', '')}")
+    for name in result['added']:
+        print(f"+ {name}")
+    for name, field, old, new in result['updated']:
+        print(f"~ {name}: {field} {old} -> {new}")
+    sys.exit(0)
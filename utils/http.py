@@ -0,0 +1,107 @@
+# utils/http.py
+import asyncio
+import logging
+import weakref
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# aiohttp is only needed by the async API (async_* methods)
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger("HTTP")
+
+# Retried on idempotent requests (connect errors are retried for every method)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class PooledSession(requests.Session):
+    """
+    A requests.Session with a keep-alive connection pool and a default timeout.
+    Every call that does not pass its own timeout gets self.timeout.
+    """
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def build_session(pool_connections=10, pool_maxsize=20, timeout=5, retries=2, backoff_factor=0.3):
+    """
+    Creates a PooledSession.
+    - pool_connections: how many hosts keep a pool
+    - pool_maxsize: keep-alive connections kept per host
+    - timeout: default timeout (seconds) for every request
+    - retries / backoff_factor: urllib3 retry policy
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry
+    )
+
+    session = PooledSession(timeout=timeout)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    logger.debug(f"HTTP session ready (hosts={pool_connections}, per host={pool_maxsize}, timeout={timeout}s, retries={retries})")
+    return session
+
+
+# --- ASYNC (aiohttp) ---
+
+def build_async_session(pool_connections=10, pool_maxsize=20, timeout=5, retries=0, backoff_factor=0):
+    """
+    aiohttp counterpart of build_session(). Must be called inside a running loop.
+    pool_connections * pool_maxsize caps the total number of open connections,
+    pool_maxsize caps connections per host. retries/backoff_factor are accepted
+    so the same settings dict can be passed, but retrying is left to the caller.
+    """
+    if aiohttp is None:
+        raise RuntimeError("The async API requires 'aiohttp'. Please run: pip install aiohttp")
+
+    connector = aiohttp.TCPConnector(
+        limit=pool_connections * pool_maxsize,
+        limit_per_host=pool_maxsize
+    )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout)
+    )
+
+
+class AsyncSessionPool:
+    """
+    Lazily creates one aiohttp.ClientSession per event loop, so the same
+    client object can be used from the threaded API and from any loop.
+    """
+    def __init__(self, **settings):
+        self.settings = settings
+        self._sessions = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = build_async_session(**self.settings)
+            self._sessions[loop] = session
+        return session
+
+    async def close(self):
+        session = self._sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
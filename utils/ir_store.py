@@ -0,0 +1,185 @@
+# utils/ir_store.py
+import os
+import mmap
+import pickle
+import struct
+import logging
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from utils.config import get_ir_settings
+
+logger = logging.getLogger("IRStore")
+
+# File layout:
+#   MAGIC | packet | packet | ... | index | index offset (8 bytes)
+# Packets are the raw Broadlink payloads (half the size of their hex text).
+# The index maps device name -> {'meta': {...}, 'codes': {command: (offset, length)}}
+# so any packet can be sliced out of a memory map without reading the others.
+MAGIC = b'IRS2'
+FOOTER = struct.Struct('<Q')
+
+
+def write_store(path, tables, meta=None):
+    """
+    Writes {device_name: {command: bytes}} as a packet store (atomically).
+    meta: optional {device_name: {'IR_device': blaster_name, ...}}.
+    """
+    meta = meta or {}
+    index = {}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        for name, codes in tables.items():
+            entry = index[name] = {'meta': meta.get(name, {}), 'codes': {}}
+            for command, packet in codes.items():
+                entry['codes'][command] = (f.tell(), len(packet))
+                f.write(packet)
+        index_offset = f.tell()
+        f.write(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+        f.write(FOOTER.pack(index_offset))
+    os.replace(tmp, path)
+
+
+def add_packet(path, device_name, command, packet, ir_device=None):
+    """
+    Adds (or replaces) one packet in a store, creating it if needed.
+    Used by learn_bedroom_ir.py to save captured codes directly.
+    """
+    tables, meta = {}, {}
+    if os.path.exists(path):
+        store = IRCodeStore(path)
+        for name in store.index:
+            tables[name] = {k: bytes(v) for k, v in store.table(name).items()}
+            meta[name] = store.meta(name)
+        store.close()
+
+    tables.setdefault(device_name, {})[command] = bytes(packet)
+    if ir_device:
+        meta.setdefault(device_name, {})['IR_device'] = ir_device
+    write_store(path, tables, meta)
+
+
+class IRCodeStore:
+    """
+    Read side of a packet store, memory-mapped: only the index is parsed up
+    front and codes are handed out as memoryview slices of the map (no copy).
+    A device's {command: memoryview} table is built on first use and kept in
+    a bounded LRU.
+    """
+    def __init__(self, path, max_tables=None):
+        self.path = path
+        self.max_tables = get_ir_settings()['max_tables'] if max_tables is None else max_tables
+        self._map = None
+        self._view = None
+        self._index = None
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def _open(self):
+        with open(self.path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not an IR packet store")
+        self._view = memoryview(self._map)
+        (index_offset,) = FOOTER.unpack(self._map[-FOOTER.size:])
+        self._index = pickle.loads(self._map[index_offset:-FOOTER.size])
+
+    @property
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._open()
+        return self._index
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def meta(self, name):
+        entry = self.index.get(name)
+        return dict(entry['meta']) if entry else {}
+
+    def table(self, name):
+        """ {command: memoryview} of one device ({} if unknown). """
+        with self._lock:
+            codes = self._tables.get(name)
+            if codes is not None:
+                self._tables.move_to_end(name)
+                return codes
+
+        entry = self.index.get(name)
+        if entry is None:
+            return {}
+        view = self._view
+        codes = {command: view[offset:offset + length] for command, (offset, length) in entry['codes'].items()}
+        self.loads += 1
+        logger.debug(f"[{name}] Mapped {len(codes)} IR codes.")
+
+        with self._lock:
+            self._tables[name] = codes
+            self._tables.move_to_end(name)
+            while len(self._tables) > self.max_tables:
+                evicted, _ = self._tables.popitem(last=False)
+                logger.debug(f"[{evicted}] IR codes evicted from cache.")
+        return codes
+
+    def commands(self, name):
+        """ Lazy {command: memoryview} view of one device for Television / AirConditioner. """
+        return LazyCommands([self], name)
+
+    def stats(self):
+        with self._lock:
+            cached = list(self._tables)
+        return {'devices': len(self.index), 'cached': cached, 'loads': self.loads}
+
+    def close(self):
+        """ Unmaps the file. Only safe once no memoryview of it is in use. """
+        with self._lock:
+            self._tables.clear()
+            if self._view is not None:
+                try:
+                    self._view.release()
+                    self._map.close()
+                except BufferError:
+                    logger.debug(f"{self.path} still in use, left mapped.")
+            self._map = self._view = self._index = None
+
+
+class LazyCommands(Mapping):
+    """
+    Read-only mapping over one device's codes in several stores (the first
+    store that has a command wins, e.g. learned codes over commands.yaml).
+    Tables are fetched from the stores on each access.
+    """
+    def __init__(self, stores, name):
+        self.stores = stores
+        self.name = name
+
+    def _tables(self):
+        return [store.table(self.name) for store in self.stores]
+
+    def __getitem__(self, command):
+        for codes in self._tables():
+            if command in codes:
+                return codes[command]
+        raise KeyError(command)
+
+    def get(self, command, default=None):
+        try:
+            return self[command]
+        except KeyError:
+            return default
+
+    def __iter__(self):
+        seen = set()
+        for codes in self._tables():
+            for command in codes:
+                if command not in seen:
+                    seen.add(command)
+                    yield command
+
+    def __len__(self):
+        return sum(1 for _ in self)
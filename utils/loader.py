@@ -1,8 +1,9 @@
 # utils/loader.py
 import yaml
 import os
-import concurrent.futures
 import logging
+import functools
+import concurrent.futures
 
 # Device Imports
 from devices.brands.sonoff import SonoffSwitch
@@ -17,21 +18,112 @@ from devices.appliances.light import Light
 from devices.appliances.switch import Switch
 from devices.appliances.other import Other
 
+from utils.state_refresh import refresh_states
+from utils.config_cache import load_config
+from utils.ir_store import IRCodeStore, LazyCommands
+from utils.startup_profile import startup
+
 logger = logging.getLogger("DeviceLoader")
 
-def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
+# Threads used to construct devices at load time
+BUILD_WORKERS = 16
+
+def _build_hardware(item, sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
+    """
+    Builds the physical device of one switches.yaml entry.
+    Returns (device or None, default category). Constructors do no network
+    I/O (handshakes are deferred to first use), so entries are built in parallel.
+    """
+    name = item.get('name')
+    dev_type = item['type']
+    ip = item.get('ip')
+    
+    # Common fields
+    channel = item.get('channel') 
+    dev_id = item.get('device_id')
+    dev_key = item.get('device_key') 
+    mac = item.get('mac')
+    stateless = item.get('stateless', False)
+    port = item.get('port')  # optional, non-standard LAN port (e.g. simulators)
+    
+    new_device = None
+    default_category = 'other' 
+
+    try:
+        # --- HARDWARE CREATION ---
+
+        # --- SONOFF ---
+        if dev_type == 'sonoff':
+            new_device = SonoffSwitch(
+                name=name, ip=ip, device_id=dev_id, 
+                device_key=dev_key, mac=mac, 
+                channel=channel, 
+                cloud_client=sonoff_cloud, # <--- INJECTED
+                stateless=stateless,
+                port=port
+            )
+            default_category = 'switches'
+
+        # --- TUYA ---
+        elif dev_type == 'tuya':
+            new_device = TuyaSwitch(
+                name=name, ip=ip, device_id=dev_id,
+                local_key=dev_key, 
+                channel=channel, 
+                cloud_client=tuya_cloud, # <--- INJECTED
+                stateless=stateless,
+                port=port
+            )
+            default_category = 'switches'
+
+        # --- BROADLINK (Remote/Blaster) ---
+        elif dev_type == 'broadlink':
+            new_device = BroadlinkRemote(
+                name=name, ip=ip, device_id=dev_id,
+                mac=mac, 
+                stateless=True,
+                port=port
+            )
+            default_category = 'ir' # Default to IR
+
+        # --- SENSIBO (Smart AC) ---
+        elif dev_type == 'sensibo':
+            new_device = SensiboAC(
+                name=name, 
+                device_id=dev_id, 
+                cloud_client=sensibo_cloud, # <--- INJECTED
+                stateless=stateless
+            )
+            default_category = 'acs'
+    except Exception as e:
+        logger.error(f"[{name}] Could not create device: {e}")
+        new_device = None
+
+    return new_device, default_category
+
+
+def _timed_build(item, **clouds):
+    with startup.measure_device(item.get('name'), 'build'):
+        return _build_hardware(item, **clouds)
+
+
+def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None, fetch_state=True, config_dir=None):
     """
     1. Loads devices from config/switches.yaml
     2. Loads commands from config/commands.yaml
     3. Initializes Hardware using INJECTED Cloud Clients
     4. Wraps devices based on 'category' (Light, Switch, Other)
-    5. Fetches initial state in parallel
+    5. Fetches initial state in parallel (skipped if fetch_state=False)
+    config_dir: another folder holding switches.yaml / commands.yaml
+    (default: the project's config/, e.g. a generated fleet for benchmarks).
     """
     # Path setup
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(current_dir)
-    yaml_file = os.path.join(project_root, 'config', 'switches.yaml')
-    cmd_file = os.path.join(project_root, 'config', 'commands.yaml')
+    if config_dir is None:
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        config_dir = os.path.join(os.path.dirname(current_dir), 'config')
+    yaml_file = os.path.join(config_dir, 'switches.yaml')
+    cmd_file = os.path.join(config_dir, 'commands.yaml')
+    learned_file = os.path.join(config_dir, 'ir_learned.bin')
     
     # Initialize Categorized Structure
     devices = {
@@ -47,82 +139,44 @@ def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
     logger.info(f"Loading devices from {yaml_file}...")
     
     try:
-        # Load Device Config
-        with open(yaml_file, 'r') as f:
-            data = yaml.safe_load(f)
-            device_list = data.get('devices', [])
-
-        # Load Command Config (Safe fail if missing)
-        cmd_data = {}
-        if os.path.exists(cmd_file):
-            with open(cmd_file, 'r') as f:
-                cmd_data = yaml.safe_load(f) or {}
+        # Device + Command Config, compiled once and cached until the YAML changes
+        # (categories normalized, IR codes decoded to bytes; see utils/config_cache.py)
+        with startup.phase('config'):
+            config = load_config(yaml_file, cmd_file)
+        device_list = config['devices']
+        cmd_data = config['commands']
+        # IR tables are mapped per device on first send, see utils/ir_store.py.
+        # Codes captured by learn_bedroom_ir.py (ir_learned.bin) win over commands.yaml.
+        ir_stores = []
+        if os.path.exists(learned_file):
+            learned = IRCodeStore(learned_file)
+            ir_stores.append(learned)
+            for dev_name in learned.index:
+                blaster = learned.meta(dev_name).get('IR_device')
+                cmd_data.setdefault(dev_name, {'IR_device': blaster})
+                if not cmd_data[dev_name].get('IR_device'):
+                    cmd_data[dev_name]['IR_device'] = blaster
+        if config['ir_store']:
+            ir_stores.append(IRCodeStore(config['ir_store']))
 
         # ---------------------------------------------------------
         # PASS 1: PHYSICAL HARDWARE
         # ---------------------------------------------------------
-        for item in device_list:
-            name = item.get('name')
-            if not name: continue
+        # Hardware is created concurrently; registration below keeps config order
+        named = [item for item in device_list if item.get('name')]
+        build = functools.partial(
+            _timed_build,
+            sonoff_cloud=sonoff_cloud, tuya_cloud=tuya_cloud, sensibo_cloud=sensibo_cloud
+        )
+        with startup.phase('build'), \
+                concurrent.futures.ThreadPoolExecutor(max_workers=BUILD_WORKERS) as executor:
+            built = list(executor.map(build, named))
 
-            dev_type = item.get('type', 'sonoff').lower()
-            ip = item.get('ip')
-            
-            # Common fields
-            channel = item.get('channel') 
-            dev_id = item.get('device_id')
-            dev_key = item.get('device_key') 
-            mac = item.get('mac')
-            stateless = item.get('stateless', False)
+        for item, (new_device, default_category) in zip(named, built):
+            name = item['name']
             
             # Capture User Category
             user_category = item.get('category')
-            
-            new_device = None
-            default_category = 'other' 
-
-            # --- HARDWARE CREATION ---
-            
-            # --- SONOFF ---
-            if dev_type == 'sonoff':
-                new_device = SonoffSwitch(
-                    name=name, ip=ip, device_id=dev_id, 
-                    device_key=dev_key, mac=mac, 
-                    channel=channel, 
-                    cloud_client=sonoff_cloud, # <--- INJECTED
-                    stateless=stateless
-                )
-                default_category = 'switches'
-
-            # --- TUYA ---
-            elif dev_type == 'tuya':
-                new_device = TuyaSwitch(
-                    name=name, ip=ip, device_id=dev_id,
-                    local_key=dev_key, 
-                    channel=channel, 
-                    cloud_client=tuya_cloud, # <--- INJECTED
-                    stateless=stateless
-                )
-                default_category = 'switches'
-            
-            # --- BROADLINK (Remote/Blaster) ---
-            elif dev_type == 'broadlink':
-                new_device = BroadlinkRemote(
-                    name=name, ip=ip, device_id=dev_id,
-                    mac=mac, 
-                    stateless=True
-                )
-                default_category = 'ir' # Default to IR
-
-            # --- SENSIBO (Smart AC) ---
-            elif dev_type == 'sensibo':
-                new_device = SensiboAC(
-                    name=name, 
-                    device_id=dev_id, 
-                    cloud_client=sensibo_cloud, # <--- INJECTED
-                    stateless=stateless
-                )
-                default_category = 'acs'
 
             # --- CATEGORY ROUTING & WRAPPING ---
             if new_device:
@@ -131,17 +185,8 @@ def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
                 
                 # If the user explicitly defined a category, we obey it
                 if user_category:
-                    # NORMALIZATION MAP (Singular -> Plural)
-                    cat_map = {
-                        'light': 'lights',
-                        'switch': 'switches',
-                        'ac': 'acs',
-                        'tv': 'tvs',
-                        'ir': 'ir'
-                    }
-                    
-                    # Get the normalized category (e.g., 'light' -> 'lights')
-                    normalized_cat = cat_map.get(user_category, user_category)
+                    # Already normalized at compile time (e.g., 'light' -> 'lights')
+                    normalized_cat = user_category
 
                     # 1. LIGHTS -> Wrap in Light class
                     if normalized_cat == 'lights':
@@ -174,7 +219,7 @@ def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
         # ---------------------------------------------------------
         for item in device_list:
             name = item.get('name')
-            dev_type = item.get('type', '').lower()
+            dev_type = item['type']
             user_category = item.get('category')
 
             if dev_type in ['television', 'ac_ir']:  
@@ -193,7 +238,10 @@ def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
                     logger.error(f"Blaster '{blaster_name}' not found for {name}")
                     continue
                 
-                clean_cmds = {k:v for k,v in my_commands.items() if k != 'IR_device'}
+                if config['ir_store']:
+                    clean_cmds = LazyCommands(ir_stores, name)
+                else:
+                    clean_cmds = config['ir_tables'].get(name, {})
                 new_virtual = None
                 category = 'other'
 
@@ -208,8 +256,7 @@ def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
                 
                 # 4. Apply Category Override with Normalization
                 if user_category:
-                    cat_map = {'light': 'lights', 'switch': 'switches', 'ac': 'acs', 'tv': 'tvs', 'ir': 'ir'}
-                    category = cat_map.get(user_category, user_category)
+                    category = user_category
                     
                     if category not in devices:
                         devices[category] = {}
@@ -221,17 +268,12 @@ def load_devices(sonoff_cloud=None, tuya_cloud=None, sensibo_cloud=None):
         # ---------------------------------------------------------
         # 3. FETCH INITIAL STATES
         # ---------------------------------------------------------
-        logger.info(f"Initializing state for {len(devices['all'])} devices...")
-        
-        def _fetch_state(device):
-            try:
-                return device.get_state()
-            except Exception as e:
-                logger.error(f"Error fetching state for {device.name}: {e}")
-                return None
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
-            executor.map(_fetch_state, devices['all'].values())
+        if fetch_state:
+            logger.info(f"Initializing state for {len(devices['all'])} devices...")
+
+            # LAN in parallel, cloud fallback batched per client
+            with startup.phase('fetch_state'):
+                refresh_states(devices['all'].values())
 
         logger.info("All devices initialized.")
         
@@ -5,24 +5,31 @@ import socket
 import logging
 import sys
 
-# Try importing zeroconf; warn if missing
+# zeroconf is checked when scanning (utils/discovery.py imports SERVICE_TYPES)
 try:
     from zeroconf import ServiceBrowser, Zeroconf, ServiceListener
 except ImportError:
-    print("Error: 'zeroconf' library is required. Please run: pip install zeroconf")
-    sys.exit(1)
+    Zeroconf = None
+    ServiceListener = object
 
-# Configure Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%H:%M:%S'
-)
 logger = logging.getLogger("mDNS-Scanner")
 
+# List of common Smart Home service signatures
+SERVICE_TYPES = [
+    "_ewelink._tcp.local.",   # Sonoff DIY Mode
+    "_http._tcp.local.",      # Generic Web Servers (Shelly often appears here)
+    "_shelly._tcp.local.",    # Specific Shelly protocol
+    "_googlecast._tcp.local.",# Google Nest/Home
+    "_hap._tcp.local."        # Apple HomeKit
+]
+
 class SmartDeviceListener(ServiceListener):
     def update_service(self, zc: Zeroconf, type_: str, name: str) -> None:
-        pass
+        # TXT records change with the device state (e.g. Sonoff DIY data1..data4)
+        info = zc.get_service_info(type_, name)
+        if info:
+            logger.info(f"UPDATED: {name}")
+            self._print_device_info(info, type_, name)
 
     def remove_service(self, zc: Zeroconf, type_: str, name: str) -> None:
         pass
@@ -73,17 +80,12 @@ class SmartDeviceListener(ServiceListener):
         print("-" * 40)
 
 def scan_network():
+    if Zeroconf is None:
+        print("Error: 'zeroconf' library is required. Please run: pip install zeroconf")
+        sys.exit(1)
     zeroconf = Zeroconf()
     listener = SmartDeviceListener()
-    
-    # List of common Smart Home service signatures
-    service_types = [
-        "_ewelink._tcp.local.",   # Sonoff DIY Mode
-        "_http._tcp.local.",      # Generic Web Servers (Shelly often appears here)
-        "_shelly._tcp.local.",    # Specific Shelly protocol
-        "_googlecast._tcp.local.",# Google Nest/Home
-        "_hap._tcp.local."        # Apple HomeKit
-    ]
+    service_types = SERVICE_TYPES
 
     logger.info(f"Starting mDNS Auto-Discovery...")
     logger.info(f"Listening for: {', '.join(service_types)}")
@@ -102,5 +104,10 @@ def scan_network():
         zeroconf.close()
 
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%H:%M:%S'
+    )
     scan_network()
 
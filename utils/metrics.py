@@ -0,0 +1,361 @@
+# utils/metrics.py
+import time
+import bisect
+import logging
+import contextvars
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from utils.config import get_metrics_settings
+
+logger = logging.getLogger("Metrics")
+
+# Histogram upper bounds, seconds (Prometheus defaults); +Inf is implied
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PATH_LAN = 'lan'
+PATH_CLOUD = 'cloud'
+
+
+# Errors swallowed inside a metered call (see report_error)
+_call_errors = contextvars.ContextVar('metered_call_errors', default=None)
+
+
+def is_timeout(error):
+    """ True for a timeout, also when wrapped (e.g. requests' retry errors). """
+    seen = set()
+    while isinstance(error, BaseException) and id(error) not in seen:
+        if isinstance(error, TimeoutError) or 'timeout' in type(error).__name__.lower():
+            return True
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__ or getattr(error, 'reason', None)
+    return False
+
+
+def report_error(error):
+    """
+    For transports that log an error and return None / an error dict instead
+    of raising: tells the metered call around them why it failed, so timeouts
+    are counted as timeouts. No-op outside a metered call.
+    """
+    errors = _call_errors.get()
+    if errors is not None:
+        errors.append(error)
+
+
+class _Series:
+    """ Latency histogram + outcome counters of one (op, path) of one device. """
+    __slots__ = ('buckets', 'sum', 'ok', 'failed', 'timeouts')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.ok = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    @property
+    def count(self):
+        return self.ok + self.failed + self.timeouts
+
+    def merge(self, other):
+        for i, n in enumerate(other.buckets):
+            self.buckets[i] += n
+        self.sum += other.sum
+        self.ok += other.ok
+        self.failed += other.failed
+        self.timeouts += other.timeouts
+
+    def copy(self):
+        series = _Series()
+        series.merge(self)
+        return series
+
+    def _quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        target = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float('inf'),), self.buckets):
+            seen += n
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        count = self.count
+        cumulative, seen = {}, 0
+        for bound, n in zip(BUCKETS + (float('inf'),), self.buckets):
+            seen += n
+            cumulative[bound] = seen
+        return {
+            'count': count,
+            'ok': self.ok,
+            'failed': self.failed,
+            'timeouts': self.timeouts,
+            'sum': self.sum,
+            'mean': self.sum / count if count else None,
+            'p50': self._quantile(0.5) if count else None,
+            'p95': self._quantile(0.95) if count else None,
+            'buckets': cumulative
+        }
+
+
+class DeviceMetrics:
+    """
+    Counters of one physical device. observe() is on the path of every
+    command and state read: one bisect and a few increments under a lock
+    that only this device uses.
+    """
+    def __init__(self, name, brand, client):
+        self.name = name
+        self.brand = brand
+        self.client = client
+        self.series = {}      # (op, path) -> _Series
+        self.fallbacks = {}   # op -> LAN -> cloud fallbacks
+        self._lock = threading.Lock()
+
+    def observe(self, op, path, seconds, ok, error=None):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        with self._lock:
+            series = self.series.get((op, path))
+            if series is None:
+                series = self.series[(op, path)] = _Series()
+            series.buckets[index] += 1
+            series.sum += seconds
+            if ok:
+                series.ok += 1
+            elif error is not None and is_timeout(error):
+                series.timeouts += 1
+            else:
+                series.failed += 1
+
+    def fallback(self, op):
+        with self._lock:
+            self.fallbacks[op] = self.fallbacks.get(op, 0) + 1
+
+    def copy(self):
+        with self._lock:
+            return {key: s.copy() for key, s in self.series.items()}, dict(self.fallbacks)
+
+
+class MetricsRegistry:
+    """
+    Per device metrics, aggregated per brand and per cloud client when read.
+    Wrappers (Light, Switch...) are not metered: their physical device is.
+    """
+    def __init__(self):
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def for_device(self, device):
+        client = type(device.cloud_client).__name__ if device.cloud_client is not None else None
+        brand = type(device).__module__.rpartition('.')[2]
+        with self._lock:
+            entry = self._devices.get(device.name)
+            if entry is None:
+                entry = self._devices[device.name] = DeviceMetrics(device.name, brand, client)
+            return entry
+
+    def reset(self):
+        with self._lock:
+            for entry in self._devices.values():
+                with entry._lock:
+                    entry.series.clear()
+                    entry.fallbacks.clear()
+
+    def _collect(self):
+        with self._lock:
+            entries = list(self._devices.values())
+        return [(entry, *entry.copy()) for entry in entries]
+
+    def snapshot(self):
+        """
+        {'devices': {name: {'brand', 'client', 'fallbacks': {op: n}, 'lan': {op: stats}, 'cloud': {op: stats}}},
+         'brands':  {brand: {'fallbacks', 'lan', 'cloud'}},
+         'clients': {client: {op: stats}}}          # cloud calls only
+        stats = {'count', 'ok', 'failed', 'timeouts', 'sum', 'mean', 'p50', 'p95', 'buckets'}
+        """
+        devices, brands, clients = {}, {}, {}
+        for entry, series, fallbacks in self._collect():
+            devices[entry.name] = {
+                'brand': entry.brand,
+                'client': entry.client,
+                **_paths(series, fallbacks)
+            }
+            brand = brands.setdefault(entry.brand, ({}, {}))
+            _merge(brand[0], series)
+            for op, n in fallbacks.items():
+                brand[1][op] = brand[1].get(op, 0) + n
+            if entry.client:
+                _merge(clients.setdefault(entry.client, {}),
+                       {key: s for key, s in series.items() if key[1] == PATH_CLOUD})
+
+        return {
+            'devices': devices,
+            'brands': {name: _paths(series, fallbacks) for name, (series, fallbacks) in brands.items()},
+            'clients': {
+                name: {op: s.to_dict() for (op, _), s in series.items()}
+                for name, series in clients.items()
+            }
+        }
+
+    def prometheus(self):
+        """ Prometheus text exposition (one series per device, brand / client as labels). """
+        lines = [
+            "# HELP smarthome_request_seconds Latency of device commands and state reads.",
+            "# TYPE smarthome_request_seconds histogram"
+        ]
+        counters = [
+            "# HELP smarthome_requests_total Device commands and state reads by outcome.",
+            "# TYPE smarthome_requests_total counter"
+        ]
+        fallback_lines = [
+            "# HELP smarthome_fallbacks_total LAN to cloud fallbacks.",
+            "# TYPE smarthome_fallbacks_total counter"
+        ]
+        for entry, series, fallbacks in self._collect():
+            base = f'device="{_escape(entry.name)}",brand="{_escape(entry.brand)}",client="{_escape(entry.client or "")}"'
+            for (op, path), s in sorted(series.items()):
+                labels = f'{base},op="{op}",path="{path}"'
+                seen = 0
+                for bound, n in zip(BUCKETS + (float('inf'),), s.buckets):
+                    seen += n
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'smarthome_request_seconds_bucket{{{labels},le="{le}"}} {seen}')
+                lines.append(f'smarthome_request_seconds_sum{{{labels}}} {s.sum}')
+                lines.append(f'smarthome_request_seconds_count{{{labels}}} {s.count}')
+                for outcome, n in (('ok', s.ok), ('failed', s.failed), ('timeout', s.timeouts)):
+                    counters.append(f'smarthome_requests_total{{{labels},outcome="{outcome}"}} {n}')
+            for op, n in sorted(fallbacks.items()):
+                fallback_lines.append(f'smarthome_fallbacks_total{{{base},op="{op}"}} {n}')
+        return '\n'.join(lines + counters + fallback_lines) + '\n'
+
+
+def _merge(target, series):
+    for key, s in series.items():
+        if key in target:
+            target[key].merge(s)
+        else:
+            target[key] = s.copy()
+
+
+def _paths(series, fallbacks):
+    result = {'fallbacks': dict(fallbacks), PATH_LAN: {}, PATH_CLOUD: {}}
+    for (op, path), s in series.items():
+        result.setdefault(path, {})[op] = s.to_dict()
+    return result
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- HOT PATH HELPERS ---
+
+def metered(entry, op, path, call, *args):
+    """
+    Returns call(*args), recording its latency and outcome on entry
+    (a DeviceMetrics, or None to skip). None / False results count as failures,
+    or as timeouts if the call reported one (see report_error).
+    """
+    if entry is None:
+        return call(*args)
+    # One list per call, shared with the worker threads / tasks it starts
+    errors = []
+    token = _call_errors.set(errors)
+    start = time.perf_counter()
+    try:
+        result = call(*args)
+    except Exception as e:
+        entry.observe(op, path, time.perf_counter() - start, False, e)
+        raise
+    finally:
+        _call_errors.reset(token)
+    ok = result is not None and result is not False
+    entry.observe(op, path, time.perf_counter() - start, ok, errors[-1] if errors and not ok else None)
+    return result
+
+
+async def async_metered(entry, op, path, call, *args):
+    """ Async version of metered(): call(*args) returns an awaitable. """
+    if entry is None:
+        return await call(*args)
+    # One list per call, shared with the worker threads / tasks it starts
+    errors = []
+    token = _call_errors.set(errors)
+    start = time.perf_counter()
+    try:
+        result = await call(*args)
+    except Exception as e:
+        entry.observe(op, path, time.perf_counter() - start, False, e)
+        raise
+    finally:
+        _call_errors.reset(token)
+    ok = result is not None and result is not False
+    entry.observe(op, path, time.perf_counter() - start, ok, errors[-1] if errors and not ok else None)
+    return result
+
+
+metrics = MetricsRegistry()
+
+
+# --- EXPORTER ---
+
+class MetricsExporter:
+    """
+    Serves metrics.prometheus() on http://<host>:<port>/metrics from a
+    background thread. Binds to localhost unless told otherwise.
+    """
+    def __init__(self, registry=None, host=None, port=None):
+        settings = get_metrics_settings()
+        self.registry = registry or metrics
+        self.host = host or settings['host']
+        self.port = settings['port'] if port is None else port
+        self._server = None
+
+    @property
+    def running(self):
+        return self._server is not None
+
+    @property
+    def url(self):
+        if self._server is None:
+            return None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        if self._server is not None:
+            return True
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug(f"{self.address_string()} {format % args}")
+
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        except OSError as e:
+            logger.warning(f"Cannot serve metrics on {self.host}:{self.port}: {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="MetricsExporter", daemon=True).start()
+        logger.info(f"Serving metrics on {self.url}")
+        return True
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,209 @@
+# utils/routing.py
+import time
+import logging
+import threading
+import weakref
+import concurrent.futures
+
+from utils.config import get_routing_settings
+
+logger = logging.getLogger("Routing")
+
+# Route of a device
+ROUTE_LAN = 'lan'      # circuit closed: LAN first, cloud as fallback
+ROUTE_CLOUD = 'cloud'  # circuit open: straight to the cloud, LAN is probed in the background
+
+
+class LanCircuit:
+    """
+    LAN routing state of ONE physical device (shared by all its channels).
+    Opens after failure_threshold LAN failures in a row, so callers stop
+    paying the LAN timeout before every cloud fallback; closes again when a
+    background probe (or any other LAN read) succeeds.
+    """
+    # Channels of one device share a failed read (utils/coalesce.py): failures
+    # closer together than this count as one attempt.
+    ATTEMPT_WINDOW = 0.5
+
+    def __init__(self, key, settings):
+        self.key = key
+        self.settings = settings
+        self.devices = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+        self.is_open = False
+        self.failures = 0        # consecutive LAN failures
+        self.opened_at = None    # time.monotonic() the circuit last opened
+        self.next_probe = 0
+        self.probe_delay = settings['probe_interval']
+        self.last_error = None
+        self.last_failure = 0
+
+        # Counters
+        self.lan_ok = 0
+        self.lan_failed = 0
+        self.lan_skipped = 0     # calls sent straight to the cloud
+        self.times_opened = 0
+        self.probes = 0
+
+    def allow_lan(self):
+        """ True if the caller should try LAN; counts the skip otherwise. """
+        with self._lock:
+            if self.is_open:
+                self.lan_skipped += 1
+                return False
+            return True
+
+    def record(self, ok, error=None):
+        with self._lock:
+            if ok:
+                self.lan_ok += 1
+                self.failures = 0
+                if self.is_open:
+                    self._close()
+                return
+
+            now = time.monotonic()
+            self.lan_failed += 1
+            if now - self.last_failure >= self.ATTEMPT_WINDOW:
+                self.failures += 1
+                self.last_failure = now
+            self.last_error = str(error) if error is not None else "no answer"
+            if not self.is_open and self.failures >= self.settings['failure_threshold']:
+                self.is_open = True
+                self.times_opened += 1
+                self.opened_at = now
+                self.probe_delay = self.settings['probe_interval']
+                self.next_probe = self.opened_at + self.probe_delay
+                logger.warning(f"{self.key}: LAN failed {self.failures} times in a row, routing via cloud.")
+
+    def close(self):
+        with self._lock:
+            self.failures = 0
+            if self.is_open:
+                self._close()
+
+    def probe_failed(self):
+        with self._lock:
+            self.probe_delay = min(self.settings['probe_max'], self.probe_delay * 2)
+            self.next_probe = time.monotonic() + self.probe_delay
+
+    def _close(self):
+        down = time.monotonic() - self.opened_at
+        self.is_open = False
+        self.opened_at = None
+        logger.info(f"{self.key}: LAN reachable again after {down:.0f}s, routing via LAN.")
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'route': ROUTE_CLOUD if self.is_open else ROUTE_LAN,
+                'devices': sorted(d.name for d in self.devices),
+                'consecutive_failures': self.failures,
+                'open_for': now - self.opened_at if self.is_open else None,
+                'next_probe_in': max(0, self.next_probe - now) if self.is_open else None,
+                'last_error': self.last_error,
+                'lan_ok': self.lan_ok,
+                'lan_failed': self.lan_failed,
+                'lan_skipped': self.lan_skipped,
+                'times_opened': self.times_opened,
+                'probes': self.probes
+            }
+
+
+class RoutingTable:
+    """
+    LAN circuits keyed by physical device (the key SonoffSwitch / TuyaSwitch
+    use for read coalescing). A background thread probes the open ones by
+    calling get_state_lan() on one of their channels.
+    """
+    TICK = 1  # seconds between checks for due probes
+    PROBE_WORKERS = 8
+
+    def __init__(self, **settings):
+        self.settings = {**get_routing_settings(), **settings}
+        self._circuits = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def circuit(self, key, device):
+        with self._lock:
+            circuit = self._circuits.get(key)
+            if circuit is None:
+                circuit = self._circuits[key] = LanCircuit(key, self.settings)
+            circuit.devices.add(device)
+            self._ensure_thread()
+            return circuit
+
+    def report(self):
+        """ {key: snapshot} of every known device, see LanCircuit.snapshot(). """
+        with self._lock:
+            circuits = list(self._circuits.values())
+        return {c.key: c.snapshot() for c in circuits}
+
+    def stats(self):
+        report = self.report().values()
+        return {
+            'devices': len(report),
+            'via_lan': sum(1 for r in report if r['route'] == ROUTE_LAN),
+            'via_cloud': sum(1 for r in report if r['route'] == ROUTE_CLOUD),
+            'lan_skipped': sum(r['lan_skipped'] for r in report)
+        }
+
+    def stop(self):
+        """ Stops the background probe (restarted by the next circuit() call). """
+        self._stop.set()
+
+    def reset(self, key=None):
+        """ Closes one circuit (or all of them), e.g. after the device got a new IP. """
+        with self._lock:
+            if key is None:
+                circuits = list(self._circuits.values())
+            else:
+                circuits = [self._circuits[key]] if key in self._circuits else []
+        for circuit in circuits:
+            circuit.close()
+
+    # --- BACKGROUND PROBE ---
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._probe_loop, name="LanProbe", daemon=True)
+            self._thread.start()
+
+    def _probe_loop(self):
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.PROBE_WORKERS) as executor:
+            while not self._stop.wait(self.TICK):
+                now = time.monotonic()
+                with self._lock:
+                    due = [c for c in self._circuits.values() if c.is_open and now >= c.next_probe]
+                for circuit in due:
+                    # Push next_probe out while this probe runs
+                    circuit.next_probe = now + circuit.probe_delay
+                list(executor.map(self._probe, due))
+
+    def _probe(self, circuit):
+        device = next(iter(list(circuit.devices)), None)
+        if device is None:
+            return
+
+        circuit.probes += 1
+        try:
+            state = device.get_state_lan()
+        except Exception as e:
+            logger.debug(f"{circuit.key}: LAN probe failed: {e}")
+            state = None
+
+        if state is None:
+            circuit.probe_failed()
+            return
+
+        circuit.record(True)
+        device._store_lan_state(state)
+
+
+# Shared by every LAN device class
+routes = RoutingTable()
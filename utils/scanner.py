@@ -1,9 +1,29 @@
 # utils/scanner.py
-import subprocess
-import platform
-import socket
-import concurrent.futures
 import re
+import sys
+import time
+import errno
+import socket
+import asyncio
+import logging
+import ipaddress
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from utils.config import get_scanner_settings
+
+logger = logging.getLogger("Scanner")
+
+ARP_TABLE = '/proc/net/arp'
+ATF_COM = 0x2  # /proc/net/arp flag: entry resolved (MAC known)
+# Out of file descriptors: a local problem, not a host that is down
+FD_EXHAUSTED = (errno.EMFILE, errno.ENFILE)
+MAC_RE = re.compile(r'(\d{1,3}(?:\.\d{1,3}){3})\)?\s+(?:at\s+)?([0-9A-Fa-f]{1,2}(?:[:-][0-9A-Fa-f]{1,2}){5})')
+
 
 def get_my_ip_prefix():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -14,62 +34,150 @@ def get_my_ip_prefix():
         s.close()
     return ".".join(local_ip.split(".")[:-1])
 
+def get_my_network(prefixlen=24):
+    """ The local network (e.g. 192.168.1.0/24, or /22 with prefixlen=22). """
+    prefix = get_my_ip_prefix()
+    return ipaddress.ip_network(f"{prefix}.0/{prefixlen}", strict=False)
+
+def _normalize_mac(mac):
+    return ':'.join(part.zfill(2) for part in re.split('[:-]', mac)).lower()
+
+# --- NEIGHBOUR TABLE ---
+
+def read_arp_table(path=ARP_TABLE):
+    """
+    Returns the resolved neighbours as {ip: mac} (mac lowercase, ':' separated).
+    Reads /proc/net/arp on Linux; elsewhere parses one `arp -a` run.
+    """
+    try:
+        with open(path) as f:
+            lines = f.read().splitlines()[1:]
+    except OSError:
+        return _read_arp_command()
+
+    table = {}
+    for line in lines:
+        fields = line.split()
+        # IP address, HW type, Flags, HW address, Mask, Device
+        if len(fields) >= 4 and int(fields[2], 16) & ATF_COM:
+            table[fields[0]] = fields[3].lower()
+    return table
+
+def _read_arp_command():
+    try:
+        output = subprocess.check_output(['arp', '-a'], stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Could not read the ARP table: {e}")
+        return {}
+    text = output.decode('utf-8', errors='ignore')
+    return {ip: _normalize_mac(mac) for ip, mac in MAC_RE.findall(text)}
+
+# --- PROBES ---
+
+async def _connect(ip, port, timeout):
+    """ True if the host answered: connection accepted or refused (RST). """
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except ConnectionRefusedError:
+        return True
+    except asyncio.TimeoutError:
+        return False
+    except OSError as e:
+        if e.errno in FD_EXHAUSTED:
+            raise
+        return False
+    writer.close()
+    return True
+
+def _socket_budget(requested):
+    """ Sockets a sweep may hold at once: `requested`, capped to half the open files limit. """
+    if resource is None:
+        return requested
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return requested
+    return max(1, min(requested, soft // 2))
+
+async def probe_host(ip, ports=None, timeout=None):
+    """
+    True if `ip` answers a TCP connect on any of `ports` within `timeout` s.
+    The ports are tried at once, the first answer wins.
+    """
+    settings = get_scanner_settings()
+    ports = ports or settings['ports']
+    timeout = settings['timeout'] if timeout is None else timeout
+
+    pending = {asyncio.ensure_future(_connect(ip, port, timeout)) for port in ports}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if any(task.result() for task in done):
+                return True
+        return False
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def async_scan(network=None, ports=None, timeout=None, concurrency=None):
+    """
+    Sweeps `network` (CIDR string or ip_network, default: local /24).
+    Returns {ip: mac or None} of the hosts that are up, in address order:
+    those that answered a TCP probe, plus those the kernel resolved through
+    ARP while probing (firewalled hosts still answer ARP).
+    At most `concurrency` sockets are open at once (hosts in flight x ports,
+    capped to half the open files limit), so /22 or /16 sweeps never run out
+    of file descriptors.
+    """
+    settings = get_scanner_settings()
+    network = ipaddress.ip_network(network or get_my_network(), strict=False)
+    ports = ports or settings['ports']
+    sockets = _socket_budget(concurrency or settings['concurrency'])
+
+    alive = set()
+    hosts = iter(network.hosts())
+
+    async def worker():
+        # Workers share one iterator: each host is taken once
+        for ip in hosts:
+            if await probe_host(str(ip), ports, timeout):
+                alive.add(ip)
+
+    start = time.perf_counter()
+    workers = min(max(1, sockets // len(ports)), max(1, network.num_addresses))
+    await asyncio.gather(*[worker() for _ in range(workers)])
+
+    table = read_arp_table()
+    for ip in table:
+        address = ipaddress.ip_address(ip)
+        if address in network:
+            alive.add(address)
+
+    logger.info(f"Scanned {network} in {time.perf_counter() - start:.2f}s: {len(alive)} hosts up.")
+    return {str(ip): table.get(str(ip)) for ip in sorted(alive)}
+
+def scan(network=None, ports=None, timeout=None, concurrency=None):
+    """ Blocking version of async_scan(). """
+    return asyncio.run(async_scan(network, ports, timeout, concurrency))
+
+# --- SINGLE HOSTS ---
+
 def ping_device(ip):
     """
-    Pings an IP. Returns the IP if successful, None if not.
+    Probes one IP (TCP connect, see probe_host). Returns the IP if it answered, None if not.
     """
-    # DETECT OS for PING FLAGS
-    param = '-n' if platform.system().lower() == 'windows' else '-c'
-    
-    command = ['ping', param, '1', '-w', '500', ip]
-    # Note: On Linux/Mac -w 500 might be -W 500 or -w 1 (seconds). 
-    # For compatibility, usually just count is enough, but timeout helps speed.
-    if platform.system().lower() != 'windows':
-         # Linux ping often uses -W in seconds, or ms depending on variant. 
-         # Safest is just count for basic scan.
-         command = ['ping', param, '1', ip]
-
-    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    
-    if result.returncode == 0:
-        return ip
-    return None
+    return ip if asyncio.run(probe_host(ip)) else None
 
 def get_mac_addresses(active_ips):
-    print("\nfetching MAC addresses from ARP cache...")
-    try:
-        arp_result = subprocess.check_output("arp -a", shell=True).decode('cp1252', errors='ignore')
-    except:
-        # Fallback for linux/utf-8
-        arp_result = subprocess.check_output("arp -a", shell=True).decode('utf-8', errors='ignore')
-
-    devices = []
-    
-    for line in arp_result.splitlines():
-        line = line.strip()
-        for ip in active_ips:
-            if ip + " " in line or ip + ")" in line: # Handle (192.168.1.5) format on Linux
-                 mac_search = re.search(r'([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})', line)
-                 if mac_search:
-                     devices.append((ip, mac_search.group(0)))
-    return devices
+    """ [(ip, mac), ...] of the active IPs found in the ARP table. """
+    table = read_arp_table()
+    return [(ip, table[ip]) for ip in active_ips if ip in table]
 
 if __name__ == "__main__":
+    # python -m utils.scanner [network, e.g. 192.168.0.0/22]
+    target = sys.argv[1] if len(sys.argv) > 1 else None
     while(True):
-        prefix = get_my_ip_prefix()
-        print("Please wait (approx 10-15 seconds)...")
-    
-        all_ips = [f"{prefix}.{i}" for i in range(1, 255)] # Adjusted range to standard /24
-        active_ips = []
-    
-        with concurrent.futures.ThreadPoolExecutor(max_workers=50) as executor:
-            results = executor.map(ping_device, all_ips)
-        
-        for ip in results:
-            if ip:
-                active_ips.append(ip)
-    
-        final_devices = get_mac_addresses(active_ips)
-    
-        for ip, mac in final_devices:
-            print(f"{ip:<20} {mac}")
\ No newline at end of file
+        start = time.perf_counter()
+        found = scan(target)
+        for ip, mac in found.items():
+            print(f"{ip:<20} {mac or '-'}")
+        print(f"{len(found)} hosts in {time.perf_counter() - start:.1f}s\n")
@@ -0,0 +1,164 @@
+# utils/startup_profile.py
+import sys
+import time
+import logging
+import builtins
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("StartupProfile")
+
+# Top-level packages whose import time is recorded: the project itself
+# (utils.config includes the .env load) and the brand / cloud libraries.
+TRACKED_IMPORTS = (
+    'cloud', 'core', 'devices', 'utils',
+    'tinytuya', 'broadlink', 'zeroconf', 'aiohttp', 'requests', 'yaml', 'dotenv'
+)
+
+
+class StartupProfiler:
+    """
+    Wall-time breakdown of a start-up:
+    - phases: nested 'with startup.phase(name)' blocks ('initialize/load_devices/config')
+    - devices: per device steps ('build', 'first_state', 'connect')
+    - imports: first import of the tracked modules, total and self time
+    report() returns it all as a dict, slowest()/summary() the top N entries.
+    The clock starts when this module is imported. Import tracking hooks
+    builtins.__import__, so it only runs once started explicitly:
+    core/manager.py imports this module first and tracks its own imports
+    (track_imports() ... stop_tracking_imports()).
+    """
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.ready_at = None
+        self.phases = []
+        self.devices = {}
+        self.imports = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._original_import = None
+
+    def _stack(self, attr):
+        stack = getattr(self._local, attr, None)
+        if stack is None:
+            stack = []
+            setattr(self._local, attr, stack)
+        return stack
+
+    # --- PHASES / DEVICES ---
+
+    @contextmanager
+    def phase(self, name):
+        stack = self._stack('phases')
+        stack.append(name)
+        path = '/'.join(stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stack.pop()
+            self.record_phase(path, time.perf_counter() - start)
+
+    def record_phase(self, name, seconds):
+        """ Records a phase that just ended (for work spread over callbacks / tasks). """
+        end = time.perf_counter()
+        with self._lock:
+            self.phases.append({
+                'name': name,
+                'start': end - seconds - self.t0,
+                'duration': seconds,
+                'thread': threading.current_thread().name
+            })
+
+    def record_device(self, name, step, seconds):
+        with self._lock:
+            self.devices.setdefault(name, {})[step] = seconds
+
+    @contextmanager
+    def measure_device(self, name, step):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_device(name, step, time.perf_counter() - start)
+
+    # --- IMPORTS ---
+
+    def track_imports(self):
+        """ Times first imports of TRACKED_IMPORTS until finish() is called. """
+        if self._original_import is not None:
+            return
+        original = self._original_import = builtins.__import__
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules or name.partition('.')[0] not in TRACKED_IMPORTS:
+                return original(name, globals, locals, fromlist, level)
+            children = self._stack('imports')
+            children.append(0.0)
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                total = time.perf_counter() - start
+                nested = children.pop()
+                if children:
+                    children[-1] += total
+                with self._lock:
+                    self.imports.setdefault(name, {
+                        'total': total,
+                        'self': total - nested,
+                        'root': not children
+                    })
+
+        builtins.__import__ = timed_import
+
+    def stop_tracking_imports(self):
+        """ Restores builtins.__import__ (no-op if not tracking). """
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def finish(self):
+        """ Marks the system ready and stops import tracking. """
+        if self.ready_at is None:
+            self.ready_at = time.perf_counter() - self.t0
+        self.stop_tracking_imports()
+
+    # --- REPORT ---
+
+    def report(self):
+        """
+        {'ready_at': s since start (None until finish()), 'imports_total': s,
+         'phases': [{'name', 'start', 'duration', 'thread'}, ...],
+         'devices': {name: {step: s}}, 'imports': {module: {'total', 'self', 'root'}}}
+        """
+        with self._lock:
+            imports = {name: dict(entry) for name, entry in self.imports.items()}
+            return {
+                'ready_at': self.ready_at,
+                'imports_total': sum(e['total'] for e in imports.values() if e['root']),
+                'phases': [dict(p) for p in self.phases],
+                'devices': {name: dict(steps) for name, steps in self.devices.items()},
+                'imports': imports
+            }
+
+    def slowest(self, n=10):
+        """ [(seconds, kind, name), ...] slowest first; imports count their self time. """
+        report = self.report()
+        entries = [(p['duration'], 'phase', p['name']) for p in report['phases']]
+        entries += [(s, f'device:{step}', name)
+                    for name, steps in report['devices'].items() for step, s in steps.items()]
+        entries += [(e['self'], 'import', name) for name, e in report['imports'].items()]
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        return entries[:n]
+
+    def summary(self, n=10):
+        report = self.report()
+        ready = f"{report['ready_at']:.2f}s" if report['ready_at'] is not None else "not ready"
+        lines = [f"Startup: {ready} (imports {report['imports_total']:.2f}s). Slowest {n}:"]
+        for seconds, kind, name in self.slowest(n):
+            lines.append(f"  {seconds * 1000:8.1f} ms  {kind:<18} {name}")
+        return '\n'.join(lines)
+
+
+startup = StartupProfiler()
@@ -0,0 +1,254 @@
+# utils/state_refresh.py
+import time
+import asyncio
+import functools
+import concurrent.futures
+import logging
+
+from devices.base import SmartDevice, SOURCE_LAN, SOURCE_CLOUD
+from utils.metrics import metered, async_metered, PATH_LAN, PATH_CLOUD
+
+logger = logging.getLogger("StateRefresh")
+
+
+def unwrap_chain(device):
+    """
+    Returns [wrapper, ..., physical_device] by following the '.device'
+    attribute of appliance wrappers (Light, Switch, Other, AirConditioner).
+    """
+    chain = [device]
+    while isinstance(getattr(chain[-1], 'device', None), SmartDevice):
+        chain.append(chain[-1].device)
+    return chain
+
+
+def refresh_states(devices, max_workers=20, on_ready=None):
+    """
+    Refreshes the state of many devices at once (LAN -> Cloud fallback),
+    batching the cloud fallback per client instead of one request per device.
+
+    1. LAN pass (parallel) on the unique physical devices.
+    2. Devices that did not answer on LAN are grouped by cloud client.
+       Clients that implement get_states() get one batched call per group,
+       the others are queried device by device.
+    3. Wrappers inherit the state of the physical device they wrap.
+
+    on_ready(physical_device) is called as soon as each physical device has
+    its final state (LAN answers as they arrive, cloud ones per batch).
+    Returns {device_name: state}.
+    """
+    chains, physical = _collect(devices)
+    if not physical:
+        return {}
+
+    # --- 1. LAN PASS ---
+    def _read_lan(device):
+        circuit = device._lan_circuit()
+        if not device.has_lan or not device._lan_allowed(circuit):
+            return device, None
+        try:
+            state = metered(device._metrics(), 'get', PATH_LAN, device.get_state_lan)
+        except Exception as e:
+            logger.debug(f"[{device.name}] LAN Get-State Error: {e}")
+            state = None
+        _record_lan(circuit, state)
+        return device, state
+
+    missed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        jobs = [executor.submit(_read_lan, d) for d in physical]
+        for job in concurrent.futures.as_completed(jobs):
+            device, state = job.result()
+            if not _apply_lan_result(device, state, on_ready):
+                missed.append(device)
+    _log_lan_pass(physical, missed)
+
+    # --- 2. CLOUD FALLBACK ---
+    def _read_cloud_batch(group):
+        client = group[0].cloud_client
+        start, error = time.perf_counter(), None
+        try:
+            states = client.get_states([(d.device_id, d.channel) for d in group])
+        except Exception as e:
+            logger.error(f"Batched cloud fetch failed: {e}")
+            states, error = {}, e
+        results = [(d, states.get((d.device_id, d.channel))) for d in group]
+        _meter_batch(results, time.perf_counter() - start, error)
+        return results
+
+    def _read_cloud_single(device):
+        try:
+            return [(device, metered(device._metrics(), 'get', PATH_CLOUD,
+                                     device.cloud_client.get_state, device.device_id, device.channel))]
+        except Exception as e:
+            logger.error(f"[{device.name}] Cloud Get-State Error: {e}")
+            return [(device, None)]
+
+    jobs = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for group in _group_by_client(missed, on_ready):
+            if hasattr(group[0].cloud_client, 'get_states'):
+                jobs.append(executor.submit(_read_cloud_batch, group))
+            else:
+                jobs.extend(executor.submit(_read_cloud_single, d) for d in group)
+
+        for job in concurrent.futures.as_completed(jobs):
+            _apply_cloud_results(job.result(), on_ready)
+
+    # --- 3. PROPAGATE TO WRAPPERS ---
+    return _propagate(chains)
+
+
+async def async_refresh_states(devices, on_ready=None):
+    """
+    Async version of refresh_states(): every LAN read and every cloud batch
+    runs concurrently on the current event loop instead of in thread waves.
+    """
+    chains, physical = _collect(devices)
+    if not physical:
+        return {}
+
+    # --- 1. LAN PASS ---
+    async def _read_lan(device):
+        circuit = device._lan_circuit()
+        if not device.has_lan or not device._lan_allowed(circuit):
+            return device, None
+        try:
+            state = await async_metered(device._metrics(), 'get', PATH_LAN, device.async_get_state_lan)
+        except Exception as e:
+            logger.debug(f"[{device.name}] LAN Get-State Error: {e!r}")
+            state = None
+        _record_lan(circuit, state)
+        return device, state
+
+    missed = []
+    for next_done in asyncio.as_completed([_read_lan(d) for d in physical]):
+        device, state = await next_done
+        if not _apply_lan_result(device, state, on_ready):
+            missed.append(device)
+    _log_lan_pass(physical, missed)
+
+    # --- 2. CLOUD FALLBACK ---
+    async def _read_cloud_batch(group):
+        client = group[0].cloud_client
+        targets = [(d.device_id, d.channel) for d in group]
+        start, error = time.perf_counter(), None
+        try:
+            if hasattr(client, 'async_get_states'):
+                states = await client.async_get_states(targets)
+            else:
+                states = await asyncio.to_thread(client.get_states, targets)
+        except Exception as e:
+            logger.error(f"Batched cloud fetch failed: {e!r}")
+            states, error = {}, e
+        results = [(d, states.get((d.device_id, d.channel))) for d in group]
+        _meter_batch(results, time.perf_counter() - start, error)
+        return results
+
+    async def _read_cloud_single(device):
+        client = device.cloud_client
+        try:
+            if hasattr(client, 'async_get_state'):
+                call = client.async_get_state
+            else:
+                call = functools.partial(asyncio.to_thread, client.get_state)
+            state = await async_metered(device._metrics(), 'get', PATH_CLOUD, call, device.device_id, device.channel)
+            return [(device, state)]
+        except Exception as e:
+            logger.error(f"[{device.name}] Cloud Get-State Error: {e!r}")
+            return [(device, None)]
+
+    jobs = []
+    for group in _group_by_client(missed, on_ready):
+        client = group[0].cloud_client
+        if hasattr(client, 'async_get_states') or hasattr(client, 'get_states'):
+            jobs.append(_read_cloud_batch(group))
+        else:
+            jobs.extend(_read_cloud_single(d) for d in group)
+
+    for next_done in asyncio.as_completed(jobs):
+        _apply_cloud_results(await next_done, on_ready)
+
+    # --- 3. PROPAGATE TO WRAPPERS ---
+    return _propagate(chains)
+
+
+# --- SHARED STEPS ---
+
+def _collect(devices):
+    chains = [unwrap_chain(dev) for dev in devices if not dev.stateless]
+    chains = [chain for chain in chains if not chain[-1].stateless]
+
+    # Several wrappers can share one physical device; read it only once
+    physical = list({id(chain[-1]): chain[-1] for chain in chains}.values())
+    return chains, physical
+
+
+def _record_lan(circuit, state):
+    # Devices with an open circuit never get here: they go straight to the cloud
+    if circuit is not None:
+        circuit.record(state is not None)
+
+
+def _apply_lan_result(device, state, on_ready=None):
+    """ Stores one LAN answer; False if the device still needs the cloud. """
+    if state is None:
+        return False
+    device._set_state(state, SOURCE_LAN)
+    _notify(on_ready, device)
+    return True
+
+
+def _log_lan_pass(physical, missed):
+    logger.info(f"LAN answered for {len(physical) - len(missed)}/{len(physical)} devices.")
+
+
+def _meter_batch(results, seconds, error=None):
+    # Every device of a batch waited for the same request
+    for device, state in results:
+        meter = device._metrics()
+        if meter is not None:
+            meter.observe('get', PATH_CLOUD, seconds, state is not None, error)
+
+
+def _group_by_client(missed, on_ready=None):
+    by_client = {}
+    for device in missed:
+        if device.cloud_client is None:
+            logger.error(f"[{device.name}] Error: Could not retrieve state (Device Offline).")
+            device._set_state("OFFLINE", None)
+            _notify(on_ready, device)
+            continue
+        meter = device._metrics()
+        if meter is not None and device.has_lan:
+            meter.fallback('get')
+        by_client.setdefault(id(device.cloud_client), []).append(device)
+    return list(by_client.values())
+
+
+def _apply_cloud_results(results, on_ready=None):
+    for device, state in results:
+        if state is None:
+            logger.error(f"[{device.name}] Error: Could not retrieve state (Device Offline).")
+            device._set_state("OFFLINE", None)
+        else:
+            device._set_state(state, SOURCE_CLOUD)
+        _notify(on_ready, device)
+
+
+def _notify(on_ready, device):
+    if on_ready is None:
+        return
+    try:
+        on_ready(device)
+    except Exception as e:
+        logger.error(f"[{device.name}] Ready callback failed: {e}")
+
+
+def _propagate(chains):
+    results = {}
+    for chain in chains:
+        for dev in chain[:-1]:
+            dev._copy_state_from(chain[-1])
+        results[chain[0].name] = chain[-1]._state
+    return results
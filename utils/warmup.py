@@ -0,0 +1,135 @@
+# utils/warmup.py
+import time
+import asyncio
+import logging
+import threading
+
+from utils.state_refresh import refresh_states, async_refresh_states, unwrap_chain
+from utils.startup_profile import startup
+
+logger = logging.getLogger("Warmup")
+
+
+class StateWarmup:
+    """
+    Initial state pass over a device graph that can run in the background.
+    - one readiness event per device name, set as soon as that device has
+      its first state (LAN answers first, cloud fallbacks per batch)
+    - progress() reports how far the pass got
+    - wait(name) / async_wait(name) block on a single device only
+    Errors are logged and recorded in self.error; every event is set when
+    the pass ends, whatever happened.
+    """
+    def __init__(self, devices):
+        self.devices = dict(devices)
+        self._events = {name: threading.Event() for name in self.devices}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.started = None
+        self.finished = None
+        self.error = None
+
+        # physical device -> names of the devices (wrappers included) it backs
+        self._names_by_physical = {}
+        self._chains = {}
+        for name, dev in self.devices.items():
+            if dev.stateless:
+                self._events[name].set()
+                continue
+            chain = self._chains[name] = unwrap_chain(dev)
+            self._names_by_physical.setdefault(id(chain[-1]), []).append(name)
+
+    # --- RUN ---
+
+    def start(self):
+        """ Runs the pass on a background thread and returns immediately. """
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.run, name="StateWarmup", daemon=True)
+                self._thread.start()
+
+    def run(self):
+        self._begin()
+        try:
+            refresh_states([self.devices[n] for n in self._chains], on_ready=self._ready)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._end()
+
+    async def async_run(self):
+        self._begin()
+        try:
+            await async_refresh_states([self.devices[n] for n in self._chains], on_ready=self._ready)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self._end()
+
+    def _begin(self):
+        self.started = time.monotonic()
+        logger.info(f"Warming up {len(self._chains)} device states...")
+
+    def _fail(self, error):
+        self.error = error
+        logger.error(f"State warmup failed: {error!r}")
+
+    def _end(self):
+        self.finished = time.monotonic()
+        pending = [name for name, event in self._events.items() if not event.is_set()]
+        for name in pending:
+            startup.record_device(name, 'first_state', self.finished - self.started)
+            self._events[name].set()
+        startup.record_phase('warmup', self.finished - self.started)
+        logger.info(f"State warmup done in {self.finished - self.started:.2f}s"
+                    + (f" ({len(pending)} without a state)" if pending else "."))
+
+    def _ready(self, physical):
+        elapsed = time.monotonic() - self.started
+        for name in self._names_by_physical.get(id(physical), ()):
+            for wrapper in self._chains[name][:-1]:
+                wrapper._copy_state_from(physical)
+            startup.record_device(name, 'first_state', elapsed)
+            self._events[name].set()
+
+    # --- READINESS ---
+
+    def is_ready(self, name):
+        event = self._events.get(name)
+        return event is not None and event.is_set()
+
+    def wait(self, name, timeout=None):
+        """ Blocks until one device has its first state. False on timeout / unknown name. """
+        event = self._events.get(name)
+        return event is not None and event.wait(timeout)
+
+    async def async_wait(self, name, timeout=None):
+        event = self._events.get(name)
+        if event is None:
+            return False
+        if event.is_set():
+            return True
+        return await asyncio.to_thread(event.wait, timeout)
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def progress(self):
+        """
+        {'total', 'ready', 'pending', 'offline', 'done', 'elapsed', 'error'}
+        (stateless devices count as ready from the start).
+        """
+        ready = [name for name, event in self._events.items() if event.is_set()]
+        offline = sum(1 for name in ready if self.devices[name]._state == 'OFFLINE')
+        end = self.finished or time.monotonic()
+        return {
+            'total': len(self._events),
+            'ready': len(ready),
+            'pending': len(self._events) - len(ready),
+            'offline': offline,
+            'done': self.done,
+            'elapsed': end - self.started if self.started is not None else 0,
+            'error': repr(self.error) if self.error else None
+        }